@@ -0,0 +1,90 @@
+"""
+# What does this script do?
+The script loads every BVH file in animation_results/BVH in three ways and reports the time per directory:
+naive line-by-line parsing with one float() call per number, the bulk NumPy parse of bvh_reader.py,
+and the memory-mapped sidecar files that bvh_reader.py writes on the first load.
+
+# How to use this script?
+It only needs numpy. Run it from the repository folder, e.g.
+    python benchmarks/benchmark_bvh_reader.py --repeat 3 --json bvh_reader.json
+The sidecar files are written to a temporary copy of the BVH folder, so animation_results stays untouched.
+"""
+
+import argparse
+import json
+import os
+import pathlib
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+repo_dir = pathlib.Path(__file__).parent.parent.absolute()
+sys.path.append(str(repo_dir / 'blender_scripts'))
+
+import bvh_reader
+
+
+def naive_load(file_url):
+    # what every consumer did so far: walk the lines and convert each number on its own
+    with open(file_url) as f:
+        lines = f.read().split('\n')
+    motion_line = lines.index('MOTION')
+    joints = bvh_reader.parse_hierarchy('\n'.join(lines[:motion_line]))
+    frames = []
+    for line in lines[motion_line + 3:]:
+        if line.strip():
+            frames.append([float(v) for v in line.split()])
+
+    return joints, frames
+
+
+def time_files(load, files, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for f in files:
+            result = load(f)
+            # touch the data so memory-mapped loads are not measured as free
+            if isinstance(result, bvh_reader.BvhClip):
+                float(np.asarray(result.motion).sum())
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+
+    return best
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare BVH loading strategies.')
+    parser.add_argument('folder', nargs='?', default=str(repo_dir / 'animation_results' / 'BVH'))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--json', help='write the results to this file')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        files = []
+        for name in sorted(os.listdir(args.folder)):
+            path = os.path.join(args.folder, name)
+            if os.path.isfile(path) and name.lower().endswith('.bvh'):
+                files.append(shutil.copy(path, tmp))
+
+        size = sum(os.path.getsize(f) for f in files)
+        results = {
+            'files': len(files),
+            'megabytes': size / 1e6,
+            'naive_seconds': time_files(naive_load, files, args.repeat),
+            'bulk_seconds': time_files(lambda f: bvh_reader.load_bvh(f, use_sidecar=False), files, args.repeat)
+        }
+        # the first load writes the sidecars, the timed loads memory-map them
+        for f in files:
+            bvh_reader.load_bvh(f)
+        results['sidecar_seconds'] = time_files(bvh_reader.load_bvh, files, args.repeat)
+
+    print('%d files, %.1f MB' % (results['files'], results['megabytes']))
+    for key in ('naive_seconds', 'bulk_seconds', 'sidecar_seconds'):
+        print('%-16s %8.3f s  %6.1fx' % (key.replace('_seconds', ''), results[key], results['naive_seconds'] / max(results[key], 1e-9)))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,128 @@
+"""
+# What does this script do?
+The script measures how many frames per second a producer process can hand to a consumer process, once through the
+shared memory slots of blender_scripts/frame_ring.py and once by putting the arrays into a bounded multiprocessing.Queue,
+which pickles and copies every frame through a pipe. The producer copies a prepared frame into the slot or the queue
+(standing in for OpenCV decoding into it), the consumer reads a few pixels of every frame (standing in for the inference,
+which does not keep the frame). No video and no cv2 are needed.
+
+# How to use this script?
+Make sure that numpy is installed (Python 3.8 or newer) and run e.g.
+    python benchmarks/benchmark_frame_ring.py --sizes 1280x720 1920x1080 3840x2160 --frames 500
+Add --json to save the results.
+"""
+
+import argparse
+import json
+import multiprocessing
+import pathlib
+import sys
+import time
+
+repo_dir = pathlib.Path(__file__).parent.parent.absolute()
+sys.path.append(str(repo_dir / 'blender_scripts'))
+
+import numpy as np
+
+import frame_ring
+
+
+def source_frames(shape, count=4):
+    # a few different frames, so nothing can be cached between frames
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 256, shape, dtype=np.uint8) for _ in range(count)]
+
+
+def ring_producer(handle, frame_count):
+    ring = frame_ring.FrameRing.attach(handle)
+    frames = source_frames(ring.shape)
+    try:
+        for frame_id in range(frame_count):
+            slot = ring.acquire()
+            np.copyto(ring.frames[slot], frames[frame_id % len(frames)])
+            ring.publish(slot, frame_id)
+    finally:
+        ring.finish()
+        ring.close()
+
+
+def queue_producer(frame_queue, shape, frame_count):
+    frames = source_frames(shape)
+    for frame_id in range(frame_count):
+        frame_queue.put((frame_id, frames[frame_id % len(frames)]))
+    frame_queue.put(None)
+
+
+def run_ring(shape, frame_count, slots):
+    ring = frame_ring.FrameRing.create(slots, shape)
+    producer = multiprocessing.Process(target=ring_producer, args=(ring.handle(), frame_count))
+    start = time.perf_counter()
+    producer.start()
+    checksum = 0
+    while True:
+        item = ring.take()
+        if item is None:
+            break
+        slot, _ = item
+        checksum += int(ring.frames[slot][::64, ::64].sum())
+        ring.release(slot)
+    seconds = time.perf_counter() - start
+    producer.join()
+    ring.close()
+
+    return seconds, checksum
+
+
+def run_queue(shape, frame_count, slots):
+    # the same bound as the ring: at most slots frames wait in the queue
+    frame_queue = multiprocessing.Queue(maxsize=slots)
+    producer = multiprocessing.Process(target=queue_producer, args=(frame_queue, shape, frame_count))
+    start = time.perf_counter()
+    producer.start()
+    checksum = 0
+    while True:
+        item = frame_queue.get()
+        if item is None:
+            break
+        checksum += int(item[1][::64, ::64].sum())
+    seconds = time.perf_counter() - start
+    producer.join()
+
+    return seconds, checksum
+
+
+def parse_size(text):
+    width, height = text.lower().split('x')
+    return int(height), int(width), 3
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare the shared memory frame ring with a multiprocessing.Queue.')
+    parser.add_argument('--sizes', type=parse_size, nargs='+', default=[parse_size('1280x720'), parse_size('1920x1080')],
+                        help='frame sizes as WIDTHxHEIGHT (default: 1280x720 1920x1080)')
+    parser.add_argument('--frames', type=int, default=500, help='frames per run (default: %(default)s)')
+    parser.add_argument('--slots', type=int, default=frame_ring.default_slots, help='ring slots and queue size (default: %(default)s)')
+    parser.add_argument('--json', help='write the results to this file')
+    args = parser.parse_args()
+
+    results = []
+    for shape in args.sizes:
+        megabytes = np.prod(shape) / 1024 ** 2
+        ring_seconds, ring_checksum = run_ring(shape, args.frames, args.slots)
+        queue_seconds, queue_checksum = run_queue(shape, args.frames, args.slots)
+        assert ring_checksum == queue_checksum, 'the consumer saw different frames'
+        result = {
+            'size': '%dx%d' % (shape[1], shape[0]),
+            'frames': args.frames,
+            'ring_fps': args.frames / ring_seconds,
+            'queue_fps': args.frames / queue_seconds,
+            'ring_mb_s': args.frames * megabytes / ring_seconds,
+            'queue_mb_s': args.frames * megabytes / queue_seconds
+        }
+        results.append(result)
+        print('%-10s ring %8.1f fps %8.0f MB/s   queue %8.1f fps %8.0f MB/s   %.1fx' % (
+            result['size'], result['ring_fps'], result['ring_mb_s'], result['queue_fps'], result['queue_mb_s'], queue_seconds / ring_seconds))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,118 @@
+"""
+# What does this script do?
+The script runs MediaPipe Holistic on the clips in "sign_videos" with downscaled and cropped input frames
+(see input_settings in blender_scripts/landmark_extraction.py) and compares every variant with the full resolution
+baseline: the inference speed in frames per second, and for every body part the distance of the landmarks to the
+baseline landmarks in pixels of the full frame (mean and 95th percentile over all frames in which both found the part)
+as well as the share of frames in which the part was found.
+
+# How to use this script?
+Make sure that the packages cv2, mediapipe and numpy are installed and run
+    python benchmarks/benchmark_inference_region.py --scales 0.5 0.25 --crop auto
+Pass video files to compare other clips, a box like --crop 0.25,0,0.5,1 for a fixed crop and --json to save the report.
+"""
+
+import argparse
+import json
+import os
+import pathlib
+import sys
+import time
+
+repo_dir = pathlib.Path(__file__).parent.parent.absolute()
+sys.path.append(str(repo_dir / 'blender_scripts'))
+
+import cv2
+import numpy as np
+
+import landmark_extraction
+import landmark_store
+
+
+def run_variant(video_path, holistic_settings, input_settings):
+    holistic = landmark_extraction.create_holistic(holistic_settings)
+    inference_time = 0.0
+
+    # the time between handing out a frame and the request for the next one is spent in resizing, cropping and Holistic
+    def timed_frames():
+        nonlocal inference_time
+        for image in landmark_extraction.get_video_frames(video_path, prefetch=8):
+            start = time.perf_counter()
+            yield image
+            inference_time += time.perf_counter() - start
+
+    try:
+        store = landmark_extraction.extract_landmarks(holistic, timed_frames(), **input_settings)
+    finally:
+        holistic.close()
+
+    return store, inference_time
+
+
+def landmark_error(store, baseline, width, height):
+    errors = {}
+    for part, _ in landmark_store.landmark_parts:
+        both = store.masks[part] & baseline.masks[part]
+        if not both.any():
+            errors[part] = None
+            continue
+        delta = (store.coords[part][both, :, :2] - baseline.coords[part][both, :, :2]) * (width, height)
+        distance = np.linalg.norm(delta, axis=-1)
+        errors[part] = {'mean': float(distance.mean()), 'p95': float(np.percentile(distance, 95))}
+
+    return errors
+
+
+def benchmark_clip(video_path, variants, holistic_settings):
+    vidcap = cv2.VideoCapture(video_path)
+    width, height = vidcap.get(cv2.CAP_PROP_FRAME_WIDTH), vidcap.get(cv2.CAP_PROP_FRAME_HEIGHT)
+    vidcap.release()
+
+    report = {'video': os.path.basename(video_path), 'variants': {}}
+    baseline = None
+    for name, input_settings in variants.items():
+        store, seconds = run_variant(video_path, holistic_settings, input_settings)
+        baseline = store if baseline is None else baseline
+        report['variants'][name] = {
+            'frames': len(store),
+            'seconds': seconds,
+            'fps': len(store) / max(seconds, 1e-9),
+            'detected': {part: float(np.mean(store.masks[part])) if len(store) else 0.0 for part, _ in landmark_store.landmark_parts},
+            'error_px': landmark_error(store, baseline, width, height)
+        }
+
+    return report
+
+
+def print_report(reports):
+    for r in reports:
+        print(r['video'])
+        print('  %-22s %8s %8s   %s' % ('variant', 'fps', 'speedup', 'error mean/p95 px (pose, left_hand, right_hand, face)'))
+        baseline_fps = next(iter(r['variants'].values()))['fps']
+        for name, v in r['variants'].items():
+            error = ', '.join('-' if e is None else '%.1f/%.1f' % (e['mean'], e['p95']) for e in v['error_px'].values())
+            print('  %-22s %8.1f %7.2fx   %s' % (name, v['fps'], v['fps'] / max(baseline_fps, 1e-9), error))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare fps and landmark error of downscaled and cropped inference with the full resolution.')
+    parser.add_argument('videos', nargs='*', help='video files (default: all clips in sign_videos)')
+    parser.add_argument('--scales', type=float, nargs='+', default=[0.5, 0.25], help='scale factors to compare (default: %(default)s)')
+    parser.add_argument('--crop', type=landmark_extraction.parse_crop, default='auto', help='crop box X,Y,WIDTH,HEIGHT or "auto" (default: %(default)s)')
+    parser.add_argument('--json', help='write the report to this file')
+    landmark_extraction.add_holistic_arguments(parser)
+    args = parser.parse_args()
+
+    variants = {'full frame': landmark_extraction.input_settings()}
+    for scale in args.scales:
+        variants['scale %g' % scale] = landmark_extraction.input_settings(scale=scale)
+    variants['crop'] = landmark_extraction.input_settings(crop=args.crop)
+    for scale in args.scales:
+        variants['crop, scale %g' % scale] = landmark_extraction.input_settings(scale=scale, crop=args.crop)
+
+    videos = args.videos or sorted(str(p) for p in (repo_dir / 'sign_videos').iterdir() if p.suffix.lower() in ('.mov', '.mp4'))
+    reports = [benchmark_clip(v, variants, landmark_extraction.holistic_settings_from_args(args)) for v in videos]
+    print_report(reports)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(reports, f, indent=2)
@@ -0,0 +1,82 @@
+"""
+# Blender Version 2.91.2 (2.91.2 2021-01-19)
+
+# What does this script do?
+The script measures how long load_mp_landmarks.load_landmarks_into_scene takes to keyframe all 543 landmarks
+of a synthetic clip, once with one keyframe_insert call per landmark and frame and once with the bulk
+F-curve writes (use_bulk_keyframes). The scene is emptied before every run.
+
+# How to use this script?
+Run it with Blender in background mode from the repository folder, e.g.
+    blender -b --factory-startup --python benchmarks/benchmark_keyframes.py -- --frames 250
+"""
+
+import argparse
+import pathlib
+import sys
+import time
+
+import bpy
+import numpy as np
+
+sys.path.append(str(pathlib.Path(__file__).parent.parent.absolute() / 'blender_scripts'))
+
+import landmark_store
+import load_mp_landmarks
+
+
+def synthetic_store(frame_count, seed=0):
+    rng = np.random.default_rng(seed)
+    store = landmark_store.LandmarkStore.empty(frame_count)
+    for part, l_count in landmark_store.landmark_parts:
+        # smooth random motion around a fixed pose
+        start = rng.random((1, l_count, 3), dtype=np.float32)
+        steps = rng.normal(0, 0.002, (frame_count, l_count, 3)).astype(np.float32)
+        store.coords[part][:] = start + np.cumsum(steps, axis=0)
+        store.masks[part][:] = True
+
+    return store
+
+
+def clear_scene():
+    for obj in list(bpy.data.objects):
+        bpy.data.objects.remove(obj)
+    for action in list(bpy.data.actions):
+        bpy.data.actions.remove(action)
+    for mesh in list(bpy.data.meshes):
+        bpy.data.meshes.remove(mesh)
+    load_mp_landmarks.landmark_mesh = None
+    load_mp_landmarks.index_scene_objects()
+
+
+def load_all_parts(store):
+    load_mp_landmarks.load_landmarks_into_scene(store=store, part="pose", names=load_mp_landmarks.pose_landmark_names)
+    load_mp_landmarks.load_landmarks_into_scene(store=store, part="right_hand", names=load_mp_landmarks.hand_landmark_names, first_char="R")
+    load_mp_landmarks.load_landmarks_into_scene(store=store, part="left_hand", names=load_mp_landmarks.hand_landmark_names, first_char="L")
+    load_mp_landmarks.load_landmarks_into_scene(store=store, part="face")
+
+
+def time_run(store, bulk):
+    clear_scene()
+    load_mp_landmarks.use_bulk_keyframes = bulk
+    start = time.perf_counter()
+    load_all_parts(store)
+    seconds = time.perf_counter() - start
+    keyframes = sum(len(fc.keyframe_points) for action in bpy.data.actions for fc in action.fcurves)
+
+    return seconds, keyframes
+
+
+if __name__ == '__main__':
+    argv = sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else []
+    parser = argparse.ArgumentParser(description='Compare keyframe_insert with bulk F-curve writes.')
+    parser.add_argument('--frames', type=int, default=250)
+    args = parser.parse_args(argv)
+
+    store = synthetic_store(args.frames)
+    results = {}
+    for label, bulk in (('keyframe_insert', False), ('bulk foreach_set', True)):
+        results[label] = time_run(store, bulk)
+        print('%-18s %8.2f s  %8d keyframes' % (label, *results[label]))
+
+    print('speedup: %.1fx' % (results['keyframe_insert'][0] / max(results['bulk foreach_set'][0], 1e-9)))
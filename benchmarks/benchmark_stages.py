@@ -0,0 +1,218 @@
+"""
+# What does this script do?
+The script times every stage of the pipeline on a plain Python installation, without Blender and without MediaPipe:
+bpy is replaced by fake_bpy.py, which only stores and counts what the scripts create, and the Holistic results come
+from synthetic_holistic.py. For every clip length and scene size (number of clips already in the scene) it measures
+    results_to_store       converting the Holistic results of every frame into a LandmarkStore
+    keyframes_bulk         load_mp_landmarks.load_landmarks_into_scene for all body parts with bulk F-curve writes
+    keyframes_insert       the same with one keyframe_insert per landmark and frame (only up to --insert-max-frames)
+    create_bones           load_mp_landmarks.create_bones for the whole skeleton
+    map_bones              the COPY_ROTATION constraints of assign_animation_to_avatar.map_bones on a fake Genesis8Female
+    bvh_channels           bvh_writer.compute_bone_channels
+    bvh_write              bvh_writer.write_bvh of the flat BVH file
+    retarget               assign_animation_to_avatar.retarget_bvh_file of that file onto a synthetic rig
+The Blender stages only measure the Python side of the scripts; what Blender does inside its API calls is not included,
+so the numbers are for comparing commits with each other, not for predicting the time in Blender.
+
+# How to use this script?
+It needs numpy. Run it from the repository folder, e.g.
+    python benchmarks/benchmark_stages.py --frames 100 1000 5000 --clips 0 4 --json stages.json
+and compare a later run with that file by adding --compare stages.json. Every stage is run --repeat times and the fastest
+run counts. The JSON file holds the time and the fake_bpy counts (objects, bones, constraints, keyframes, ...) of every stage.
+"""
+
+import argparse
+import json
+import os
+import pathlib
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+repo_dir = pathlib.Path(__file__).parent.absolute().parent
+sys.path.append(str(repo_dir / 'blender_scripts'))
+sys.path.append(str(repo_dir / 'benchmarks'))
+
+import numpy as np
+
+import fake_bpy
+sys.modules['bpy'] = fake_bpy
+
+import assign_animation_to_avatar
+import bvh_reader
+import bvh_writer
+import landmark_store
+import load_mp_landmarks
+import retarget
+from landmark_definitions import get_all_bone_connections
+from synthetic_holistic import SyntheticHolistic
+
+
+def clear_scene():
+    fake_bpy.reset()
+    load_mp_landmarks.landmark_mesh = None
+    load_mp_landmarks.landmark_object_prefix = ""
+    load_mp_landmarks.index_scene_objects()
+
+
+def load_all_parts(store):
+    load_mp_landmarks.load_landmarks_into_scene(store=store, part="pose", names=load_mp_landmarks.pose_landmark_names)
+    load_mp_landmarks.load_landmarks_into_scene(store=store, part="right_hand", names=load_mp_landmarks.hand_landmark_names, first_char="R")
+    load_mp_landmarks.load_landmarks_into_scene(store=store, part="left_hand", names=load_mp_landmarks.hand_landmark_names, first_char="L")
+    load_mp_landmarks.load_landmarks_into_scene(store=store, part="face")
+
+
+def fill_scene(clip_count, frame_count=100):
+    # clips that are already in the scene under their own prefix and armature, like several clips in one Blender file
+    store = landmark_store.LandmarkStore.from_results(SyntheticHolistic(seed=1).process() for _ in range(frame_count))
+    for clip in range(clip_count):
+        load_mp_landmarks.landmark_object_prefix = "clip%d_" % clip
+        load_all_parts(store)
+        load_mp_landmarks.create_bones(get_all_bone_connections(), "Armature%d" % clip)
+    load_mp_landmarks.landmark_object_prefix = ""
+
+
+def create_avatar():
+    # armature with every bone that the mapping lists use and the two imported BVH armatures
+    a = assign_animation_to_avatar
+    mapping = a.pose_bones_mapping + a.lhand_bones_mapping + a.rhand_bones_mapping + a.neck_bone_mapping + a.collar_bones_mapping
+    avatar = fake_bpy.data.objects.new(a.avatar_name, fake_bpy.data.armatures.new(a.avatar_name))
+    for _, bone_name in mapping:
+        if bone_name not in avatar.data.edit_bones:
+            avatar.data.edit_bones.new(bone_name)
+    for title in (a.arm_title, a.arm_title_head):
+        fake_bpy.data.objects.new(title, fake_bpy.data.armatures.new(title))
+
+    return avatar
+
+
+def synthetic_rig(avatar):
+    # unrotated rest pose, the neck bones use euler rotations like the constraints without y
+    neck_bones = set(bone_name for _, bone_name in assign_animation_to_avatar.neck_bone_mapping)
+    bone_names = list(avatar.pose.bones)
+    for bone_name in neck_bones:
+        avatar.pose.bones[bone_name].rotation_mode = 'XYZ'
+
+    return retarget.Rig(bone_names, [-1] * len(bone_names), np.tile(np.eye(3), (len(bone_names), 1, 1)),
+                        [avatar.pose.bones[bone_name].rotation_mode for bone_name in bone_names])
+
+
+def timed(function, repeat, setup=None):
+    # fastest of repeat runs and the fake_bpy counts of that run
+    best, counts, result = None, None, None
+    for _ in range(repeat):
+        state = setup() if setup else None
+        fake_bpy.counts.clear()
+        start = time.perf_counter()
+        result = function(state) if setup else function()
+        seconds = time.perf_counter() - start
+        if best is None or seconds < best:
+            best, counts = seconds, dict(fake_bpy.counts)
+
+    return best, counts, result
+
+
+def benchmark(frame_count, clip_count, repeat, insert_max_frames, work_dir):
+    results = []
+
+    def add(stage, measurement):
+        seconds, counts, _ = measurement
+        results.append({'stage': stage, 'frames': frame_count, 'clips': clip_count, 'seconds': seconds, 'counts': counts})
+        print('%-16s %6d frames %3d clips %10.4f s  %s' % (stage, frame_count, clip_count, seconds,
+                                                          ', '.join('%s %d' % c for c in sorted(counts.items()))))
+
+    holistic = SyntheticHolistic(seed=0)
+    frame_results = [holistic.process() for _ in range(frame_count)]
+    add('results_to_store', timed(lambda: landmark_store.LandmarkStore.from_results(frame_results), repeat))
+    store = landmark_store.LandmarkStore.from_results(frame_results)
+
+    def scene():
+        clear_scene()
+        fill_scene(clip_count)
+
+    for stage, bulk in (('keyframes_bulk', True), ('keyframes_insert', False)):
+        if not bulk and frame_count > insert_max_frames:
+            continue
+        load_mp_landmarks.use_bulk_keyframes = bulk
+        add(stage, timed(lambda _: load_all_parts(store), repeat, scene))
+    load_mp_landmarks.use_bulk_keyframes = True
+
+    def scene_with_landmarks():
+        scene()
+        load_all_parts(store)
+
+    bone_connections = get_all_bone_connections()
+    add('create_bones', timed(lambda _: load_mp_landmarks.create_bones(bone_connections, "Armature"), repeat, scene_with_landmarks))
+
+    def scene_with_avatar():
+        scene()
+        return create_avatar()
+
+    def map_all_bones(_):
+        a = assign_animation_to_avatar
+        a.map_bones(mapping_list=a.pose_bones_mapping, armature_title=a.arm_title)
+        a.map_bones(mapping_list=a.lhand_bones_mapping, armature_title=a.arm_title)
+        a.map_bones(mapping_list=a.rhand_bones_mapping, armature_title=a.arm_title)
+        a.map_bones(mapping_list=a.neck_bone_mapping, armature_title=a.arm_title_head, use_y=False)
+
+    add('map_bones', timed(map_all_bones, repeat, scene_with_avatar))
+
+    joint_names = [bone_name for bone_name, _, _ in bone_connections]
+    add('bvh_channels', timed(lambda: bvh_writer.compute_bone_channels(store, bone_connections), repeat))
+    positions, rotations = bvh_writer.compute_bone_channels(store, bone_connections)
+    motion = np.concatenate([positions, rotations], axis=2).reshape(len(positions), -1)
+    bvh_url = os.path.join(work_dir, 'clip_%d.bvh' % frame_count)
+    add('bvh_write', timed(lambda: bvh_writer.write_bvh(bvh_url, bvh_writer.flat_joints(joint_names), motion), repeat))
+
+    def retarget_file(avatar):
+        return assign_animation_to_avatar.retarget_bvh_file(file_url=bvh_url, action_name='clip', rig=synthetic_rig(avatar))
+
+    # the parsed file is cached next to it by the first run, so every run reads the same way
+    bvh_reader.load_bvh(bvh_url)
+    add('retarget', timed(retarget_file, repeat, scene_with_avatar))
+
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=repo_dir, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_comparison(results, baseline):
+    # time ratio of every stage that is in both runs, above 1 is slower than the baseline
+    old = {(r['stage'], r['frames'], r['clips']): r['seconds'] for r in baseline['results']}
+    print('compared with %s:' % (baseline.get('commit') or 'baseline'))
+    for r in results:
+        key = (r['stage'], r['frames'], r['clips'])
+        if key in old:
+            print('  %-16s %6d frames %3d clips %8.2fx' % (*key, r['seconds'] / max(old[key], 1e-9)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time the pipeline stages with a fake bpy and synthetic Holistic results.')
+    parser.add_argument('--frames', type=int, nargs='+', default=[100, 1000, 5000], help='clip lengths (default: %(default)s)')
+    parser.add_argument('--clips', type=int, nargs='+', default=[0], help='numbers of clips already in the scene (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per stage, the fastest counts (default: %(default)d)')
+    parser.add_argument('--insert-max-frames', type=int, default=1000, help='longest clip for keyframes_insert (default: %(default)d)')
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--compare', help='results of an earlier run to compare with')
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for clip_count in args.clips:
+            for frame_count in args.frames:
+                results += benchmark(frame_count, clip_count, args.repeat, args.insert_max_frames, work_dir)
+
+    report = {'commit': git_commit(), 'python': platform.python_version(), 'numpy': np.__version__, 'results': results}
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(results, json.load(f))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,107 @@
+"""
+# What does this script do?
+The script compares the two modes of MediaPipe Holistic on the clips in "sign_videos":
+static image mode (full detection on every frame) and tracking mode (static_image_mode=False).
+For every clip and mode it reports the inference speed in frames per second, and for every body part the
+drift of the tracked landmarks against the detected ones in pixels (mean and 95th percentile over all
+frames in which both modes found the part) as well as the share of frames in which each mode found the part.
+
+# How to use this script?
+Make sure that the packages cv2, mediapipe and numpy are installed and run
+    python benchmarks/compare_tracking_modes.py
+Pass video files to compare other clips and --json to save the report as machine-readable file.
+"""
+
+import argparse
+import json
+import os
+import pathlib
+import sys
+import time
+
+repo_dir = pathlib.Path(__file__).parent.parent.absolute()
+sys.path.append(str(repo_dir / 'blender_scripts'))
+
+import cv2
+import numpy as np
+
+import landmark_extraction
+import landmark_store
+
+
+def run_mode(video_path, settings):
+    holistic = landmark_extraction.create_holistic(settings)
+    inference_time = 0.0
+
+    # the time between handing out a frame and the request for the next one is spent in Holistic, decoding is not counted
+    def timed_frames():
+        nonlocal inference_time
+        for image in landmark_extraction.get_video_frames(video_path, prefetch=8):
+            start = time.perf_counter()
+            yield image
+            inference_time += time.perf_counter() - start
+
+    try:
+        store = landmark_extraction.extract_landmarks(holistic, timed_frames())
+    finally:
+        holistic.close()
+
+    return store, inference_time
+
+
+def compare_clip(video_path, model_complexity=1):
+    vidcap = cv2.VideoCapture(video_path)
+    width, height = vidcap.get(cv2.CAP_PROP_FRAME_WIDTH), vidcap.get(cv2.CAP_PROP_FRAME_HEIGHT)
+    vidcap.release()
+
+    modes = {
+        'static': landmark_extraction.holistic_settings(static_image_mode=True, model_complexity=model_complexity),
+        'tracking': landmark_extraction.holistic_settings(static_image_mode=False, model_complexity=model_complexity)
+    }
+    report = {'video': os.path.basename(video_path), 'modes': {}, 'drift_px': {}}
+    stores = {}
+    for mode, settings in modes.items():
+        stores[mode], seconds = run_mode(video_path, settings)
+        frames = len(stores[mode])
+        report['modes'][mode] = {
+            'frames': frames,
+            'seconds': seconds,
+            'fps': frames / max(seconds, 1e-9),
+            'detected': {part: float(np.mean(stores[mode].masks[part])) if frames else 0.0 for part, _ in landmark_store.landmark_parts}
+        }
+
+    for part, _ in landmark_store.landmark_parts:
+        both = stores['static'].masks[part] & stores['tracking'].masks[part]
+        if not both.any():
+            report['drift_px'][part] = None
+            continue
+        # distance in the image plane in pixels, z is not comparable between frames
+        delta = (stores['tracking'].coords[part][both, :, :2] - stores['static'].coords[part][both, :, :2]) * (width, height)
+        distance = np.linalg.norm(delta, axis=-1)
+        report['drift_px'][part] = {'mean': float(distance.mean()), 'p95': float(np.percentile(distance, 95))}
+
+    report['speedup'] = report['modes']['tracking']['fps'] / max(report['modes']['static']['fps'], 1e-9)
+
+    return report
+
+
+def print_report(reports):
+    print('%-45s %10s %10s %8s   %s' % ('video', 'static fps', 'track fps', 'speedup', 'drift mean/p95 px (pose, left_hand, right_hand, face)'))
+    for r in reports:
+        drift = ', '.join('-' if d is None else '%.1f/%.1f' % (d['mean'], d['p95']) for d in r['drift_px'].values())
+        print('%-45s %10.1f %10.1f %7.2fx   %s' % (r['video'][:45], r['modes']['static']['fps'], r['modes']['tracking']['fps'], r['speedup'], drift))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare frames per second and landmark drift of Holistic static image and tracking mode.')
+    parser.add_argument('videos', nargs='*', help='video files (default: all clips in sign_videos)')
+    parser.add_argument('--model-complexity', type=int, choices=(0, 1, 2), default=1)
+    parser.add_argument('--json', help='write the report to this file')
+    args = parser.parse_args()
+
+    videos = args.videos or sorted(str(p) for p in (repo_dir / 'sign_videos').iterdir() if p.suffix.lower() in ('.mov', '.mp4'))
+    reports = [compare_clip(v, args.model_complexity) for v in videos]
+    print_report(reports)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(reports, f, indent=2)
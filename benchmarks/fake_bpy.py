@@ -0,0 +1,336 @@
+"""
+# What does this module do?
+It is a small stand-in for Blender's bpy module with just the parts that load_mp_landmarks.py and
+assign_animation_to_avatar.py use: objects, meshes, armatures with edit and pose bones, constraints, actions with
+F-curves and keyframes. Nothing is evaluated or drawn, every call only stores its data and is counted, so the
+Python side of the scripts can be timed on a machine without Blender.
+
+# How to use this module?
+Register it before importing a Blender script and reset it between runs, e.g.
+    sys.modules['bpy'] = fake_bpy
+    import load_mp_landmarks
+    fake_bpy.reset()
+fake_bpy.counts holds the number of created objects, bones, constraints, F-curves and keyframes.
+"""
+
+import collections
+
+import numpy as np
+
+## Number of created items by kind, e.g. counts['keyframes']
+counts = collections.Counter()
+
+
+def unique_name(collection, name):
+    # Blender adds a number to names that are taken already
+    unique, number = name, 0
+    while unique in collection:
+        number += 1
+        unique = "%s.%03d" % (name, number)
+
+    return unique
+
+
+class Collection(dict):
+    # name -> item, like bpy.data.objects
+    def remove(self, item):
+        del self[item.name]
+
+    def __iter__(self):
+        return iter(self.values())
+
+
+class KeyframePoints:
+    def __init__(self):
+        # keys are kept in a buffer that grows by doubling, so inserting key by key stays cheap
+        self._co = np.zeros((0, 2), dtype=np.float32)
+        self._interpolation = np.zeros(0, dtype=np.int32)
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def co(self):
+        return self._co[:self._count]
+
+    @property
+    def interpolation(self):
+        return self._interpolation[:self._count]
+
+    def add(self, count):
+        if self._count + count > len(self._co):
+            size = max(self._count + count, 2 * len(self._co))
+            self._co = np.concatenate([self.co, np.zeros((size - self._count, 2), dtype=np.float32)])
+            self._interpolation = np.concatenate([self.interpolation, np.zeros(size - self._count, dtype=np.int32)])
+        # new keys are BEZIER (2) like in Blender
+        self._co[self._count:self._count + count] = 0
+        self._interpolation[self._count:self._count + count] = 2
+        self._count += count
+        counts['keyframes'] += count
+
+    def insert(self, frame, value):
+        self.add(1)
+        self._co[self._count - 1] = frame, value
+
+    def foreach_set(self, attribute, values):
+        if attribute == 'co':
+            self.co[:] = np.asarray(values, dtype=np.float32).reshape(-1, 2)
+        else:
+            self.interpolation[:] = values
+
+    def foreach_get(self, attribute, values):
+        values[:] = self.co.ravel() if attribute == 'co' else self.interpolation
+
+    def sort(self):
+        order = np.argsort(self.co[:, 0], kind='stable')
+        self._co[:self._count] = self.co[order]
+        self._interpolation[:self._count] = self.interpolation[order]
+
+
+class FCurve:
+    def __init__(self, data_path, index, group):
+        self.data_path = data_path
+        self.array_index = index
+        self.group = group
+        self.keyframe_points = KeyframePoints()
+
+    def update(self):
+        self.keyframe_points.sort()
+
+
+class FCurves(list):
+    def find(self, data_path, index = 0):
+        return next((f for f in self if f.data_path == data_path and f.array_index == index), None)
+
+    def new(self, data_path, index = 0, action_group = ""):
+        fcurve = FCurve(data_path, index, action_group)
+        self.append(fcurve)
+        counts['fcurves'] += 1
+        return fcurve
+
+
+class Action:
+    def __init__(self, name):
+        self.name = name
+        self.fcurves = FCurves()
+        self.use_fake_user = False
+
+    @property
+    def frame_range(self):
+        frames = [f.keyframe_points.co[:, 0] for f in self.fcurves if len(f.keyframe_points)]
+        return (float(min(f.min() for f in frames)), float(max(f.max() for f in frames))) if frames else (0.0, 0.0)
+
+
+class AnimationData:
+    def __init__(self):
+        self.action = None
+
+
+class Constraint:
+    def __init__(self, type):
+        self.type = type
+        self.target = None
+        self.subtarget = ""
+        self.use_y = True
+        self.influence = 1.0
+
+
+class Constraints(list):
+    def new(self, type):
+        constraint = Constraint(type)
+        self.append(constraint)
+        counts['constraints'] += 1
+        return constraint
+
+
+class PoseBone:
+    def __init__(self, name):
+        self.name = name
+        self.constraints = Constraints()
+        self.rotation_mode = 'QUATERNION'
+
+
+class EditBone:
+    def __init__(self, name):
+        self.name = name
+        self.head = (0, 0, 0)
+        self.tail = (0, 1, 0)
+
+
+class EditBones(Collection):
+    def __init__(self, armature):
+        super().__init__()
+        self.armature = armature
+
+    def new(self, name):
+        name = unique_name(self, name)
+        bone = self[name] = EditBone(name)
+        self.armature.pose_bones[name] = PoseBone(name)
+        counts['bones'] += 1
+        return bone
+
+
+class Armature:
+    def __init__(self, name):
+        self.name = name
+        self.pose_bones = {}
+        self.edit_bones = EditBones(self)
+
+
+class Pose:
+    def __init__(self, armature):
+        self.bones = armature.pose_bones
+
+
+class Object:
+    def __init__(self, name, object_data = None):
+        self._name = name
+        self.data = object_data
+        self.location = (0, 0, 0)
+        self.scale = (1, 1, 1)
+        self.rotation_euler = [0, 0, 0]
+        self.mode = 'OBJECT'
+        self.animation_data = None
+        self.pose = Pose(object_data) if isinstance(object_data, Armature) else None
+
+    @property
+    def name(self):
+        return self._name
+
+    @name.setter
+    def name(self, name):
+        # renaming keeps bpy.data.objects up to date
+        objects = data.objects
+        if objects.get(self._name) is self:
+            del objects[self._name]
+            name = unique_name(objects, name)
+            objects[name] = self
+        self._name = name
+
+    def animation_data_create(self):
+        self.animation_data = AnimationData()
+        return self.animation_data
+
+    def keyframe_insert(self, data_path = "", frame = 0):
+        # one keyframe per axis, like Blender's keyframe_insert on a vector property
+        if self.animation_data is None:
+            self.animation_data_create()
+        if self.animation_data.action is None:
+            self.animation_data.action = data.actions.new(self.name + "Action")
+        action = self.animation_data.action
+        values = getattr(self, data_path)
+        for index in range(len(values)):
+            fcurve = action.fcurves.find(data_path, index) or action.fcurves.new(data_path, index, "Object Transforms")
+            fcurve.keyframe_points.insert(frame, values[index])
+        counts['keyframe_insert_calls'] += 1
+
+
+class Objects(Collection):
+    def new(self, name, object_data):
+        name = unique_name(self, name)
+        obj = self[name] = Object(name, object_data)
+        counts['objects'] += 1
+        return obj
+
+
+class Actions(Collection):
+    def new(self, name = ""):
+        name = unique_name(self, name)
+        action = self[name] = Action(name)
+        counts['actions'] += 1
+        return action
+
+
+class Meshes(Collection):
+    def new(self, name = ""):
+        mesh = self[name] = object()
+        return mesh
+
+
+class Armatures(Collection):
+    def new(self, name = ""):
+        armature = self[name] = Armature(name)
+        return armature
+
+
+class Data:
+    def __init__(self):
+        self.objects = Objects()
+        self.actions = Actions()
+        self.meshes = Meshes()
+        self.armatures = Armatures()
+
+
+class SceneObjects:
+    # the objects of the scene are all objects in this stand-in
+    def __iter__(self):
+        return iter(list(data.objects.values()))
+
+
+class Scene:
+    def __init__(self):
+        self.objects = SceneObjects()
+        self.frame_start = 1
+        self.frame_end = 250
+
+
+class LinkedObjects:
+    def link(self, obj):
+        counts['links'] += 1
+
+
+class Context:
+    def __init__(self):
+        self.scene = Scene()
+        self.collection = type('Collection', (), {'objects': LinkedObjects()})()
+        self.view_layer = type('ViewLayer', (), {'objects': type('LayerObjects', (), {'active': None})()})()
+        self.object = None
+
+
+class MeshOps:
+    def primitive_ico_sphere_add(self, enter_editmode = False, align = 'WORLD', location = (0, 0, 0), scale = (1, 1, 1)):
+        obj = data.objects.new("Icosphere", data.meshes.new("Icosphere"))
+        obj.location, obj.scale = location, scale
+        context.object = obj
+        counts['operator_calls'] += 1
+
+
+class ObjectOps:
+    def mode_set(self, mode = 'OBJECT'):
+        active = context.view_layer.objects.active
+        if active is not None:
+            active.mode = mode
+            context.object = active
+        counts['operator_calls'] += 1
+
+
+class Operator:
+    # base class of the modal operators, which are defined but not run in benchmarks
+    bl_idname = ""
+    bl_label = ""
+
+
+class Types:
+    def __init__(self):
+        self.Operator = Operator
+
+
+class Ops:
+    def __init__(self):
+        self.mesh = MeshOps()
+        self.object = ObjectOps()
+
+
+data = Data()
+context = Context()
+ops = Ops()
+types = Types()
+
+
+def reset():
+    # empty scene and counters
+    global data, context
+    data = Data()
+    context = Context()
+    counts.clear()
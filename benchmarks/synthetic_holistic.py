@@ -0,0 +1,81 @@
+"""
+# What does this module do?
+It stands in for MediaPipe Holistic in benchmarks: SyntheticHolistic.process returns results with the same attributes
+as Holistic (pose_landmarks, left_hand_landmarks, right_hand_landmarks and face_landmarks with 33, 21, 21 and 468
+landmarks that have x, y and z) for smooth random motion. Every part can drop out for some frames like a missed
+detection, so the masks of the LandmarkStore are not all True. No cv2 or mediapipe is needed.
+
+# How to use this module?
+    holistic = SyntheticHolistic(seed=0)
+    store = landmark_store.LandmarkStore.from_results(holistic.process(None) for _ in range(1000))
+The image passed to process is ignored; synthetic_frames gives the arrays of a whole clip without result objects.
+"""
+
+import numpy as np
+
+
+########## Variables ##########
+
+## Body parts of a Holistic result with their landmark count (as in blender_scripts/landmark_store.py)
+landmark_counts = [
+    ("pose", 33),
+    ("left_hand", 21),
+    ("right_hand", 21),
+    ("face", 468)
+]
+
+
+########## Class definitions ##########
+
+class Landmark:
+    __slots__ = ("x", "y", "z")
+
+    def __init__(self, x, y, z):
+        self.x, self.y, self.z = x, y, z
+
+
+class LandmarkList:
+    def __init__(self, coords):
+        self.landmark = [Landmark(x, y, z) for x, y, z in coords.tolist()]
+
+
+class Results:
+    def __init__(self, landmarks):
+        # part name -> LandmarkList or None
+        for part in ("pose", "left_hand", "right_hand", "face"):
+            setattr(self, part + "_landmarks", landmarks.get(part))
+
+
+class SyntheticHolistic:
+    def __init__(self, seed = 0, dropout = 0.05, step = 0.002):
+        # dropout is the share of frames in which a part is not detected, step the size of the random motion per frame
+        self.rng = np.random.default_rng(seed)
+        self.dropout = dropout
+        self.step = step
+        self.coords = {part: self.rng.uniform(0.2, 0.8, (l_count, 3)) for part, l_count in landmark_counts}
+
+    def next_coords(self):
+        for part, coords in self.coords.items():
+            coords += self.rng.normal(0, self.step, coords.shape)
+            np.clip(coords, 0, 1, out=coords)
+
+        return {part: (None if self.rng.random() < self.dropout else coords) for part, coords in self.coords.items()}
+
+    def process(self, image = None):
+        return Results({part: None if coords is None else LandmarkList(coords) for part, coords in self.next_coords().items()})
+
+    def close(self):
+        pass
+
+
+########## Method definitions ##########
+
+def synthetic_frames(frame_count, seed = 0, dropout = 0.05):
+    # part name -> list of (landmarks, 3) float32 arrays or None, as LandmarkStore.from_frames takes them
+    holistic = SyntheticHolistic(seed, dropout)
+    frames = {part: [] for part, _ in landmark_counts}
+    for _ in range(frame_count):
+        for part, coords in holistic.next_coords().items():
+            frames[part].append(None if coords is None else coords.astype(np.float32))
+
+    return frames
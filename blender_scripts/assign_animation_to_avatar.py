@@ -3,24 +3,49 @@
 
 # What does this script do?
 The script maps the bone rotations of the interpreter avatar's armature to the bone rotations of the BVH file armature.
+By default the rotations are computed from the BVH file with retarget.py and written as keyframes into a new action of the avatar,
+without importing the BVH file, without constraints and without baking. They match the constraints and the baked action
+(see --compare-bake below and tests/test_retarget.py).
 
 # How to use this script?
 Make a copy of "animate_avatar.blend" and give the new .blend file a name that fits to the desired animation, e.g. the name of the BVH file.
-Open the .blend file and import the BVH file to be mapped. Now a new armature should appear in the scene collection. 
-Duplicate that armature with copy paste.
+Open the .blend file, go to the scripting tab in Blender and open this script if it is not already there or reload it with "Text > Reload".
+Set bvh_file_path to the BVH file to be mapped and run the script. Go to the animation tab and press the play button to see it.
 
-Now go to the scripting tab in Blender and open this script if it is not already there or reload it with "Text > Reload".
+All BVH files of a folder can be mapped in one go in Blender's background mode. Every file becomes an action named like the file,
+and the avatar with all actions is saved to a new .blend file (nothing is written into the BVH folder), e.g.
+    blender -b animate_avatar.blend --python assign_animation_to_avatar.py -- --bvh-dir ../animation_results/BVH --output ../animation_results/dialog.blend
+To check the computed rotations on another avatar, compare them on one clip with the constraints and a baked action:
+    blender -b animate_avatar.blend --python assign_animation_to_avatar.py -- --compare-bake ../animation_results/BVH/AufWiedersehen.bvh
+prints the largest angle between both for every mapped bone and fails if one is above bake_tolerance.
+With use_profiling (--profile in batch mode) the time of every stage, the created keyframes and constraints and the peak memory
+are written to "<name of the .blend file>.profile.json" next to the saved .blend file (see profiling.py).
+
+To use COPY_ROTATION constraints instead (use_computed_retarget = False), import the BVH file to be mapped.
+Now a new armature should appear in the scene collection. Duplicate that armature with copy paste.
 Give arm_title and arm_title_head the correct armature names. Run the script and wait for the result. 
 Go to the animation tab and press the play button to see it.
 
-The result can be baked as an animation. To do this, switch to "Object Mode" and choose "Genesis8Female" in the scene collection. 
+The result of the constraints can be baked as an animation. To do this, switch to "Object Mode" and choose "Genesis8Female" in the scene collection. 
 Then go to "Object > Animation > Bake Action". Set the start frame to 0 and check the correct end frame in the animation Tab. 
 Unselect "Only Selected Bones" and select "Visual Keying", "Clear Constraints" and "Clear Parents". Set "Bake Data" to "Pose".
 
 Delete the two BVH armatures. If the avatar does not change its pose, the baking was successful.
+The baked action has a keyframe on every frame. The keys that linear interpolation reproduces can be removed in the Python console after running this script, e.g.
+    import keyframe_reduction
+    keyframe_reduction.simplify_action(bpy.data.objects['Genesis8Female'].animation_data.action, 0.001)
 """
 
-import bpy
+import argparse, bpy, os, pathlib, sys
+import numpy as np
+
+## Folder of this script (__file__ points into the .blend file when the script is run from Blender's text editor)
+scripts_dir = pathlib.Path(__file__).parent.absolute()
+if scripts_dir.suffix == '.blend':
+    scripts_dir = scripts_dir.parent
+sys.path.append(str(scripts_dir))
+
+import bvh_reader, keyframe_reduction, profiling, retarget
 
 
 ########## Variable declarations ##########
@@ -29,6 +54,34 @@ import bpy
 arm_title = "Arbeitsunfähigkeitsbescheinigung" # x-axis will be rotated to -210d
 arm_title_head = "Arbeitsunfähigkeitsbescheinigung.001" # x-axis will be rotated to -180d to map the neck and head bones
 
+## Compute the rotations from the BVH file (True) or add COPY_ROTATION constraints to the imported BVH armatures (False)
+use_computed_retarget = True
+
+## BVH file for the computed retarget and for compare_with_bake
+bvh_file_path = str(scripts_dir.parent) + '/animation_results/BVH/AufWiedersehen.bvh'
+
+## Largest angle in radians between the computed and the baked rotation of a bone that compare_with_bake accepts
+bake_tolerance = 0.001
+
+## Avatar armature and first frame of its action (Blender imports BVH files from frame 1)
+avatar_name = "Genesis8Female"
+frame_start = 1
+
+## Largest deviation of the rotation keyframes when leaving out keys that linear interpolation reproduces (None keys every frame)
+# in radians for euler rotations and quaternion units otherwise, e.g. 0.001
+keyframe_tolerance = None
+# keys removed and largest deviation of all written actions
+keyframe_stats = keyframe_reduction.ReductionStats()
+
+## Record the time of every stage, the created keyframes and constraints and the peak memory and write them to a JSON report
+# next to the .blend file
+use_profiling = False
+profiler = profiling.Profiler(enabled = use_profiling)
+
+## X rotation of the two BVH armatures in radians
+armature_angle = -3.66519 # -210d
+head_armature_angle = -3.14159 # -180d
+
 ## Bone Mapping
 
 # mapping_list = [ (0:MEDIA_PIPE_BONE, 1:DAZ_BONE), ...]
@@ -234,8 +287,12 @@ face_bones_mapping = [
 ########## Method definitions ##########
 
 def rotate_bvh_armatures(at="", ath=""):
-    bpy.data.objects[at].rotation_euler[0] = -3.66519 # -210d
-    bpy.data.objects[ath].rotation_euler[0] = -3.14159 # -180d
+    bpy.data.objects[at].rotation_euler[0] = armature_angle
+    bpy.data.objects[ath].rotation_euler[0] = head_armature_angle
+
+
+def get_influence(daz_bone):
+    return 0.95 if 'ForearmBend' in daz_bone or 'neckUpper' in daz_bone else 1.0
 
 
 def map_bones(mapping_list = [], armature_title = "", use_y = True):
@@ -246,21 +303,228 @@ def map_bones(mapping_list = [], armature_title = "", use_y = True):
         bone_const_cr.subtarget = m[0]
         bone_const_cr.use_y = use_y
         
-        if 'ForearmBend' in m[1] or 'neckUpper' in m[1]:
-            bone_const_cr.influence = 0.95
-            
+        if get_influence(m[1]) < 1:
+            bone_const_cr.influence = get_influence(m[1])
+    profiler.count("constraints", len(mapping_list))
+
+
+def get_bone_targets():
+    # the same mapping as the constraints of map_bones
+    targets = []
+    for m in pose_bones_mapping + lhand_bones_mapping + rhand_bones_mapping:
+        targets.append(retarget.BoneTarget(m[0], m[1], armature_angle, influence = get_influence(m[1])))
+    for m in neck_bone_mapping:
+        targets.append(retarget.BoneTarget(m[0], m[1], head_armature_angle, use_y = False, influence = get_influence(m[1])))
+
+    return targets
+
+
+def read_rig(armature_title = ""):
+    # rest pose and hierarchy of an armature for retarget.py, parents before children
+    obj = bpy.data.objects[armature_title]
+    bones = []
+    stack = [b for b in obj.data.bones if b.parent is None][::-1]
+    while stack:
+        bone = stack.pop()
+        bones.append(bone)
+        stack.extend(list(bone.children)[::-1])
+
+    ids = {b.name: id for id, b in enumerate(bones)}
+    pose_bones = [obj.pose.bones[b.name] for b in bones]
+
+    return retarget.Rig(
+        bone_names = [b.name for b in bones],
+        parents = [ids[b.parent.name] if b.parent else -1 for b in bones],
+        rest = [np.array(b.matrix_local.to_3x3().normalized()) for b in bones],
+        rotation_modes = [pb.rotation_mode for pb in pose_bones],
+        basis = [np.array(pb.matrix_basis.to_3x3().normalized()) for pb in pose_bones],
+        object_rotation = np.array(obj.matrix_world.to_3x3().normalized())
+    )
+
+
+def write_rotation_keyframes(action, pose_bone, frames, rotations):
+    # fill the rotation F-curves of a pose bone with all keyframes at once
+    if pose_bone.rotation_mode == 'AXIS_ANGLE':
+        pose_bone.rotation_mode = 'QUATERNION'
+    values = retarget.rotation_keyframes(rotations, pose_bone.rotation_mode)
+    data_path = 'pose.bones["%s"].%s' % (pose_bone.name, 'rotation_quaternion' if values.shape[1] == 4 else 'rotation_euler')
+
+    fcurves = [action.fcurves.new(data_path, index = index, action_group = pose_bone.name) for index in range(values.shape[1])]
+    profiler.count("keyframes", keyframe_reduction.set_linear_keys(fcurves, frames, values, keyframe_tolerance, keyframe_stats))
+
+
+def retarget_bvh_file(file_url = "", action_name = "", armature_title = avatar_name, rig = None):
+    # compute the avatar rotations of a BVH file and write them into a new action of the avatar
+    with profiler.stage("load_bvh"):
+        clip = bvh_reader.load_bvh(file_url, use_sidecar = False)
+    avatar = bpy.data.objects[armature_title]
+    with profiler.stage("retarget"):
+        rotations = retarget.retarget_rotations(clip, rig or read_rig(armature_title), get_bone_targets())
+
+    action = bpy.data.actions.new(name = action_name or pathlib.Path(file_url).stem)
+    profiler.count("actions")
+    profiler.count("frames", clip.frame_count)
+    frames = np.arange(clip.frame_count) + frame_start
+    with profiler.stage("write_keyframes"):
+        for bone_name, bone_rotations in rotations.items():
+            write_rotation_keyframes(action, avatar.pose.bones[bone_name], frames, bone_rotations)
+
+    if avatar.animation_data is None:
+        avatar.animation_data_create()
+    avatar.animation_data.action = action
+
+    return action
+
+
+def retarget_bvh_folder(bvh_dir = "", armature_title = avatar_name):
+    # one action per BVH file, named like the file and kept in the .blend file by a fake user
+    with profiler.stage("read_rig"):
+        rig = read_rig(armature_title)
+    bvh_files = sorted(pathlib.Path(bvh_dir).glob('*.bvh'))
+    actions = []
+    for id, bvh_file in enumerate(bvh_files):
+        # a rerun replaces the actions instead of adding "name.001"
+        old_action = bpy.data.actions.get(bvh_file.stem)
+        if old_action is not None:
+            bpy.data.actions.remove(old_action)
+
+        action = retarget_bvh_file(file_url = str(bvh_file), action_name = bvh_file.stem, armature_title = armature_title, rig = rig)
+        action.use_fake_user = True
+        actions.append(action)
+        print("%d/%d %s" % (id + 1, len(bvh_files), action.name))
+
+    return actions
+
+
+def rotation_fcurve_matrices(action, pose_bone, frames):
+    # (frames, 3, 3) rotations of a pose bone evaluated from the rotation F-curves of an action
+    if pose_bone.rotation_mode in ("XYZ", "XZY", "YXZ", "YZX", "ZXY", "ZYX"):
+        data_path, count = 'pose.bones["%s"].rotation_euler' % pose_bone.name, 3
+    else:
+        data_path, count = 'pose.bones["%s"].rotation_quaternion' % pose_bone.name, 4
+    defaults = [0.0, 0.0, 0.0] if count == 3 else [1.0, 0.0, 0.0, 0.0]
+    values = np.empty((len(frames), count))
+    for index in range(count):
+        fcurve = action.fcurves.find(data_path, index = index)
+        values[:, index] = [fcurve.evaluate(frame) for frame in frames] if fcurve else defaults[index]
+
+    if count == 3:
+        return retarget.euler_to_matrix(values, pose_bone.rotation_mode)
+    return retarget.quaternion_to_matrix(values / np.linalg.norm(values, axis = 1, keepdims = True))
+
+
+def bake_constraint_rotations(file_url = "", armature_title = avatar_name):
+    # imports the BVH file twice, maps it with the constraints and bakes it with visual keying like described above,
+    # returns bone name -> (frames, 3, 3) baked rotations of the mapped bones and leaves the avatar as it was
+    avatar = bpy.data.objects[armature_title]
+    old_action = avatar.animation_data.action if avatar.animation_data else None
+    # the bake leaves the pose of its last frame in the pose bones
+    old_basis = {pose_bone.name: pose_bone.matrix_basis.copy() for pose_bone in avatar.pose.bones}
+    bvh_armatures = []
+    for _ in range(2):
+        old_objects = set(bpy.data.objects)
+        bpy.ops.import_anim.bvh(filepath = file_url, frame_start = frame_start)
+        bvh_armatures.append(next(obj for obj in bpy.data.objects if obj not in old_objects))
+    rotate_bvh_armatures(at = bvh_armatures[0].name, ath = bvh_armatures[1].name)
+    map_bones(mapping_list = pose_bones_mapping + lhand_bones_mapping + rhand_bones_mapping, armature_title = bvh_armatures[0].name)
+    map_bones(mapping_list = neck_bone_mapping, armature_title = bvh_armatures[1].name, use_y = False)
+
+    first_frame, last_frame = (int(round(f)) for f in bvh_armatures[0].animation_data.action.frame_range)
+    frames = np.arange(first_frame, last_frame + 1)
+    bpy.ops.object.mode_set(mode = 'OBJECT')
+    bpy.ops.object.select_all(action = 'DESELECT')
+    avatar.select_set(True)
+    bpy.context.view_layer.objects.active = avatar
+    bpy.ops.nla.bake(frame_start = first_frame, frame_end = last_frame, only_selected = False, visual_keying = True,
+                     clear_constraints = True, bake_types = {'POSE'})
+    baked_action = avatar.animation_data.action
+    baked = {target.bone_name: rotation_fcurve_matrices(baked_action, avatar.pose.bones[target.bone_name], frames) for target in get_bone_targets()}
+
+    avatar.animation_data.action = old_action
+    bpy.data.actions.remove(baked_action)
+    for pose_bone in avatar.pose.bones:
+        pose_bone.matrix_basis = old_basis[pose_bone.name]
+    for obj in bvh_armatures:
+        bvh_action = obj.animation_data.action if obj.animation_data else None
+        bpy.data.objects.remove(obj)
+        if bvh_action is not None:
+            bpy.data.actions.remove(bvh_action)
+
+    return baked
+
+
+def compare_with_bake(file_url = "", armature_title = avatar_name):
+    # bone name -> largest angle in radians between the rotations of the constraints and the bake and the computed ones
+    computed = retarget.retarget_rotations(bvh_reader.load_bvh(file_url, use_sidecar = False), read_rig(armature_title), get_bone_targets())
+    baked = bake_constraint_rotations(file_url, armature_title)
+
+    return {bone_name: float(retarget.rotation_angle(baked[bone_name], rotations).max()) for bone_name, rotations in computed.items()}
+
+
+def parse_batch_arguments(argv):
+    parser = argparse.ArgumentParser(description='Retarget every BVH file of a folder onto the avatar and save the result as one .blend file.')
+    parser.add_argument('--bvh-dir', default=str(scripts_dir.parent / 'animation_results' / 'BVH'), help='folder with the BVH files (default: %(default)s)')
+    parser.add_argument('--output', help='.blend file to save the avatar with all actions to')
+    parser.add_argument('--avatar', default=avatar_name, help='name of the avatar armature (default: %(default)s)')
+    parser.add_argument('--frame-start', type=int, default=frame_start, help='first frame of the actions (default: %(default)d)')
+    parser.add_argument('--keyframe-tolerance', type=float, default=keyframe_tolerance, help='leave out keyframes that deviate less than this when interpolated linearly')
+    parser.add_argument('--profile', action='store_true', default=use_profiling, help='write the time of every stage and the peak memory to a JSON report next to the output')
+    parser.add_argument('--compare-bake', metavar='BVH_FILE', help='only compare the computed rotations of this BVH file with the constraints and a baked action, nothing is saved')
+    parser.add_argument('--bake-tolerance', type=float, default=bake_tolerance, help='largest accepted angle in radians for --compare-bake (default: %(default)s)')
+
+    args = parser.parse_args(argv)
+    if not args.output and not args.compare_bake:
+        parser.error('--output is required')
+
+    return args
+
 
 ########## Execute methods ##########
 
-## Rotate armatures 
-rotate_bvh_armatures(at=arm_title, ath=arm_title_head)
+if __name__ == "__main__":
+    # arguments after "--" start the batch mode, e.g. in Blender's background mode
+    argv = sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else []
+    args = parse_batch_arguments(argv) if argv else None
+    if args and args.compare_bake:
+        frame_start = args.frame_start
+        errors = compare_with_bake(file_url = os.path.abspath(args.compare_bake), armature_title = args.avatar)
+        for bone_name, error in sorted(errors.items(), key = lambda e: -e[1]):
+            print("%-16s %.6f rad%s" % (bone_name, error, "" if error <= args.bake_tolerance else "  too large"))
+        sys.exit(0 if max(errors.values()) <= args.bake_tolerance else 1)
+    elif args:
+        frame_start = args.frame_start
+        keyframe_tolerance = args.keyframe_tolerance
+        profiler.enabled = args.profile
+        actions = retarget_bvh_folder(bvh_dir = args.bvh_dir, armature_title = args.avatar)
+        if actions:
+            # the avatar shows the first clip when the file is opened
+            bpy.data.objects[args.avatar].animation_data.action = actions[0]
+            bpy.context.scene.frame_end = max(int(action.frame_range[1]) for action in actions)
+        if keyframe_tolerance is not None:
+            print("Rotation keyframes: " + str(keyframe_stats))
+        with profiler.stage("save"):
+            bpy.ops.wm.save_as_mainfile(filepath = os.path.abspath(args.output))
+        profiler.write_report(profiling.report_path(os.path.abspath(args.output)), bvh_dir = args.bvh_dir, actions = len(actions))
+    elif use_computed_retarget:
+        ## Compute the avatar rotations from the BVH file
+        action = retarget_bvh_file(file_url=bvh_file_path)
+        bpy.context.scene.frame_end = int(action.frame_range[1])
+        if keyframe_tolerance is not None:
+            print("Rotation keyframes: " + str(keyframe_stats))
+        profiler.write_report(profiling.report_path(bpy.data.filepath), bvh_file = bvh_file_path)
+    else:
+        ## Rotate armatures 
+        rotate_bvh_armatures(at=arm_title, ath=arm_title_head)
+
+        with profiler.stage("map_bones"):
+            ## Map Pose Bones
+            map_bones(mapping_list=pose_bones_mapping, armature_title=arm_title)
 
-## Map Pose Bones
-map_bones(mapping_list=pose_bones_mapping, armature_title=arm_title)
+            ## Map Hand Bones
+            map_bones(mapping_list=lhand_bones_mapping, armature_title=arm_title)
+            map_bones(mapping_list=rhand_bones_mapping, armature_title=arm_title)
 
-## Map Hand Bones
-map_bones(mapping_list=lhand_bones_mapping, armature_title=arm_title)
-map_bones(mapping_list=rhand_bones_mapping, armature_title=arm_title)
+            ## Map Neck Bones
+            map_bones(mapping_list=neck_bone_mapping, armature_title=arm_title_head, use_y = False)
 
-## Map Neck Bones
-map_bones(mapping_list=neck_bone_mapping, armature_title=arm_title_head, use_y = False)
+        profiler.write_report(profiling.report_path(bpy.data.filepath), armature = arm_title)
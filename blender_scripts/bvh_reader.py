@@ -0,0 +1,183 @@
+"""
+# What does this module do?
+It loads BVH motion capture files. The HIERARCHY is parsed into a compact joint table (names, parents,
+offsets, channels and end sites) and the MOTION block into one (frames, channels) float32 array in a single
+bulk parse instead of converting the numbers line by line.
+The parsed motion is kept as binary sidecar file in a ".bvh_cache" folder next to the BVH file. Later loads of an
+unchanged file memory-map that sidecar instead of parsing the text again.
+
+# How to use this module?
+It only needs numpy, e.g.
+    clip = bvh_reader.load_bvh("../animation_results/BVH/GuteBesserung.bvh")
+    clip.joint_motion("LEFT_ELBOW")  # (frames, 6) array of the channels of one joint
+"""
+
+import json, os, re
+
+import numpy as np
+
+
+########## Variables ##########
+
+## Increase when the layout of the sidecar files changes
+sidecar_format_version = 1
+
+## Name of the sidecar folder next to the BVH files
+sidecar_dir_name = ".bvh_cache"
+
+
+########## Class definitions ##########
+
+class BvhClip:
+    def __init__(self, joints, motion, frame_time, hierarchy_text = ""):
+        # one dict per joint in file order with the keys name, parent (index, -1 for the root), offset, channels and end_site
+        self.joints = joints
+        self.joint_names = [j["name"] for j in joints]
+        self.parents = np.array([j["parent"] for j in joints], dtype=np.int32)
+        self.offsets = np.array([j["offset"] for j in joints], dtype=np.float64).reshape(-1, 3)
+        # index of the first motion column of every joint
+        self.channel_starts = np.cumsum([0] + [len(j["channels"]) for j in joints])[:-1]
+        self.motion = motion
+        self.frame_time = frame_time
+        # text of the file up to "MOTION", so the file can be written again unchanged
+        self.hierarchy_text = hierarchy_text
+
+    @property
+    def frame_count(self):
+        return len(self.motion)
+
+    def joint_index(self, name):
+        return self.joint_names.index(name)
+
+    def joint_motion(self, name):
+        # (frames, channels) columns of one joint
+        j = self.joint_index(name)
+        start = self.channel_starts[j]
+        return self.motion[:, start:start + len(self.joints[j]["channels"])]
+
+
+########## Method definitions ##########
+
+def parse_hierarchy(hierarchy_text):
+    joints = []
+    # open blocks, either the index of a joint or "End Site"
+    blocks = []
+    next_block = None
+    tokens = hierarchy_text.split()
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        if token in ("ROOT", "JOINT"):
+            parent = blocks[-1] if blocks else -1
+            joints.append({"name": tokens[i + 1], "parent": parent, "offset": [0.0, 0.0, 0.0], "channels": [], "end_site": None})
+            next_block = len(joints) - 1
+            i += 2
+        elif token == "End":
+            next_block = "End Site"
+            i += 2
+        elif token == "{":
+            blocks.append(next_block)
+            i += 1
+        elif token == "}":
+            blocks.pop()
+            i += 1
+        elif token == "OFFSET":
+            offset = [float(v) for v in tokens[i + 1:i + 4]]
+            if blocks[-1] == "End Site":
+                # an end site belongs to the joint whose block it is in
+                joints[blocks[-2]]["end_site"] = offset
+            else:
+                joints[blocks[-1]]["offset"] = offset
+            i += 4
+        elif token == "CHANNELS":
+            count = int(tokens[i + 1])
+            joints[blocks[-1]]["channels"] = tokens[i + 2:i + 2 + count]
+            i += 2 + count
+        else:
+            i += 1
+
+    return joints
+
+
+def split_bvh_text(text):
+    motion_start = text.index("MOTION")
+    header, motion_text = text[:motion_start], text[motion_start:]
+    # "MOTION", "Frames: n", "Frame Time: t" and then the channel values
+    lines = motion_text.split("\n", 3)
+    frame_count = int(lines[1].split(":")[1])
+    frame_time = float(lines[2].split(":")[1])
+
+    return header, frame_count, frame_time, (lines[3] if len(lines) > 3 else "")
+
+
+def parse_bvh(text, dtype = np.float32):
+    header, frame_count, frame_time, values = split_bvh_text(text)
+    joints = parse_hierarchy(header)
+    channel_count = sum(len(j["channels"]) for j in joints)
+    # all numbers of the motion block in one go
+    motion = np.fromstring(values, dtype=dtype, sep=' ')
+    motion = motion[:frame_count * channel_count].reshape(frame_count, channel_count)
+
+    return BvhClip(joints, motion, frame_time, header)
+
+
+def sidecar_paths(file_url):
+    stat = os.stat(file_url)
+    folder, name = os.path.split(os.path.abspath(file_url))
+    # the size and modification time are part of the name, so a changed BVH file never uses an old sidecar
+    stem = os.path.join(folder, sidecar_dir_name, "%s.%d-%d" % (name, stat.st_size, stat.st_mtime_ns))
+
+    return stem + ".json", stem + ".npy"
+
+
+def write_sidecar(file_url, clip):
+    info_path, motion_path = sidecar_paths(file_url)
+    sidecar_dir = os.path.dirname(info_path)
+    os.makedirs(sidecar_dir, exist_ok=True)
+
+    # remove sidecars of older versions of the same file
+    own_sidecar = re.compile(re.escape(os.path.basename(file_url)) + r"\.\d+-\d+\.(json|npy)$")
+    for f in os.listdir(sidecar_dir):
+        if own_sidecar.match(f) and os.path.join(sidecar_dir, f) not in (info_path, motion_path):
+            os.remove(os.path.join(sidecar_dir, f))
+
+    tmp_path = motion_path + ".tmp.npy"
+    np.save(tmp_path, np.ascontiguousarray(clip.motion))
+    os.replace(tmp_path, motion_path)
+    with open(info_path, "w") as f:
+        json.dump({"format": sidecar_format_version, "frame_time": clip.frame_time, "joints": clip.joints, "hierarchy_text": clip.hierarchy_text}, f)
+
+
+def read_sidecar(file_url):
+    info_path, motion_path = sidecar_paths(file_url)
+    if not (os.path.isfile(info_path) and os.path.isfile(motion_path)):
+        return None
+    try:
+        with open(info_path) as f:
+            info = json.load(f)
+    except ValueError:
+        # e.g. a sidecar that was not written completely
+        return None
+    if info.get("format") != sidecar_format_version:
+        return None
+
+    return BvhClip(info["joints"], np.load(motion_path, mmap_mode='r'), info["frame_time"], info["hierarchy_text"])
+
+
+def load_bvh(file_url, use_sidecar = True):
+    if use_sidecar:
+        clip = read_sidecar(file_url)
+        if clip is not None:
+            return clip
+
+    with open(file_url) as f:
+        clip = parse_bvh(f.read())
+
+    if use_sidecar:
+        try:
+            write_sidecar(file_url, clip)
+        except OSError:
+            # e.g. a read-only folder, the clip is still usable
+            pass
+
+    return clip
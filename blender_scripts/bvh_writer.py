@@ -0,0 +1,272 @@
+"""
+# What does this script do?
+The script writes a BVH motion capture file directly from landmark arrays, without building landmark objects
+and an armature in Blender. For every bone of the skeleton defined in landmark_definitions.py it computes the
+position channels (the location of the start landmark) and the rotation channels (the rotation that points the
+bone, which rests along the z axis, from the start to the target landmark, like the STRETCH_TO constraint does)
+for all frames at once. The file has the same joint names, channel layout and frame time as the files that
+Blender exports from the armature of load_mp_landmarks.py (see animation_results/BVH).
+With pruning, channels that carry no information are left out: z rotations that are always 0, rotations of the
+single bones, positions that never change (moved into the OFFSET) and positions that several bones share, which
+are written once by a position-only parent joint, e.g. LWRIST_position for the five finger bones of the wrist.
+
+# How to use this script?
+It only needs numpy. Run it on a landmark file written by mp-landmark-annotation/batch_extract.py, e.g.
+    python bvh_writer.py ../landmarks/GuteBesserung.npz ../animation_results/BVH/GuteBesserung.bvh
+or call write_landmarks_bvh with a LandmarkStore from Python. Add --prune for a smaller file, or prune a file that
+Blender exported (z rotations below 0.001 degrees count as 0 here), e.g.
+    python bvh_writer.py ../animation_results/BVH/GuteBesserung.bvh GuteBesserung.pruned.bvh --tolerance 0.001
+--simplify is lossy and does not make the BVH file smaller: a BVH file needs a value for every frame, so it still writes
+every frame but moves every channel onto a linear curve through as few keys as possible (deviating up to TOLERANCE).
+It only pays off when the file is stored afterwards with motion_archive.py, which compresses such curves much better.
+"""
+
+import argparse, os, sys, tempfile
+
+import numpy as np
+
+import bvh_reader, keyframe_reduction, landmark_store
+from landmark_definitions import get_all_bone_connections, get_landmark_object_names
+
+
+########## Variables ##########
+
+## Frame time of the exported BVH files (24 frames per second)
+frame_time = 1 / 24
+
+## Channels of every joint, as written by Blender's BVH exporter
+joint_channels = ["Xposition", "Yposition", "Zposition", "Xrotation", "Yrotation", "Zrotation"]
+
+
+########## Method definitions ##########
+
+def landmark_positions(store):
+    # positions of all landmark objects in scene coordinates as one (frames, landmarks, 3) array,
+    # frames without detection are interpolated like the keyframed ico spheres in Blender
+    object_names = get_landmark_object_names()
+    columns, arrays = {}, []
+    for part, _ in landmark_store.landmark_parts:
+        for name in object_names[part]:
+            columns[name] = len(columns)
+        arrays.append(store.scene_locations(part, fill_gaps = True))
+
+    return np.concatenate(arrays, axis=1), columns
+
+
+def compute_bone_channels(store, bone_connections = []):
+    # position and rotation channels of every bone, both of shape (frames, bones, 3), rotations in degrees
+    positions, columns = landmark_positions(store)
+    heads = positions[:, [columns[start_lm] for _, start_lm, _ in bone_connections]]
+    rotations = np.zeros_like(heads)
+
+    # single bones only follow their landmark and never rotate
+    stretched = [id for id, (_, _, target_lm) in enumerate(bone_connections) if target_lm is not None]
+    if stretched:
+        tails = positions[:, [columns[bone_connections[id][2]] for id in stretched]]
+        direction = tails - heads[:, stretched]
+        length = np.linalg.norm(direction, axis=-1, keepdims=True)
+        direction = direction / np.where(length > 0, length, 1)
+
+        # rotating (0, 0, 1) first around y and then around x points it to the bone direction, z stays 0;
+        # the x rotation is unwrapped over time like Blender keeps consecutive euler rotations compatible
+        x_rotation = np.unwrap(np.arctan2(-direction[..., 1], direction[..., 2]), axis=0)
+        y_rotation = np.arcsin(np.clip(direction[..., 0], -1, 1))
+        rotations[:, stretched, 0] = np.degrees(x_rotation)
+        rotations[:, stretched, 1] = np.degrees(y_rotation)
+
+    return heads, rotations
+
+
+def flat_joints(joint_names):
+    # every joint is a child of the root '__0' with 6 channels and an end site one unit up the z axis,
+    # like the armature that Blender exports
+    joints = [{"name": "__0", "parent": -1, "offset": [0.0, 0.0, 0.0], "channels": [], "end_site": None}]
+    for name in joint_names:
+        joints.append({"name": name, "parent": 0, "offset": [0.0, 0.0, 0.0], "channels": list(joint_channels), "end_site": [0.0, 0.0, 1.0]})
+
+    return joints
+
+
+def prune_channels(joint_names, positions, rotations, anchor_names = {}, tolerance = 5e-7):
+    # joints and motion columns of a reduced file: rotation channels that stay 0 are dropped, positions that stay
+    # the same are moved into the OFFSET, and joints that always share their position get one parent joint with
+    # the position channels and keep only their rotation channels; anchor_names maps a joint to the name of
+    # that parent joint (e.g. the start landmark of the bone)
+    positions = np.asarray(positions, dtype=np.float64)
+    rotations = np.asarray(rotations, dtype=np.float64)
+
+    # joints with exactly the same position in every frame, keyed by the position values as written to the file
+    groups = {}
+    for j in range(len(joint_names)):
+        key = np.round(positions[:, j] * 1e6).astype(np.int64).tobytes()
+        groups.setdefault(key, []).append(j)
+    group_of = {}
+    for members in groups.values():
+        for j in members:
+            group_of[j] = members
+
+    joints = [{"name": "__0", "parent": -1, "offset": [0.0, 0.0, 0.0], "channels": [], "end_site": None}]
+    columns = []
+
+    def add_positions(joint, values):
+        if values.size and np.all(np.ptp(values, axis=0) <= tolerance):
+            # the joint never moves, its position is the offset
+            joint["offset"] = [float(v) for v in values[0]]
+        else:
+            joint["channels"] += joint_channels[:3]
+            columns.extend(values.T)
+
+    def add_rotations(joint, values):
+        for axis in range(3):
+            if not np.all(np.abs(values[:, axis]) <= tolerance):
+                joint["channels"].append(joint_channels[3 + axis])
+                columns.append(values[:, axis])
+
+    used_names = set(joint_names)
+    for j, name in enumerate(joint_names):
+        members = group_of[j]
+        if len(members) == 1:
+            joint = {"name": name, "parent": 0, "offset": [0.0, 0.0, 0.0], "channels": [], "end_site": [0.0, 0.0, 1.0]}
+            joints.append(joint)
+            add_positions(joint, positions[:, j])
+            add_rotations(joint, rotations[:, j])
+        elif j == members[0]:
+            # one position-only parent for the whole group, written where its first joint was
+            anchor_name = anchor_names.get(name, name) + "_position"
+            while anchor_name in used_names:
+                anchor_name += "_"
+            used_names.add(anchor_name)
+            anchor = {"name": anchor_name, "parent": 0, "offset": [0.0, 0.0, 0.0], "channels": [], "end_site": None}
+            joints.append(anchor)
+            add_positions(anchor, positions[:, j])
+            parent = len(joints) - 1
+            for member in members:
+                joint = {"name": joint_names[member], "parent": parent, "offset": [0.0, 0.0, 0.0], "channels": [], "end_site": [0.0, 0.0, 1.0]}
+                joints.append(joint)
+                add_rotations(joint, rotations[:, member])
+
+    motion = np.stack(columns, axis=1) if columns else np.zeros((len(positions), 0))
+
+    return joints, motion
+
+
+def flat_channels(clip):
+    # joint names, positions and rotations of a BvhClip with the flat layout that Blender exports
+    joints = clip.joints[1:]
+    if any(j["parent"] != 0 or j["channels"] != joint_channels for j in joints):
+        raise ValueError("only BVH files with 6 channels per joint directly under the root can be pruned")
+    motion = np.asarray(clip.motion, dtype=np.float64).reshape(clip.frame_count, len(joints), 6)
+
+    return [j["name"] for j in joints], motion[..., :3], motion[..., 3:]
+
+
+def format_offset(offset):
+    return " ".join("%f" % v for v in offset)
+
+
+def hierarchy_lines(joints):
+    children = [[] for _ in joints]
+    for id, joint in enumerate(joints):
+        if joint["parent"] >= 0:
+            children[joint["parent"]].append(id)
+
+    # the root block is written like Blender writes the root of several armature roots
+    lines = ["HIERARCHY", "ROOT " + joints[0]["name"], "{", "\tOFFSET 0.0 0.0 0.0", "\tCHANNELS 0"]
+
+    def add_joint(id, depth):
+        indent = "\t" * depth
+        joint = joints[id]
+        lines.extend([
+            indent + "JOINT " + joint["name"],
+            indent + "{",
+            indent + "\tOFFSET " + format_offset(joint["offset"]),
+            indent + "\tCHANNELS " + " ".join([str(len(joint["channels"]))] + joint["channels"])
+        ])
+        for child in children[id]:
+            add_joint(child, depth + 1)
+        if joint["end_site"] is not None:
+            lines.extend([indent + "\tEnd Site", indent + "\t{", indent + "\t\tOFFSET " + format_offset(joint["end_site"]), indent + "\t}"])
+        lines.append(indent + "}")
+
+    for child in children[0]:
+        add_joint(child, 1)
+    lines.append("}")
+
+    return lines
+
+
+def write_bvh(file_url, joints, motion, frame_time = frame_time):
+    # joints are dicts like in bvh_reader.BvhClip in depth-first order, motion has one column per channel
+    lines = hierarchy_lines(joints) + ["MOTION", "Frames: " + str(len(motion)), "Frame Time: %f" % frame_time]
+
+    with open(file_url, 'w', newline='\n') as f:
+        f.write("\n".join(lines) + "\n")
+        np.savetxt(f, motion, fmt='%f', delimiter=' ', newline=' \n')
+
+
+def write_landmarks_bvh(file_url, store, frame_time = frame_time, prune = False, simplify = None, stats = None):
+    bone_connections = get_all_bone_connections()
+    joint_names = [bone_name for bone_name, _, _ in bone_connections]
+    positions, rotations = compute_bone_channels(store, bone_connections)
+    if prune:
+        # the shared position of a group of bones is the position of their start landmark
+        joints, motion = prune_channels(joint_names, positions, rotations, {bone_name: start_lm for bone_name, start_lm, _ in bone_connections})
+    else:
+        joints = flat_joints(joint_names)
+        # one line per frame with position and rotation channels of all joints
+        motion = np.concatenate([positions, rotations], axis=2).reshape(len(positions), -1)
+    if simplify is not None:
+        motion = keyframe_reduction.simplify_motion(motion, simplify, stats)
+    write_bvh(file_url, joints, motion, frame_time)
+
+
+def prune_bvh_file(file_url, output_url, tolerance = 5e-7, simplify = None, stats = None):
+    # writes a reduced copy of a BVH file exported by Blender, returns the channel counts before and after;
+    # Blender's exported z rotations are not exactly 0, a tolerance of e.g. 0.001 degrees drops them anyway
+    with open(file_url) as f:
+        clip = bvh_reader.parse_bvh(f.read(), dtype=np.float64)
+    joints, motion = prune_channels(*flat_channels(clip), tolerance = tolerance)
+    if simplify is not None:
+        motion = keyframe_reduction.simplify_motion(motion, simplify, stats)
+    write_bvh(output_url, joints, motion, clip.frame_time)
+
+    return clip.motion.shape[1], motion.shape[1]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write a BVH file from a landmark file without Blender.')
+    parser.add_argument('landmark_file', help='.npz landmark file, e.g. written by batch_extract.py, or a .bvh file to prune')
+    parser.add_argument('bvh_file', nargs='?', help='output file (default: landmark file with .bvh extension)')
+    parser.add_argument('--frame-time', type=float, default=frame_time, help='seconds per frame (default: %(default)f)')
+    parser.add_argument('--prune', action='store_true', help='leave out constant and duplicated channels')
+    parser.add_argument('--simplify', type=float, metavar='TOLERANCE', help='lossy: move every channel onto a linear curve through as few keys as possible that deviates at most this much; '
+                        'every frame is still written, so the BVH file does not get smaller, only its motion_archive.py archive')
+    parser.add_argument('--tolerance', type=float, default=5e-7, help='largest change of a channel that counts as constant when pruning a .bvh file (default: %(default)g)')
+    args = parser.parse_args()
+
+    stats = keyframe_reduction.ReductionStats()
+    if args.landmark_file.lower().endswith('.bvh'):
+        # reduce a BVH file that was already exported
+        bvh_file = args.bvh_file or os.path.splitext(args.landmark_file)[0] + '.pruned.bvh'
+        channels_before, channels_after = prune_bvh_file(args.landmark_file, bvh_file, args.tolerance, args.simplify, stats)
+        if args.simplify is not None:
+            print('keys: ' + str(stats))
+        size_before = os.path.getsize(args.landmark_file)
+    else:
+        bvh_file = args.bvh_file or os.path.splitext(args.landmark_file)[0] + '.bvh'
+        store = landmark_store.load_landmark_file(args.landmark_file)
+        write_landmarks_bvh(bvh_file, store, args.frame_time, args.prune, args.simplify, stats)
+        if args.simplify is not None:
+            print('keys: ' + str(stats))
+        if not args.prune:
+            sys.exit()
+        # size of the file without pruning for the report
+        channels_before = len(joint_channels) * len(get_all_bone_connections())
+        channels_after = bvh_reader.load_bvh(bvh_file, use_sidecar = False).motion.shape[1]
+        with tempfile.TemporaryDirectory() as tmp:
+            write_landmarks_bvh(os.path.join(tmp, 'full.bvh'), store, args.frame_time)
+            size_before = os.path.getsize(os.path.join(tmp, 'full.bvh'))
+
+    size_after = os.path.getsize(bvh_file)
+    print('channels: %d -> %d, size: %.2f MB -> %.2f MB (%.0f%% smaller)' % (
+        channels_before, channels_after, size_before / 1e6, size_after / 1e6, 100 * (1 - size_after / max(size_before, 1))))
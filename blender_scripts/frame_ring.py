@@ -0,0 +1,200 @@
+"""
+# What does this module do?
+It hands decoded video frames from a decoder process to the inference without sending them through a pipe.
+The frames live in a fixed number of slots of one shared memory block (multiprocessing.shared_memory). The decoder takes a
+free slot, lets OpenCV decode straight into it (VideoCapture.read(image = slot)) and publishes the slot number; the
+reader gets a numpy view of the slot and gives the slot back when it is done with the frame. Only slot numbers travel
+through the queues, so the memory is bounded by the number of slots, and the decoder waits while all slots are in use.
+
+# How to use this module?
+The ring needs numpy and Python 3.8 or newer, decode_video and shared_video_frames also need cv2. seek_video only needs cv2
+and also works with older Python versions, e.g. in Blender 2.91, landmark_extraction.py uses it from here. shared_video_frames can be used
+like landmark_extraction.get_video_frames, e.g. by mp-landmark-annotation/landmark_worker.py:
+    for image in frame_ring.shared_video_frames(file_url, slots = 8):
+        landmarks = landmark_extraction.process_frame(holistic, image)
+A yielded frame is a view of its slot and only valid until the next frame is requested, so it must be copied to be kept.
+benchmarks/benchmark_frame_ring.py compares the ring with sending the frames through a multiprocessing.Queue.
+"""
+
+import multiprocessing, queue
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    # Python 3.7, e.g. in Blender 2.91, has no shared memory, the ring cannot be used there
+    shared_memory = None
+
+import numpy as np
+
+
+########## Variables ##########
+
+## Default number of frame slots
+default_slots = 8
+
+## Slot number of a frame that was skipped by frame_step and has no image
+skipped_slot = -1
+
+## Seconds the reader waits for a frame before it checks whether the decoder process is still running
+decoder_check_interval = 1.0
+
+
+########## Class definitions ##########
+
+class FrameRing:
+    def __init__(self, memory, slots, shape, dtype, free, filled, owner):
+        self.memory = memory
+        self.slots = slots
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        # slot numbers that can be written, and (slot, frame id) of the written ones or None at the end
+        self.free = free
+        self.filled = filled
+        # the creating process removes the shared memory when it closes the ring
+        self.owner = owner
+        self.frames = np.ndarray((slots,) + self.shape, dtype=self.dtype, buffer=memory.buf)
+
+    @classmethod
+    def create(cls, slots, shape, dtype = np.uint8, context = None):
+        context = context or multiprocessing.get_context()
+        dtype = np.dtype(dtype)
+        memory = shared_memory.SharedMemory(create=True, size=max(1, slots * int(np.prod(shape)) * dtype.itemsize))
+        free, filled = context.Queue(), context.Queue()
+        for slot in range(slots):
+            free.put(slot)
+
+        return cls(memory, slots, shape, dtype, free, filled, True)
+
+    def handle(self):
+        # everything another process needs for attach, to be passed as argument of multiprocessing.Process
+        return self.memory.name, self.slots, self.shape, self.dtype.str, self.free, self.filled
+
+    @classmethod
+    def attach(cls, handle):
+        name, slots, shape, dtype, free, filled = handle
+        return cls(shared_memory.SharedMemory(name=name), slots, shape, dtype, free, filled, False)
+
+    def acquire(self, timeout = None):
+        # number of a free slot for the writer, waits while the readers hold all slots
+        return self.free.get(timeout=timeout)
+
+    def publish(self, slot, frame_id):
+        self.filled.put((slot, frame_id))
+
+    def finish(self, readers = 1):
+        # tells every reader that no more frames come
+        for _ in range(readers):
+            self.filled.put(None)
+
+    def take(self, timeout = None):
+        # (slot, frame id) of the next written frame, None after the last one
+        return self.filled.get(timeout=timeout)
+
+    def release(self, slot):
+        if slot != skipped_slot:
+            self.free.put(slot)
+
+    def close(self):
+        self.frames = None
+        try:
+            self.memory.close()
+        except BufferError:
+            # a view of a slot is still referenced, the mapping goes away with it
+            pass
+        if self.owner:
+            self.memory.unlink()
+
+
+########## Method definitions ##########
+
+def decode_video(file_url, handle, frame_step = 1, readers = 1, start_frame = 0):
+    # runs in the decoder process: decodes every frame_step-th frame into a free slot, the frames in between are only grabbed
+    ring = None
+    vidcap = None
+    try:
+        import cv2
+
+        ring = FrameRing.attach(handle)
+        vidcap = cv2.VideoCapture(file_url)
+        frame_id = start_frame
+        if start_frame > 0:
+            seek_video(vidcap, start_frame)
+        while True:
+            if frame_id % frame_step != 0:
+                if not vidcap.grab():
+                    break
+                ring.publish(skipped_slot, frame_id)
+            else:
+                slot = ring.acquire()
+                view = ring.frames[slot]
+                success, image = vidcap.read(image=view)
+                if not success:
+                    ring.release(slot)
+                    break
+                if not np.shares_memory(image, view):
+                    # OpenCV allocated a new image, e.g. because the slot did not fit
+                    view[...] = image
+                ring.publish(slot, frame_id)
+            frame_id += 1
+    finally:
+        if vidcap is not None:
+            vidcap.release()
+        if ring is not None:
+            ring.finish(readers)
+            ring.close()
+
+
+def seek_video(vidcap, frame_id):
+    import cv2
+
+    vidcap.set(cv2.CAP_PROP_POS_FRAMES, frame_id)
+    if int(vidcap.get(cv2.CAP_PROP_POS_FRAMES)) != frame_id:
+        # the container cannot seek to the frame, so the frames are skipped one by one
+        vidcap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        for _ in range(frame_id):
+            if not vidcap.grab():
+                break
+
+
+def video_frame_shape(file_url):
+    import cv2
+
+    vidcap = cv2.VideoCapture(file_url)
+    shape = int(vidcap.get(cv2.CAP_PROP_FRAME_HEIGHT)), int(vidcap.get(cv2.CAP_PROP_FRAME_WIDTH)), 3
+    vidcap.release()
+
+    return shape
+
+
+def shared_video_frames(file_url, slots = default_slots, frame_step = 1, start_frame = 0):
+    # yields views of the decoded frames (None for frames skipped by frame_step), decoded by a separate process
+    ring = FrameRing.create(slots, video_frame_shape(file_url))
+    decoder = multiprocessing.Process(target=decode_video, args=(file_url, ring.handle(), frame_step, 1, start_frame), daemon=True)
+    decoder.start()
+    try:
+        while True:
+            try:
+                item = ring.take(timeout=decoder_check_interval)
+            except queue.Empty:
+                if decoder.is_alive():
+                    continue
+                try:
+                    # what the decoder sent before it exited is in the queue by now
+                    item = ring.take(timeout=decoder_check_interval)
+                except queue.Empty:
+                    # the decoder died without announcing the end, e.g. it was killed or could not attach the ring
+                    raise RuntimeError("the decoder process of '%s' exited with code %s" % (file_url, decoder.exitcode))
+            if item is None:
+                break
+            slot, _ = item
+            yield None if slot == skipped_slot else ring.frames[slot]
+            # the consumer asked for the next frame, so it is done with this slot
+            ring.release(slot)
+        decoder.join()
+        if decoder.exitcode != 0:
+            raise RuntimeError("the decoder process of '%s' exited with code %d" % (file_url, decoder.exitcode))
+    finally:
+        if decoder.is_alive():
+            # the consumer stopped early, the decoder may be waiting for a free slot
+            decoder.terminate()
+            decoder.join()
+        ring.close()
@@ -0,0 +1,147 @@
+"""
+# What does this module do?
+It removes keyframes of dense animation curves (one key per frame) that linear interpolation between the remaining
+keys reproduces within a tolerance. The keys are chosen like the Ramer-Douglas-Peucker algorithm: starting with the
+first and last key, the key with the largest deviation from the interpolated curve is kept until no key deviates
+more than the tolerance. Every reduction reports how many keys were removed and the largest deviation.
+
+# How to use this module?
+It only needs numpy. simplify_keys works on arrays, simplify_fcurve and simplify_action take Blender F-curves and
+actions that are passed in (the module does not import bpy), e.g. in Blender's Python console
+    keyframe_reduction.simplify_action(bpy.data.objects['Genesis8Female'].animation_data.action, 0.001)
+The interpolation of the remaining keys is set to linear, since that is what the tolerance refers to.
+"""
+
+import numpy as np
+
+
+########## Variables ##########
+
+## Value of the LINEAR interpolation in the enum of Blender's keyframe points
+linear_interpolation = 1
+
+
+########## Class definitions ##########
+
+class ReductionStats:
+    def __init__(self):
+        self.keys_before = 0
+        self.keys_after = 0
+        self.max_deviation = 0.0
+
+    def add(self, keys_before, keys_after, deviation):
+        self.keys_before += keys_before
+        self.keys_after += keys_after
+        self.max_deviation = max(self.max_deviation, float(deviation))
+
+    def __str__(self):
+        removed = self.keys_before - self.keys_after
+        return "%d of %d keys removed (%.0f%%), max deviation %g" % (
+            removed, self.keys_before, 100 * removed / max(self.keys_before, 1), self.max_deviation)
+
+
+########## Method definitions ##########
+
+def simplify_keys(frames, values, tolerance):
+    # bool mask of the keys to keep; values is (keys,) or (keys, channels), the channels share their keys
+    frames = np.asarray(frames, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64).reshape(len(frames), -1)
+    keep = np.zeros(len(frames), dtype=bool)
+    if len(frames) <= 2:
+        keep[:] = True
+        return keep
+
+    keep[0] = keep[-1] = True
+    segments = [(0, len(frames) - 1)]
+    while segments:
+        start, end = segments.pop()
+        if end - start < 2:
+            continue
+        # deviation of the keys in between from the line between start and end
+        t = (frames[start + 1:end] - frames[start]) / (frames[end] - frames[start])
+        line = values[start] + t[:, None] * (values[end] - values[start])
+        deviation = np.abs(values[start + 1:end] - line).max(axis=1)
+        worst = int(deviation.argmax())
+        if deviation[worst] > tolerance:
+            split = start + 1 + worst
+            keep[split] = True
+            segments += [(start, split), (split, end)]
+
+    return keep
+
+
+def interpolate_keys(frames, values, keep):
+    # values of the linear curve through the kept keys at all frames
+    frames = np.asarray(frames, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    flat = values.reshape(len(frames), -1)
+    curve = np.stack([np.interp(frames, frames[keep], flat[keep, c]) for c in range(flat.shape[1])], axis=1)
+
+    return curve.reshape(values.shape)
+
+
+def max_deviation(frames, values, keep):
+    if len(frames) == 0:
+        return 0.0
+    return float(np.abs(interpolate_keys(frames, values, keep) - np.asarray(values, dtype=np.float64)).max())
+
+
+def simplify_motion(motion, tolerance, stats = None):
+    # every (frames, channels) column snapped to its simplified linear curve, e.g. for BVH files that need every frame
+    motion = np.asarray(motion, dtype=np.float64)
+    frames = np.arange(len(motion))
+    simplified = np.empty_like(motion)
+    for c in range(motion.shape[1]):
+        keep = simplify_keys(frames, motion[:, c], tolerance)
+        simplified[:, c] = interpolate_keys(frames, motion[:, c], keep)
+        if stats is not None:
+            stats.add(len(frames), int(keep.sum()), np.abs(simplified[:, c] - motion[:, c]).max() if len(frames) else 0)
+
+    return simplified
+
+
+def set_linear_keys(fcurves, frames, values, tolerance = None, stats = None):
+    # fill empty F-curves (one per column of values) with the keys that are needed for the tolerance at once,
+    # with None every frame gets a key with the default interpolation; returns the number of written keys
+    values = np.asarray(values).reshape(len(frames), -1)
+    written = 0
+    for column, fcurve in enumerate(fcurves):
+        keep = np.ones(len(frames), dtype=bool) if tolerance is None else simplify_keys(frames, values[:, column], tolerance)
+        co = np.empty((int(keep.sum()), 2), dtype=np.float32)
+        co[:, 0] = np.asarray(frames)[keep]
+        co[:, 1] = values[keep, column]
+        fcurve.keyframe_points.add(len(co))
+        fcurve.keyframe_points.foreach_set('co', co.ravel())
+        if tolerance is not None:
+            fcurve.keyframe_points.foreach_set('interpolation', [linear_interpolation] * len(co))
+            if stats is not None:
+                stats.add(len(frames), len(co), max_deviation(frames, values[:, column], keep))
+        fcurve.update()
+        written += len(co)
+
+    return written
+
+
+def simplify_fcurve(fcurve, tolerance, stats = None):
+    # remove the keys of an existing F-curve that are not needed for the tolerance
+    count = len(fcurve.keyframe_points)
+    co = np.empty(count * 2, dtype=np.float32)
+    fcurve.keyframe_points.foreach_get('co', co)
+    co = co.reshape(count, 2)
+    keep = simplify_keys(co[:, 0], co[:, 1], tolerance)
+
+    # backwards, so the indices of the keys still to remove do not change
+    for id in np.flatnonzero(~keep)[::-1]:
+        fcurve.keyframe_points.remove(fcurve.keyframe_points[int(id)], fast = True)
+    fcurve.keyframe_points.foreach_set('interpolation', [linear_interpolation] * int(keep.sum()))
+    fcurve.update()
+    if stats is not None:
+        stats.add(count, int(keep.sum()), max_deviation(co[:, 0], co[:, 1], keep))
+
+
+def simplify_action(action, tolerance):
+    stats = ReductionStats()
+    for fcurve in action.fcurves:
+        simplify_fcurve(fcurve, tolerance, stats)
+
+    return stats
@@ -0,0 +1,115 @@
+"""
+# What does this module do?
+It keeps the landmark arrays of already analyzed videos on disk, so MediaPipe Holistic only has to run once per clip.
+An entry is keyed by a hash of the video content and of the Holistic configuration.
+Every body part is stored as an uncompressed .npy file that is memory-mapped when the entry is loaded again,
+together with a presence mask for the frames in which the part was not detected.
+When the cache grows beyond its size limit the least recently used entries are deleted, together with the chunk folders
+of analyses that never finished (see landmark_chunks.py) and temporary folders of interrupted writes.
+
+# How to use this module?
+It does not depend on Blender. Call load_landmarks with the key from cache_key and, if nothing was found,
+run the analysis and hand the resulting LandmarkStore to store_landmarks.
+"""
+
+import hashlib, json, os, shutil, time
+
+import numpy as np
+
+from landmark_store import LandmarkStore, landmark_parts
+
+
+########## Variables ##########
+
+## Increase when the layout of an entry changes, so old entries are not read anymore
+cache_format_version = 1
+
+## Default size limit of the cache directory in bytes
+default_max_size = 2 * 1024 ** 3
+
+## Seconds after which a temporary folder of an interrupted store_landmarks is deleted
+stale_tmp_age = 3600
+
+
+########## Method definitions ##########
+
+def video_hash(file_url, chunk_size = 1024 * 1024):
+    h = hashlib.sha256()
+    with open(file_url, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+
+    return h.hexdigest()
+
+
+def cache_key(file_url, settings = {}):
+    # the key changes if the video content or any setting that influences the landmarks changes
+    description = json.dumps({
+        "format": cache_format_version,
+        "video": video_hash(file_url),
+        "settings": settings
+    }, sort_keys=True)
+
+    return hashlib.sha256(description.encode('utf-8')).hexdigest()
+
+
+def load_landmarks(cache_dir, key):
+    entry_dir = os.path.join(cache_dir, key)
+    if not os.path.isfile(os.path.join(entry_dir, 'info.json')):
+        return None
+
+    coords, masks = {}, {}
+    for part, _ in landmark_parts:
+        coords[part] = np.load(os.path.join(entry_dir, part + '.npy'), mmap_mode='r')
+        masks[part] = np.load(os.path.join(entry_dir, part + '_mask.npy'))
+
+    # mark the entry as recently used
+    os.utime(entry_dir)
+
+    return LandmarkStore(coords, masks)
+
+
+def store_landmarks(cache_dir, key, store, info = {}, max_size = default_max_size):
+    entry_dir = os.path.join(cache_dir, key)
+    # write into a temporary folder first, so an interrupted run never leaves a half written entry
+    tmp_dir = entry_dir + '.tmp-' + str(os.getpid())
+    os.makedirs(tmp_dir, exist_ok=True)
+    for part, _ in landmark_parts:
+        np.save(os.path.join(tmp_dir, part + '.npy'), np.ascontiguousarray(store.coords[part], dtype=np.float32))
+        np.save(os.path.join(tmp_dir, part + '_mask.npy'), np.asarray(store.masks[part], dtype=bool))
+
+    with open(os.path.join(tmp_dir, 'info.json'), 'w') as f:
+        json.dump(dict(info, created=time.time()), f, indent=2)
+
+    shutil.rmtree(entry_dir, ignore_errors=True)
+    os.replace(tmp_dir, entry_dir)
+
+    evict_entries(cache_dir, max_size, keep=key)
+
+
+def entry_size(entry_dir):
+    return sum(e.stat().st_size for e in os.scandir(entry_dir) if e.is_file())
+
+
+def evict_entries(cache_dir, max_size = default_max_size, keep = None):
+    entries = []
+    for e in os.scandir(cache_dir):
+        if not e.is_dir():
+            continue
+        if '.tmp-' in e.name:
+            # a temporary folder of store_landmarks that was never renamed, the writing process stopped
+            if time.time() - e.stat().st_mtime > stale_tmp_age:
+                shutil.rmtree(e.path, ignore_errors=True)
+        elif os.path.isfile(os.path.join(e.path, 'info.json')) or e.name.endswith('.chunks'):
+            # entries and the chunk folders of unfinished analyses (see landmark_chunks.py)
+            entries.append((e.stat().st_mtime, e.name, entry_size(e.path)))
+
+    # delete the least recently used entries until the cache fits into max_size again
+    total = sum(size for _, _, size in entries)
+    for _, name, size in sorted(entries):
+        if total <= max_size:
+            break
+        if name in (keep, str(keep) + '.chunks'):
+            continue
+        shutil.rmtree(os.path.join(cache_dir, name), ignore_errors=True)
+        total -= size
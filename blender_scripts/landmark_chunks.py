@@ -0,0 +1,151 @@
+"""
+# What does this module do?
+It writes the landmarks of a running analysis to disk in chunks of a fixed number of frames, so the work is not lost when
+the analysis of a long recording crashes or is cancelled. Every complete chunk is a landmark file "chunk_00000.npz"
+(see landmark_store.save_landmark_file) in a chunk folder, and "progress.json" records how many chunks and frames are done
+and whether the video is finished. A rerun continues after the last complete chunk. The chunks can be read while the
+analysis is still running, e.g. by another process that builds the BVH file or the scene from the finished part.
+
+# How to use this module?
+It only needs numpy. landmark_extraction.extract_landmarks_chunked writes the chunks, load_mp_landmarks.py uses it
+with checkpoint_chunk_frames and keeps the chunk folder next to the landmark cache entry of the video until the video is done.
+To consume the chunks of a running analysis:
+    for first_frame, store in landmark_chunks.iter_chunks(chunk_folder, wait = True):
+        ...
+"""
+
+import json, os, shutil, time
+
+import numpy as np
+
+import landmark_store
+
+
+########## Variables ##########
+
+## Default number of frames per chunk
+default_chunk_frames = 250
+
+## Name of the progress file in a chunk folder
+progress_file_name = "progress.json"
+
+## Seconds without a new chunk after which iter_chunks stops waiting, e.g. because the analysis crashed or was cancelled
+default_stale_timeout = 300
+
+
+########## Class definitions ##########
+
+class ChunkWriter:
+    def __init__(self, chunk_dir, chunk_frames = default_chunk_frames, info = {}):
+        # continues the chunks in chunk_dir if they were written with the same chunk size, otherwise starts over
+        self.chunk_dir = chunk_dir
+        self.chunk_frames = chunk_frames
+        self.info = info
+        progress = read_progress(chunk_dir)
+        if progress is None or progress["chunk_frames"] != chunk_frames:
+            remove_chunks(chunk_dir)
+            progress = {"chunks": 0, "frames": 0, "finished": False}
+        os.makedirs(chunk_dir, exist_ok=True)
+        self.chunks = progress["chunks"]
+        # frames in the complete chunks, the first frame that a rerun has to analyze
+        self.frames = progress["frames"]
+        self.finished = progress["finished"]
+        self.pending = {part: [] for part, _ in landmark_store.landmark_parts}
+
+    def add(self, landmarks):
+        # landmarks of the next frame (part -> (landmarks, 3) array or None), None for a frame without analysis
+        for part, _ in landmark_store.landmark_parts:
+            self.pending[part].append(None if landmarks is None else landmarks[part])
+        if len(self.pending["pose"]) == self.chunk_frames:
+            self.write_chunk()
+
+    def finish(self):
+        # writes the last, shorter chunk and marks the video as done
+        if self.pending["pose"]:
+            self.write_chunk()
+        self.finished = True
+        self.write_progress()
+
+    def write_chunk(self):
+        # the chunk is complete on disk before the progress file counts it
+        tmp_url = os.path.join(self.chunk_dir, "chunk.tmp.npz")
+        landmark_store.save_landmark_file(tmp_url, landmark_store.LandmarkStore.from_frames(self.pending))
+        os.replace(tmp_url, chunk_path(self.chunk_dir, self.chunks))
+        self.chunks += 1
+        self.frames += len(self.pending["pose"])
+        self.pending = {part: [] for part, _ in landmark_store.landmark_parts}
+        self.write_progress()
+
+    def write_progress(self):
+        write_json(os.path.join(self.chunk_dir, progress_file_name), {
+            "chunk_frames": self.chunk_frames,
+            "chunks": self.chunks,
+            "frames": self.frames,
+            "finished": self.finished,
+            "info": self.info
+        })
+
+
+########## Method definitions ##########
+
+def chunk_folder(base_dir, key):
+    # chunk folder of a video, e.g. next to its landmark cache entry with the same key
+    return os.path.join(base_dir, key + ".chunks")
+
+
+def chunk_path(chunk_dir, index):
+    return os.path.join(chunk_dir, "chunk_%05d.npz" % index)
+
+
+def write_json(file_url, content):
+    # replaces the file in one step, so a reader never sees half of it
+    tmp_url = file_url + ".tmp"
+    with open(tmp_url, 'w') as f:
+        json.dump(content, f, indent=2)
+    os.replace(tmp_url, file_url)
+
+
+def read_progress(chunk_dir):
+    try:
+        with open(os.path.join(chunk_dir, progress_file_name)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def load_chunk(chunk_dir, index):
+    return landmark_store.load_landmark_file(chunk_path(chunk_dir, index))
+
+
+def iter_chunks(chunk_dir, start_chunk = 0, wait = False, poll_interval = 0.5, stale_timeout = default_stale_timeout):
+    # yields (first frame, LandmarkStore) of every complete chunk; with wait it also waits for the chunks of a running
+    # analysis until the video is finished and raises TimeoutError if no chunk came for stale_timeout seconds
+    index = start_chunk
+    last_chunk_time = time.monotonic()
+    while True:
+        progress = read_progress(chunk_dir)
+        if progress is not None and index < progress["chunks"]:
+            yield index * progress["chunk_frames"], load_chunk(chunk_dir, index)
+            index += 1
+            last_chunk_time = time.monotonic()
+            continue
+        if not wait or (progress is not None and progress["finished"]):
+            return
+        if stale_timeout is not None and time.monotonic() - last_chunk_time > stale_timeout:
+            raise TimeoutError("no new chunk in '%s' for %g seconds, the analysis seems to have stopped" % (chunk_dir, stale_timeout))
+        time.sleep(poll_interval)
+
+
+def join_chunks(chunk_dir):
+    # one LandmarkStore of all complete chunks
+    stores = [store for _, store in iter_chunks(chunk_dir)]
+    coords = {part: np.concatenate([s.coords[part] for s in stores]) if stores else np.zeros((0, l_count, 3), dtype=np.float32)
+              for part, l_count in landmark_store.landmark_parts}
+    masks = {part: np.concatenate([s.masks[part] for s in stores]) if stores else np.zeros(0, dtype=bool)
+             for part, _ in landmark_store.landmark_parts}
+
+    return landmark_store.LandmarkStore(coords, masks)
+
+
+def remove_chunks(chunk_dir):
+    shutil.rmtree(chunk_dir, ignore_errors=True)
@@ -0,0 +1,283 @@
+"""
+# What does this module do?
+It defines the names of the MediaPipe landmarks and which landmarks are connected by the bones of the
+motion capture skeleton. load_mp_landmarks.py builds the armature in Blender from these definitions
+and bvh_writer.py computes the same skeleton without Blender.
+
+# How to use this module?
+It does not depend on Blender and is imported by the scripts in this folder.
+"""
+
+
+########## Variables ##########
+
+## Landmark names
+pose_landmark_names = [
+  "NOSE",
+  "LEFT_EYE_INNER",
+  "LEFT_EYE",
+  "LEFT_EYE_OUTER",
+  "RIGHT_EYE_INNER",
+  "RIGHT_EYE",
+  "RIGHT_EYE_OUTER",
+  "LEFT_EAR",
+  "RIGHT_EAR",
+  "MOUTH_LEFT",
+  "MOUTH_RIGHT",
+  "LEFT_SHOULDER",
+  "RIGHT_SHOULDER",
+  "LEFT_ELBOW",
+  "RIGHT_ELBOW",
+  "LEFT_WRIST",
+  "RIGHT_WRIST",
+  "LEFT_PINKY",
+  "RIGHT_PINKY",
+  "LEFT_INDEX",
+  "RIGHT_INDEX",
+  "LEFT_THUMB",
+  "RIGHT_THUMB",
+  "LEFT_HIP",
+  "RIGHT_HIP",
+  "LEFT_KNEE",
+  "RIGHT_KNEE",
+  "LEFT_ANKLE",
+  "RIGHT_ANKLE",
+  "LEFT_HEEL",
+  "RIGHT_HEEL",
+  "LEFT_FOOT_INDEX",
+  "RIGHT_FOOT_INDEX"
+]
+
+hand_landmark_names = [
+  "WRIST",
+  "THUMB_CMC",
+  "THUMB_MCP",
+  "THUMB_IP",
+  "THUMB_TIP",
+  "INDEX_FINGER_MCP",
+  "INDEX_FINGER_PIP",
+  "INDEX_FINGER_DIP",
+  "INDEX_FINGER_TIP",
+  "MIDDLE_FINGER_MCP",
+  "MIDDLE_FINGER_PIP",
+  "MIDDLE_FINGER_DIP",
+  "MIDDLE_FINGER_TIP",
+  "RING_FINGER_MCP",
+  "RING_FINGER_PIP",
+  "RING_FINGER_DIP",
+  "RING_FINGER_TIP",
+  "PINKY_MCP",
+  "PINKY_PIP",
+  "PINKY_DIP",
+  "PINKY_TIP"
+]
+
+## Landmark connections (create bones out of two landmarks)
+pose_landmark_connections = [
+  ("LEFT_SHOULDER", "LEFT_ELBOW"),
+  ("LEFT_ELBOW", "LEFT_WRIST"),
+  ("RIGHT_SHOULDER", "RIGHT_ELBOW"),
+  ("RIGHT_ELBOW", "RIGHT_WRIST"),
+
+  ("RIGHT_WRIST", "RIGHT_INDEX"), # hand bone right
+  ("LEFT_WRIST", "LEFT_INDEX"), # hand bone left
+  
+  ("LEFT_SHOULDER", "RIGHT_SHOULDER"), # for left collar (invert all axes)
+  ("RIGHT_SHOULDER", "LEFT_SHOULDER"), # for right collar (invert all axes)
+  
+  ("152", "0", "NECK"), # below jaw to lip upper middle to simulate neck bone
+  ("0", "6", "HEAD"), # lip upper middle to mid nose bridge to simulate head bone
+  ("152", "10", "HEAD_NECK") # below jaw to highest face point
+]
+
+hand_landmark_connections = [
+  ("WRIST", "THUMB_MCP"),
+  ("THUMB_MCP", "THUMB_IP"),
+  ("THUMB_IP", "THUMB_TIP"),
+
+  ("WRIST", "INDEX_FINGER_MCP"),
+  ("INDEX_FINGER_MCP", "INDEX_FINGER_PIP"),
+  ("INDEX_FINGER_PIP", "INDEX_FINGER_DIP"),
+  ("INDEX_FINGER_DIP", "INDEX_FINGER_TIP"),
+  
+  ("WRIST", "MIDDLE_FINGER_MCP"),
+  ("MIDDLE_FINGER_MCP", "MIDDLE_FINGER_PIP"),
+  ("MIDDLE_FINGER_PIP", "MIDDLE_FINGER_DIP"),
+  ("MIDDLE_FINGER_DIP", "MIDDLE_FINGER_TIP"),
+  
+  ("WRIST", "RING_FINGER_MCP"),
+  ("RING_FINGER_MCP", "RING_FINGER_PIP"),
+  ("RING_FINGER_PIP", "RING_FINGER_DIP"),
+  ("RING_FINGER_DIP", "RING_FINGER_TIP"),
+  
+  ("WRIST", "PINKY_MCP"),
+  ("PINKY_MCP", "PINKY_PIP"),
+  ("PINKY_PIP", "PINKY_DIP"),
+  ("PINKY_DIP", "PINKY_TIP")
+]
+
+face_landmark_connections = [
+    ("RIGHT_EYE", "133"), # right eyelid inner
+    ("RIGHT_EYE", "33"),  # right eyelid outer
+    ("RIGHT_EYE", "159"), # right eyelid upper
+    ("RIGHT_EYE", "160"), # right eyelid upper outer
+    ("RIGHT_EYE", "158"), # right eyelid upper inner
+    ("RIGHT_EYE", "144"), # right eyelid lower outer
+    ("RIGHT_EYE", "153"), # right eyelid lower inner
+    ("RIGHT_EYE", "145"), # right eyelid lower
+
+    ("LEFT_EYE", "362"), # left eyelid inner
+    ("LEFT_EYE", "263"), # left eyelid outer
+    ("LEFT_EYE", "386"), # left eyelid upper
+    ("LEFT_EYE", "387"), # left eyelid upper outer
+    ("LEFT_EYE", "385"), # left eyelid upper inner
+    ("LEFT_EYE", "373"), # left eyelid lower outer
+    ("LEFT_EYE", "380"), # left eyelid lower inner
+    ("LEFT_EYE", "374"),  # left eyelid lower
+    
+    ("RIGHT_EYE", "RIGHT_EYE_INNER"),
+    ("RIGHT_EYE", "RIGHT_EYE_OUTER"),
+    ("LEFT_EYE", "LEFT_EYE_INNER"),
+    ("LEFT_EYE", "LEFT_EYE_OUTER")
+]
+
+# Single bones for face
+pose_landmark_single_bones = [
+    # right eye
+    "RIGHT_EYE",
+    # left eye
+    "LEFT_EYE"
+]
+
+face_landmark_single_bones = [
+    # right eyebrow
+    107, 105, 70,
+    # left eyebrow
+    336, 334, 300,        
+    # center brow
+    9,
+    # mid nose bridge
+    6,
+    # nose
+    4,
+    # right nostril
+    218,
+    # left nostril
+    438,
+    # right nasolabial middle
+    36,
+    # left nasolabial middle
+    266,
+    # right nasolabial upper
+    47,
+    # left nasolabial upper
+    277,
+    # right nasolabial lower
+    202,
+    # left nasolabial lower
+    422,
+    # right squint inner
+    22,
+    # left squint inner
+    252,
+    # right squint outer
+    110,
+    # left squint outer
+    339,
+    # right cheek upper
+    117,
+    # right cheek lower
+    187,
+    # left cheek upper
+    346,
+    # left cheek lower
+    411,
+    # right lip below nose
+    167,
+    # left lip below nose
+    393,
+    # right nasolabial crease
+    92,
+    # left nasolabial crease
+    322,
+    # right nasolabial mouth corner
+    216,
+    # left nasolabial mouth corner
+    436,
+    # right lip corner
+    57,
+    # left lip corner
+    287,
+    # lip upper middle
+    0,
+    # lip lower middle
+    17,
+    # right lip upper inner
+    39,
+    # left lip upper inner
+    269,
+    # right lip upper outer
+    40,
+    # left lip upper outer
+    270,
+    # right lip lower outer
+    321,
+    # left lip lower outer
+    91,
+    # right lip lower inner
+    84,
+    # left lip lower inner
+    314,
+    # lip below
+    18,
+    # chin
+    175,
+    # below jaw
+    152,
+    # right jaw clench
+    177,
+    # left jaw clench
+    401
+]
+
+
+########## Method definitions ##########
+
+def get_bone_connections(landmark_connections = [], first_char = ""):
+    # (bone name, start landmark, target landmark) for every bone between two landmarks
+    bone_connections = []
+    for lc in landmark_connections:
+        # assign start and target landmark names
+        start_lm = first_char + lc[0]
+        target_lm = first_char + lc[1]
+        # name bone after target landmark if no other name is given
+        bone_name = target_lm if len(lc) < 3 else lc[2]
+        bone_connections.append((bone_name, start_lm, target_lm))
+
+    return bone_connections
+
+
+def get_90d_bone_connections(landmark_single_bones = []):
+    # (bone name, landmark, None) for every single bone in 90d angle that only follows one landmark
+    return [(str(lm), str(lm), None) for lm in landmark_single_bones]
+
+
+def get_all_bone_connections():
+    # all bones of the skeleton in the order in which load_mp_landmarks.py creates them:
+    # pose bones (only arms), left hand, right hand, face bones and single bones
+    return get_bone_connections(landmark_connections = pose_landmark_connections) \
+        + get_bone_connections(landmark_connections = hand_landmark_connections, first_char = "L") \
+        + get_bone_connections(landmark_connections = hand_landmark_connections, first_char = "R") \
+        + get_bone_connections(landmark_connections = face_landmark_connections) \
+        + get_90d_bone_connections(face_landmark_single_bones) \
+        + get_90d_bone_connections(pose_landmark_single_bones)
+
+
+def get_landmark_object_names():
+    # names of the landmark objects of every body part, as used for the ico spheres in Blender
+    return {
+        "pose": list(pose_landmark_names),
+        "left_hand": ["L" + name for name in hand_landmark_names],
+        "right_hand": ["R" + name for name in hand_landmark_names],
+        "face": [str(id) for id in range(0, 468)]
+    }
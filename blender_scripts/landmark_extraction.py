@@ -0,0 +1,291 @@
+"""
+# What does this module do?
+It decodes video files frame by frame and runs MediaPipe Holistic on them.
+The results are returned as LandmarkStore with one array per body part (see landmark_store.py).
+The frames can be downscaled and cropped to the signer before the inference (input_settings), the landmarks are
+mapped back to normalized coordinates of the whole frame, so everything downstream stays the same.
+With a frame_step above 1 only every n-th frame is analyzed. The skipped frames stay in the LandmarkStore as frames
+without detection, so they are filled like missing detections (LandmarkStore.filled) and the frame numbers do not change.
+extract_landmarks_chunked writes the landmarks of long recordings to disk in chunks while they are analyzed and continues
+an interrupted analysis after the last complete chunk (see landmark_chunks.py).
+
+# How to use this module?
+It needs the packages cv2 and mediapipe but not Blender, so it can be used inside and outside of Blender.
+"""
+
+import inspect, queue, threading
+
+import cv2
+import mediapipe as mp
+import numpy as np
+
+import frame_ring
+import landmark_chunks
+import landmark_store
+
+
+########## Variables ##########
+
+## Share of the size of the first detected pose that is added on every side of the automatic crop box,
+# the hands of a signer move far beyond the pose of the first frame
+auto_crop_margin = 0.5
+
+
+########## Method definitions ##########
+
+def mediapipe_version():
+    return getattr(mp, '__version__', '')
+
+
+def holistic_settings(static_image_mode = True, model_complexity = 1, smooth_landmarks = True):
+    # static_image_mode runs the full detector on every frame, otherwise landmarks are tracked from frame to frame,
+    # which is much cheaper on continuous video. smooth_landmarks only has an effect in tracking mode.
+    return {
+        "static_image_mode": static_image_mode,
+        "model_complexity": model_complexity,
+        "smooth_landmarks": smooth_landmarks
+    }
+
+
+def create_holistic(settings = {}):
+    # older mediapipe versions (e.g. 0.8.3) do not know all settings, e.g. model_complexity
+    accepted = inspect.signature(mp.solutions.holistic.Holistic.__init__).parameters
+    unsupported = [k for k in settings if k not in accepted]
+    if unsupported:
+        print("mediapipe " + mediapipe_version() + " ignores the Holistic settings " + ", ".join(unsupported))
+
+    return mp.solutions.holistic.Holistic(**{k: v for k, v in settings.items() if k in accepted})
+
+
+def add_holistic_arguments(parser):
+    # command line options shared by the scripts that run Holistic
+    parser.add_argument('--tracking', action='store_true', help='track landmarks between frames instead of detecting them on every frame (static_image_mode=False)')
+    parser.add_argument('--model-complexity', type=int, choices=(0, 1, 2), default=1, help='Holistic pose model complexity (default: %(default)s)')
+    parser.add_argument('--no-smoothing', action='store_true', help='disable landmark smoothing in tracking mode')
+
+
+def holistic_settings_from_args(args):
+    return holistic_settings(static_image_mode=not args.tracking, model_complexity=args.model_complexity, smooth_landmarks=not args.no_smoothing)
+
+
+def input_settings(scale = 1.0, crop = None):
+    # scale resizes the frames before the inference, crop is a box (x, y, width, height) in normalized frame
+    # coordinates or "auto" for a box around the first detected pose, None analyzes the whole frame
+    return {
+        "scale": scale,
+        "crop": crop
+    }
+
+
+def cache_settings(settings, image_settings = None, frame_step = 1):
+    # everything the landmarks depend on, for landmark_cache.cache_key: the Holistic settings and the installed mediapipe
+    # version, since other models give other landmarks; every frame of the whole frame at full size keeps the keys of existing entries
+    settings = dict(settings, mediapipe = mediapipe_version())
+    image_settings = input_settings() if image_settings is None else image_settings
+    if image_settings != input_settings() or frame_step != 1:
+        settings.update(image_settings, frame_step = frame_step)
+
+    return settings
+
+
+def parse_crop(text):
+    return text if text == 'auto' else tuple(float(v) for v in text.split(','))
+
+
+def add_input_arguments(parser):
+    # command line options for the image that is passed to Holistic
+    parser.add_argument('--scale', type=float, default=1.0, help='resize the frames by this factor before the inference (default: %(default)s)')
+    parser.add_argument('--crop', type=parse_crop, help='analyze only the box X,Y,WIDTH,HEIGHT (normalized, e.g. 0.25,0,0.5,1) or "auto" for a box around the first detected pose')
+    parser.add_argument('--frame-step', type=int, default=1, help='analyze only every n-th frame, the frames in between get no landmarks (default: %(default)s)')
+    parser.add_argument('--target-fps', type=float, help='analyze about this many frames per second of video instead of --frame-step')
+
+
+def input_settings_from_args(args):
+    return input_settings(scale=args.scale, crop=args.crop)
+
+
+def frame_step_from_args(args, file_url):
+    return frame_step_for_fps(get_video_fps(file_url), args.target_fps) if args.target_fps else args.frame_step
+
+
+def crop_box(region, width, height):
+    # pixel box (x0, y0, x1, y1) of a normalized (x, y, width, height) region, the whole frame for None
+    if region is None:
+        return 0, 0, width, height
+    x, y, w, h = region
+    x0, y0 = int(round(max(0.0, x) * width)), int(round(max(0.0, y) * height))
+    x1, y1 = int(round(min(1.0, x + w) * width)), int(round(min(1.0, y + h) * height))
+
+    return x0, y0, max(x1, x0 + 1), max(y1, y0 + 1)
+
+
+def auto_crop_region(pose, margin = auto_crop_margin):
+    # normalized region around the pose landmarks of one frame that lie in the frame, enlarged by margin on every side
+    xy = np.clip(pose[:, :2], 0, 1)
+    low, high = xy.min(axis=0), xy.max(axis=0)
+    size = high - low
+    low, high = np.maximum(low - size * margin, 0), np.minimum(high + size * margin, 1)
+
+    return float(low[0]), float(low[1]), float(high[0] - low[0]), float(high[1] - low[1])
+
+
+def reset_tracking(holistic):
+    # forgets the landmarks Holistic tracks from frame to frame (no effect in static_image_mode);
+    # mediapipe versions without SolutionBase.reset keep tracking
+    reset = getattr(holistic, 'reset', None)
+    if reset is not None:
+        reset()
+
+
+def next_crop_region(holistic, crop, region, landmarks):
+    # region of the next frame: with crop "auto" the whole frame is analyzed until the signer is found, then the box
+    # around the pose. Holistic is reset when the region changes, the landmarks it tracked do not fit the cropped image.
+    if region is None and crop == "auto" and landmarks["pose"] is not None:
+        region = auto_crop_region(landmarks["pose"])
+        reset_tracking(holistic)
+
+    return region
+
+
+def process_frame(holistic, image, scale = 1.0, region = None):
+    # landmarks of one frame (part -> (landmarks, 3) array or None) in normalized coordinates of the whole frame
+    height, width = image.shape[:2]
+    x0, y0, x1, y1 = crop_box(region, width, height)
+    roi = image[y0:y1, x0:x1]
+    if scale != 1.0:
+        roi = cv2.resize(roi, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    # Convert the BGR image to RGB before processing.
+    results = holistic.process(cv2.cvtColor(roi, cv2.COLOR_BGR2RGB))
+
+    # x and y are relative to the crop box, z has the same scale as x
+    box_offset = np.array([x0 / width, y0 / height, 0], dtype=np.float32)
+    box_scale = np.array([(x1 - x0) / width, (y1 - y0) / height, (x1 - x0) / width], dtype=np.float32)
+    landmarks = {}
+    for part, l_count in landmark_store.landmark_parts:
+        array = landmark_store.landmarks_to_array(getattr(results, part + '_landmarks'), l_count)
+        landmarks[part] = None if array is None else box_offset + array * box_scale
+
+    return landmarks
+
+
+def extract_landmarks(holistic, frames, scale = 1.0, crop = None):
+    # frames that are None (skipped by frame_step) get no landmarks, like frames without detection
+    if scale == 1.0 and crop is None:
+        # Convert the BGR images to RGB before processing.
+        return landmark_store.LandmarkStore.from_results(
+            None if image is None else holistic.process(cv2.cvtColor(image, cv2.COLOR_BGR2RGB)) for image in frames)
+
+    frame_arrays = {part: [] for part, _ in landmark_store.landmark_parts}
+    for landmarks in frame_landmarks(holistic, frames, scale, crop):
+        for part, _ in landmark_store.landmark_parts:
+            frame_arrays[part].append(None if landmarks is None else landmarks[part])
+
+    return landmark_store.LandmarkStore.from_frames(frame_arrays)
+
+
+def frame_landmarks(holistic, frames, scale = 1.0, crop = None):
+    # yields the landmarks of one frame after the other (None for frames skipped by frame_step)
+    region = None if crop == "auto" else crop
+    for image in frames:
+        if image is None:
+            yield None
+            continue
+        landmarks = process_frame(holistic, image, scale, region)
+        region = next_crop_region(holistic, crop, region, landmarks)
+        yield landmarks
+
+
+def extract_landmarks_chunked(holistic, open_frames, chunk_dir, chunk_frames = landmark_chunks.default_chunk_frames,
+                              scale = 1.0, crop = None, info = {}):
+    # like extract_landmarks, but every chunk_frames frames are written to chunk_dir (see landmark_chunks.py) as soon as
+    # they are analyzed. open_frames(start_frame) returns the frames from start_frame on, e.g. get_video_frames, so a rerun
+    # continues after the last complete chunk. The tracking state of Holistic and the automatic crop box start over there.
+    writer = landmark_chunks.ChunkWriter(chunk_dir, chunk_frames, info)
+    if not writer.finished:
+        for landmarks in frame_landmarks(holistic, open_frames(writer.frames), scale, crop):
+            writer.add(landmarks)
+        writer.finish()
+
+    return landmark_chunks.join_chunks(chunk_dir)
+
+
+def get_video_fps(file_url, default = 25.0):
+    vidcap = cv2.VideoCapture(file_url)
+    fps = vidcap.get(cv2.CAP_PROP_FPS)
+    vidcap.release()
+
+    return fps if fps > 0 else default
+
+
+def frame_step_for_fps(video_fps, target_fps):
+    # analyze every n-th frame to get close to the target frame rate, but at least every frame
+    return max(1, int(round(video_fps / target_fps)))
+
+
+def read_video_frames(file_url, frame_step = 1, start_frame = 0):
+    # with a frame_step above 1 only every n-th frame is decoded, None is yielded for the frames in between;
+    # start_frame counts from the beginning of the video, so the same frames are skipped as without it
+    vidcap = cv2.VideoCapture(file_url)
+    try:
+        frame_id = start_frame
+        if start_frame > 0:
+            frame_ring.seek_video(vidcap, start_frame)
+        while True:
+            if frame_id % frame_step == 0:
+                success, image = vidcap.read()
+            else:
+                # grab() skips the conversion of frames that are not analyzed
+                success, image = vidcap.grab(), None
+            if not success:
+                break
+            yield image
+            frame_id += 1
+    finally:
+        vidcap.release()
+
+
+def get_video_frames(file_url, prefetch = 0, frame_step = 1, start_frame = 0):
+    # yields objects with class 'numpy.ndarray' one frame at a time (None for frames skipped by frame_step)
+    if prefetch <= 0:
+        yield from read_video_frames(file_url, frame_step, start_frame)
+        return
+
+    # decode on a background thread into a bounded queue, so at most 'prefetch' frames are held in memory
+    frame_queue = queue.Queue(maxsize=prefetch)
+    stop = threading.Event()
+    end_of_video = object()
+
+    def put(item):
+        # wait for a free slot, but give up as soon as the consumer has stopped
+        while not stop.is_set():
+            try:
+                frame_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def decode():
+        try:
+            for image in read_video_frames(file_url, frame_step, start_frame):
+                if not put(image):
+                    return
+        except Exception as e:
+            put(e)
+            return
+        put(end_of_video)
+
+    decoder = threading.Thread(target=decode, daemon=True)
+    decoder.start()
+    try:
+        while True:
+            image = frame_queue.get()
+            if image is end_of_video:
+                break
+            if isinstance(image, Exception):
+                raise image
+            yield image
+    finally:
+        # stop the decoder if the consumer quits early
+        stop.set()
+        decoder.join()
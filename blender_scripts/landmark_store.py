@@ -0,0 +1,128 @@
+"""
+# What does this module do?
+It holds the results of MediaPipe Holistic as dense float32 arrays instead of one protobuf message per frame.
+Every body part is an array of shape (frames, landmarks, 3) with the normalized x, y, z coordinates
+and a boolean presence mask of shape (frames,) that is False for frames in which the part was not detected.
+The conversion into Blender scene coordinates is done for a whole body part in one vectorized operation.
+
+# How to use this module?
+It does not depend on Blender and is imported by the scripts in this folder.
+"""
+
+import numpy as np
+
+
+########## Variables ##########
+
+## Body parts of a Holistic result with their landmark count
+landmark_parts = [
+    ("pose", 33),
+    ("left_hand", 21),
+    ("right_hand", 21),
+    ("face", 468)
+]
+
+## Scale of the normalized landmark coordinates (x, y, z) in the Blender scene
+scene_scale = np.array((30 * 2, 20 * 2, 20 * 2), dtype=np.float32)
+
+
+########## Class definitions ##########
+
+class LandmarkStore:
+    def __init__(self, coords, masks):
+        # part name -> (frames, landmarks, 3) float32 array
+        self.coords = coords
+        # part name -> (frames,) bool array
+        self.masks = masks
+
+    def __len__(self):
+        return len(self.masks["pose"])
+
+    @classmethod
+    def empty(cls, frame_count):
+        return cls({part: np.zeros((frame_count, l_count, 3), dtype=np.float32) for part, l_count in landmark_parts},
+                   {part: np.zeros(frame_count, dtype=bool) for part, _ in landmark_parts})
+
+    @classmethod
+    def from_results(cls, results_per_frame):
+        # every result is converted right away, so no protobuf message outlives its frame
+        frames = {part: [] for part, _ in landmark_parts}
+        for results in results_per_frame:
+            # None stands for a frame that was skipped
+            for part, l_count in landmark_parts:
+                frames[part].append(None if results is None else landmarks_to_array(getattr(results, part + '_landmarks'), l_count))
+
+        return cls.from_frames(frames)
+
+    @classmethod
+    def from_frames(cls, frames):
+        # frames maps every part to a list with one (landmarks, 3) array or None per frame
+        coords, masks = {}, {}
+        for part, l_count in landmark_parts:
+            mask = np.array([f is not None for f in frames[part]], dtype=bool)
+            part_coords = np.zeros((len(mask), l_count, 3), dtype=np.float32)
+            if mask.any():
+                part_coords[mask] = np.stack([f for f in frames[part] if f is not None])
+            coords[part], masks[part] = part_coords, mask
+
+        return cls(coords, masks)
+
+    def filled(self):
+        # copy in which frames without detection (or skipped frames) are interpolated, parts that were never detected stay empty
+        coords = {part: interpolate_gaps(self.coords[part], self.masks[part]).astype(np.float32) for part, _ in landmark_parts}
+        masks = {part: np.full(len(self.masks[part]), self.masks[part].any()) for part, _ in landmark_parts}
+
+        return LandmarkStore(coords, masks)
+
+    def scene_locations(self, part, fill_gaps = False):
+        # (frames, landmarks, 3) locations in Blender scene units
+        coords = interpolate_gaps(self.coords[part], self.masks[part]) if fill_gaps else self.coords[part]
+        return np.asarray(coords, dtype=np.float32) * scene_scale
+
+
+########## Method definitions ##########
+
+def landmarks_to_array(landmark_list, l_count):
+    # landmark_list is a NormalizedLandmarkList or None if nothing was detected
+    if landmark_list is None:
+        return None
+
+    return np.array([(l.x, l.y, l.z) for l in landmark_list.landmark[:l_count]], dtype=np.float32)
+
+
+def interpolate_gaps(coords, mask):
+    # fill frames without detection by interpolating linearly between the neighbouring detections,
+    # before the first and after the last detection the nearest detection is held
+    frame_count = len(mask)
+    if frame_count == 0 or mask.all():
+        return np.array(coords)
+    if not mask.any():
+        return np.zeros_like(coords)
+
+    ids = np.arange(frame_count)
+    prev_ids = np.maximum.accumulate(np.where(mask, ids, -1))
+    next_ids = np.minimum.accumulate(np.where(mask, ids, frame_count)[::-1])[::-1]
+    prev_ids = np.where(prev_ids < 0, next_ids, prev_ids)
+    next_ids = np.where(next_ids >= frame_count, prev_ids, next_ids)
+
+    span = next_ids - prev_ids
+    weight = np.where(span > 0, (ids - prev_ids) / np.maximum(span, 1), 0.0).astype(np.float32)
+    coords = np.asarray(coords)
+
+    return coords[prev_ids] + (coords[next_ids] - coords[prev_ids]) * weight[:, None, None]
+
+
+def save_landmark_file(file_url, store):
+    # one .npz file per clip with the arrays "<part>" and "<part>_mask" for every body part
+    content = {}
+    for part, _ in landmark_parts:
+        content[part] = np.asarray(store.coords[part], dtype=np.float32)
+        content[part + '_mask'] = np.asarray(store.masks[part], dtype=bool)
+
+    np.savez_compressed(file_url, **content)
+
+
+def load_landmark_file(file_url):
+    with np.load(file_url) as content:
+        return LandmarkStore({part: content[part] for part, _ in landmark_parts},
+                             {part: content[part + '_mask'] for part, _ in landmark_parts})
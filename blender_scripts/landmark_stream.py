@@ -0,0 +1,212 @@
+"""
+# What does this module do?
+It runs MediaPipe Holistic on frames as they arrive from a camera or a stream instead of on a whole video file.
+Capturing and the inference run on two background threads that are connected by small buffers that drop stale frames (LatestBuffer,
+not to be confused with the shared memory frame_ring.FrameRing, which never drops a frame):
+when the inference is slower than the source, the oldest frames are dropped instead of queued, so the landmarks
+handed out are always of one of the newest frames and the latency does not grow over time.
+A video file is replayed at its native frame rate as stand-in for a camera. Every result carries the time at which its
+frame was captured, so the consumer can measure the end-to-end latency from the camera to the screen.
+
+# How to use this module?
+It needs cv2 and mediapipe but not Blender. live_mp_landmarks.py uses it to move the landmark objects in Blender, e.g.
+    stream = LandmarkStream(0, landmark_extraction.holistic_settings(static_image_mode = False))
+    stream.start()
+    result = stream.latest()    # newest LandmarkFrame or None, never blocks
+    stream.stop()
+Run it on its own to measure the latency of a camera (index) or a video file without Blender, e.g.
+    python landmark_stream.py "../sign_videos/Auf Wiedersehen II.mov" --tracking --seconds 10
+"""
+
+import argparse, collections, threading, time
+
+import cv2
+
+import landmark_extraction, profiling
+
+
+########## Variables ##########
+
+## Frames and results waiting in a buffer at most, older ones are dropped
+default_buffer_size = 2
+
+## Marks the end of the video file in the buffer of the frames
+end_of_stream = object()
+
+
+########## Class definitions ##########
+
+class LatestBuffer:
+    def __init__(self, size = default_buffer_size):
+        # a deque with maxlen drops the oldest item when a new one is added to a full buffer
+        self.items = collections.deque(maxlen = size)
+        self.available = threading.Condition()
+        # items that were never taken
+        self.dropped = 0
+
+    def put(self, item):
+        with self.available:
+            if len(self.items) == self.items.maxlen:
+                self.dropped += 1
+            self.items.append(item)
+            self.available.notify()
+
+    def take_latest(self, timeout = 0):
+        # the newest item (older ones are dropped) or None if nothing arrives within timeout seconds
+        with self.available:
+            if not self.items and timeout:
+                self.available.wait(timeout)
+            if not self.items:
+                return None
+            item = self.items.pop()
+            self.dropped += len(self.items)
+            self.items.clear()
+
+            return item
+
+
+class LandmarkFrame:
+    def __init__(self, frame_id, capture_time, landmarks):
+        # number of the frame in the source, time.perf_counter() when it was read and part -> (landmarks, 3) array or None
+        self.frame_id = frame_id
+        self.capture_time = capture_time
+        self.landmarks = landmarks
+
+
+class LandmarkStream:
+    def __init__(self, source = 0, holistic_settings = {}, input_settings = {}, realtime = None, buffer_size = default_buffer_size,
+                 profiler = None):
+        # source is a camera index or the URL of a video file or stream; realtime replays a file at its frame rate
+        # (default: for everything but camera indices)
+        self.source = source
+        self.holistic_settings = holistic_settings
+        self.scale = input_settings.get("scale", 1.0)
+        self.crop = input_settings.get("crop")
+        self.realtime = not isinstance(source, int) if realtime is None else realtime
+        self.frames = LatestBuffer(buffer_size)
+        self.results = LatestBuffer(buffer_size)
+        # inference time of every frame
+        self.profiler = profiler or profiling.Profiler(enabled = True)
+        self.stop_event = threading.Event()
+        self.finished = threading.Event()
+        self.threads = []
+        self.error = None
+
+    def start(self):
+        self.threads = [threading.Thread(target = self.capture, daemon = True), threading.Thread(target = self.infer, daemon = True)]
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+
+    @property
+    def running(self):
+        # False after the end of a video file, after stop() or after an error
+        return not self.finished.is_set()
+
+    def latest(self):
+        if self.error is not None:
+            raise self.error
+        return self.results.take_latest()
+
+    def capture(self):
+        vidcap = cv2.VideoCapture(self.source)
+        fps = vidcap.get(cv2.CAP_PROP_FPS)
+        frame_time = 1 / fps if self.realtime and fps > 0 else 0
+        start = time.perf_counter()
+        frame_id = 0
+        try:
+            while not self.stop_event.is_set():
+                if frame_time:
+                    # wait until the frame would arrive from a camera
+                    delay = start + frame_id * frame_time - time.perf_counter()
+                    if delay > 0 and self.stop_event.wait(delay):
+                        break
+                success, image = vidcap.read()
+                if not success:
+                    break
+                self.frames.put((frame_id, time.perf_counter(), image))
+                frame_id += 1
+        except Exception as e:
+            self.error = e
+        finally:
+            vidcap.release()
+            self.frames.put(end_of_stream)
+
+    def infer(self):
+        region = None if self.crop == "auto" else self.crop
+        try:
+            holistic = landmark_extraction.create_holistic(self.holistic_settings)
+        except Exception as e:
+            self.error = e
+            self.finished.set()
+            return
+
+        try:
+            while not self.stop_event.is_set():
+                item = self.frames.take_latest(timeout = 0.1)
+                if item is None:
+                    continue
+                if item is end_of_stream:
+                    break
+                frame_id, capture_time, image = item
+                start = time.perf_counter()
+                landmarks = landmark_extraction.process_frame(holistic, image, self.scale, region)
+                self.profiler.add_latency("inference", time.perf_counter() - start)
+                region = landmark_extraction.next_crop_region(holistic, self.crop, region, landmarks)
+                self.results.put(LandmarkFrame(frame_id, capture_time, landmarks))
+        except Exception as e:
+            self.error = e
+        finally:
+            holistic.close()
+            self.finished.set()
+
+
+########## Method definitions ##########
+
+def latency_text(profiler, stream):
+    # one line per latency of the profiler and the dropped frames, for printing at the end of a live session
+    lines = ["%s: %d frames, mean %.1f ms, p50 %.1f ms, p95 %.1f ms, max %.1f ms" % (
+        name, s["frames"], s["mean_ms"], s["p50_ms"], s["p95_ms"], s["max_ms"])
+        for name, s in profiler.report()["latencies"].items()]
+    lines.append("dropped: %d captured frames, %d results" % (stream.frames.dropped, stream.results.dropped))
+
+    return "\n".join(lines)
+
+
+def parse_source(text):
+    # camera index or URL
+    return int(text) if text.isdigit() else text
+
+
+########## Execute methods ##########
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Run Holistic on a camera or a video replayed in real time and report the latency.')
+    parser.add_argument('source', type=parse_source, nargs='?', default=0, help='camera index or video file (default: %(default)s)')
+    parser.add_argument('--seconds', type=float, default=10, help='stop after this many seconds (default: %(default)s)')
+    parser.add_argument('--buffer', type=int, default=default_buffer_size, help='frames waiting at most before old ones are dropped (default: %(default)s)')
+    parser.add_argument('--poll', type=float, default=1 / 60, help='seconds between two requests for the newest landmarks, like a display refresh (default: %(default).4f)')
+    landmark_extraction.add_holistic_arguments(parser)
+    parser.add_argument('--scale', type=float, default=1.0, help='resize the frames by this factor before the inference (default: %(default)s)')
+    parser.add_argument('--crop', type=landmark_extraction.parse_crop, help='analyze only the box X,Y,WIDTH,HEIGHT or "auto"')
+    args = parser.parse_args()
+
+    profiler = profiling.Profiler(enabled = True)
+    stream = LandmarkStream(args.source, landmark_extraction.holistic_settings_from_args(args),
+                            landmark_extraction.input_settings(scale = args.scale, crop = args.crop), buffer_size = args.buffer, profiler = profiler)
+    stream.start()
+    end = time.perf_counter() + args.seconds
+    try:
+        while stream.running and time.perf_counter() < end:
+            result = stream.latest()
+            if result is not None:
+                profiler.add_latency("end_to_end", time.perf_counter() - result.capture_time)
+            time.sleep(args.poll)
+    finally:
+        stream.stop()
+    print(latency_text(profiler, stream))
@@ -0,0 +1,155 @@
+"""
+# What does this module do?
+It runs the landmark extraction in a separate Python process (mp-landmark-annotation/landmark_worker.py) instead of in
+Blender, so Blender's Python never loads cv2 and mediapipe and the UI does not freeze while a clip is analyzed.
+The worker is started with any Python interpreter that has cv2 and mediapipe and connects back to a local socket
+(multiprocessing.connection, authenticated with a random key that is handed over in an environment variable).
+Only small messages travel through the socket: the job, progress, cancellation and the end of the job. The landmark
+arrays are written by the worker into .npy files in shared memory (/dev/shm, or the temp folder where it does not exist)
+and memory-mapped here, so no frame of landmarks is pickled.
+
+# How to use this module?
+It only needs numpy and does not block, so it can be polled from a modal timer operator in Blender (see load_mp_landmarks.py):
+    worker = LandmarkWorker("python3")
+    worker.start(video_url, holistic_settings, input_settings)
+    for message in worker.poll():    # on every timer tick
+        if message["type"] == "done":
+            store = worker.result(message)
+    worker.close()                   # after the arrays of the result are used
+Call worker.cancel() to stop a running job.
+"""
+
+import os, pathlib, secrets, shutil, subprocess, tempfile, threading
+from multiprocessing.connection import Listener
+
+import numpy as np
+
+from landmark_store import LandmarkStore, landmark_parts
+
+
+########## Variables ##########
+
+## Worker script that runs Holistic
+worker_script = str(pathlib.Path(__file__).parent.parent.absolute() / 'mp-landmark-annotation' / 'landmark_worker.py')
+
+## Environment variable with the authentication key of the socket (hex), must match landmark_worker.py
+authkey_variable = 'LANDMARK_WORKER_AUTHKEY'
+
+## Folder in shared memory for the result arrays, None uses the temp folder
+shared_memory_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+
+########## Class definitions ##########
+
+class LandmarkWorker:
+    def __init__(self, python = "python3", script = worker_script):
+        # python is the interpreter with cv2 and mediapipe, not the one of Blender
+        self.python = python
+        self.script = script
+        self.authkey = secrets.token_bytes(32)
+        self.listener = None
+        self.process = None
+        self.connection = None
+        self.result_dir = None
+        self.finished = False
+
+    def start(self, video_url, holistic_settings = {}, input_settings = None, frame_step = 1, target_fps = None, cache_dir = None,
+              cache_max_size = None, prefetch = 8, frame_ring_slots = 0, checkpoint_chunk_frames = None):
+        # target_fps replaces frame_step if it is set, the worker reads the frame rate of the video;
+        # with frame_ring_slots the worker decodes in another process into shared memory (see frame_ring.py);
+        # with checkpoint_chunk_frames and a cache_dir a cancelled or crashed job continues after its last chunk (see landmark_chunks.py)
+        self.result_dir = tempfile.mkdtemp(prefix = 'landmarks_', dir = shared_memory_dir)
+        job = {
+            "command": "extract",
+            "video": os.path.abspath(video_url),
+            "holistic_settings": holistic_settings,
+            "input_settings": input_settings,
+            "frame_step": frame_step,
+            "target_fps": target_fps,
+            "prefetch": prefetch,
+            "frame_ring_slots": frame_ring_slots,
+            "checkpoint_chunk_frames": checkpoint_chunk_frames,
+            "result_dir": self.result_dir,
+            "cache_dir": cache_dir and os.path.abspath(cache_dir)
+        }
+        if cache_max_size is not None:
+            job["cache_max_size"] = cache_max_size
+
+        # port 0 lets the system choose a free port
+        self.listener = Listener(('localhost', 0), authkey = self.authkey)
+        host, port = self.listener.address
+        self.process = subprocess.Popen([self.python, self.script, '--connect', '%s:%d' % (host, port)],
+                                        env = dict(os.environ, **{authkey_variable: self.authkey.hex()}))
+        # the worker needs a few seconds to import mediapipe, so it is waited for on a thread
+        threading.Thread(target = self.accept, args = (job,), daemon = True).start()
+
+    def accept(self, job):
+        try:
+            connection = self.listener.accept()
+            connection.send(job)
+        except (OSError, EOFError):
+            # the listener was closed by close() or the worker did not authenticate
+            return
+        self.connection = connection
+
+    def poll(self):
+        # the messages of the worker that arrived since the last call, never blocks
+        if self.finished:
+            return []
+        messages = []
+        try:
+            while self.connection is not None and self.connection.poll():
+                messages.append(self.connection.recv())
+        except (EOFError, OSError):
+            messages.append({"type": "error", "message": "the connection to the worker was lost"})
+        if self.connection is None and self.process is not None and self.process.poll() is not None:
+            messages.append({"type": "error", "message": "the worker exited with code %d before it connected" % self.process.returncode})
+        if any(m["type"] in ("done", "cancelled", "error") for m in messages):
+            self.finished = True
+
+        return messages
+
+    def cancel(self):
+        if self.connection is not None and not self.finished:
+            self.connection.send({"command": "cancel"})
+
+    def result(self, message):
+        # LandmarkStore of a "done" message, memory-mapped from the files of the worker or of the cache entry
+        return read_result(message["result_dir"], message["frames"])
+
+    def close(self, timeout = 5):
+        # ends the worker and removes the result files, arrays mapped from them must not be used on Windows afterwards
+        if self.connection is not None:
+            try:
+                self.connection.send({"command": "quit"})
+            except OSError:
+                pass
+            self.connection.close()
+            self.connection = None
+        if self.listener is not None:
+            self.listener.close()
+            self.listener = None
+        if self.process is not None:
+            try:
+                self.process.wait(timeout)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+            self.process = None
+        if self.result_dir is not None:
+            shutil.rmtree(self.result_dir, ignore_errors = True)
+            self.result_dir = None
+
+
+########## Method definitions ##########
+
+def read_result(result_dir, frames):
+    coords, masks = {}, {}
+    for part, _ in landmark_parts:
+        coords[part] = np.load(os.path.join(result_dir, part + '.npy'), mmap_mode = 'r')[:frames]
+        masks[part] = np.array(np.load(os.path.join(result_dir, part + '_mask.npy'), mmap_mode = 'r')[:frames])
+
+    return LandmarkStore(coords, masks)
+
+
+def progress_text(message):
+    return "%d/%d frames" % (message["frame"], message["frames"])
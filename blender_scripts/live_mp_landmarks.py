@@ -0,0 +1,159 @@
+"""
+# Blender Version 2.91.2 (2.91.2 2021-01-19)
+
+# What does this script do?
+The script shows the MediaPipe landmarks of a camera live in Blender. It builds the same landmark objects and armature as
+load_mp_landmarks.py (under their own names, so they do not clash with recorded clips) and moves the landmark objects
+to the newest tracked landmarks on every tick of a modal timer. No keyframes are written, the armature follows the
+landmark objects through its constraints. Capturing and the inference run on background threads (see landmark_stream.py);
+frames that the inference cannot keep up with are dropped, so the preview never lags behind more and more.
+
+# How to use this script?
+Open a new Blender file, go to the scripting tab and open this script. Set video_source to the index of the camera (0 is
+the first one) or to a video file, which is replayed at its own frame rate as stand-in for a camera, and run the script.
+The landmarks move until the video ends or Esc is pressed with the mouse over Blender's window.
+At the end the latency from reading a frame to moving the objects (end_to_end) and the inference time are printed,
+with use_profiling they are also written to "<name of the .blend file>.live.json" next to the .blend file.
+The objects keep their last location; to record a clip use load_mp_landmarks.py.
+"""
+
+import bpy, pathlib, sys, time
+
+## Folder of this script (__file__ points into the .blend file when the script is run from Blender's text editor)
+scripts_dir = pathlib.Path(__file__).parent.absolute()
+if scripts_dir.suffix == '.blend':
+    scripts_dir = scripts_dir.parent
+sys.path.append(str(scripts_dir))
+
+import landmark_store, load_mp_landmarks, profiling
+from landmark_definitions import get_all_bone_connections, get_landmark_object_names
+
+
+########## Variables ##########
+
+## Camera index or video file that stands in for a camera
+video_source = 0
+# video_source = str(scripts_dir.parent) + '/sign_videos/Auf Wiedersehen II.mov'
+
+## Settings passed to MediaPipe Holistic, tracking between frames is much faster than detecting on every frame
+holistic_settings = {
+  "static_image_mode": False,
+  "model_complexity": 1,
+  "smooth_landmarks": True
+}
+
+## Image passed to Holistic (see load_mp_landmarks.py), a smaller image lowers the latency
+input_settings = {
+  "scale": 1.0,
+  "crop": None
+}
+
+## Frames and results waiting at most before older ones are dropped
+buffer_size = 2
+
+## Seconds between two updates of the landmark objects
+timer_interval = 1 / 60
+
+## Name of the armature and prefix of the landmark objects of the live preview
+armature_name = "LiveArmature"
+landmark_object_prefix = "live_"
+
+## Write the latencies to a JSON report next to the .blend file
+use_profiling = False
+
+
+########## Class definitions ##########
+
+class LiveLandmarksOperator(bpy.types.Operator):
+    bl_idname = "wm.live_mp_landmarks"
+    bl_label = "Live MediaPipe Landmarks"
+
+    def execute(self, context):
+        # cv2 and mediapipe are only needed for the live preview
+        import landmark_stream
+
+        self.part_objects = create_live_objects()
+        self.profiler = profiling.Profiler(enabled = True)
+        self.stream = landmark_stream.LandmarkStream(video_source, holistic_settings, input_settings, buffer_size = buffer_size, profiler = self.profiler)
+        self.stream.start()
+
+        window_manager = context.window_manager
+        self.timer = window_manager.event_timer_add(timer_interval, window = context.window)
+        window_manager.modal_handler_add(self)
+
+        return {'RUNNING_MODAL'}
+
+    def modal(self, context, event):
+        if event.type == 'ESC':
+            self.finish(context)
+            return {'CANCELLED'}
+        if event.type != 'TIMER':
+            return {'PASS_THROUGH'}
+
+        try:
+            result = self.stream.latest()
+        except Exception as e:
+            # capturing or the inference failed on its thread
+            self.finish(context)
+            self.report({'ERROR'}, "Live landmarks stopped: " + str(e))
+            return {'CANCELLED'}
+        if result is not None:
+            update_landmark_objects(self.part_objects, result.landmarks)
+            self.profiler.add_latency("end_to_end", time.perf_counter() - result.capture_time)
+            self.profiler.count("frames_shown")
+            redraw_3d_views(context)
+        elif not self.stream.running:
+            # end of the video file
+            self.finish(context)
+            return {'FINISHED'}
+
+        return {'PASS_THROUGH'}
+
+    def finish(self, context):
+        import landmark_stream
+
+        context.window_manager.event_timer_remove(self.timer)
+        self.stream.stop()
+        self.profiler.count("frames_dropped", self.stream.frames.dropped + self.stream.results.dropped)
+        print(landmark_stream.latency_text(self.profiler, self.stream))
+        if use_profiling:
+            self.profiler.write_report(profiling.report_path(bpy.data.filepath, ".live.json"), source = str(video_source),
+                                       holistic_settings = holistic_settings, input_settings = input_settings)
+
+
+########## Method definitions ##########
+
+def create_live_objects():
+    # landmark objects and armature of the preview, created once; returns part name -> landmark objects in landmark order
+    load_mp_landmarks.index_scene_objects()
+    object_names = get_landmark_object_names()
+    for part, _ in landmark_store.landmark_parts:
+        load_mp_landmarks.create_landmark_objects([landmark_object_prefix + name for name in object_names[part]])
+    if bpy.data.objects.get(armature_name) is None:
+        load_mp_landmarks.create_bones(bone_connections = get_all_bone_connections(), armature_name = armature_name, object_prefix = landmark_object_prefix)
+        bpy.ops.object.mode_set(mode = 'OBJECT')
+
+    return {part: [load_mp_landmarks.landmark_objects[landmark_object_prefix + name] for name in object_names[part]]
+            for part, _ in landmark_store.landmark_parts}
+
+
+def update_landmark_objects(part_objects, landmarks):
+    # parts that were not detected in the frame keep their last location
+    for part, objects in part_objects.items():
+        if landmarks[part] is None:
+            continue
+        for obj, location in zip(objects, (landmarks[part] * landmark_store.scene_scale).tolist()):
+            obj.location = location
+
+
+def redraw_3d_views(context):
+    for area in context.screen.areas:
+        if area.type == 'VIEW_3D':
+            area.tag_redraw()
+
+
+########## Execute methods ##########
+
+if __name__ == "__main__":
+    bpy.utils.register_class(LiveLandmarksOperator)
+    bpy.ops.wm.live_mp_landmarks()
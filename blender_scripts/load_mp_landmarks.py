@@ -11,397 +11,396 @@ Run the script and wait for the result. Go to the animation tab and press the pl
 If you cannot see any objects, move and rotate around in space until you find them.
 
 The resulting skeleton can be exported as a BVH file via "File > Export > Motion Capture (.bvh)".
+The same BVH file can also be written without Blender from the landmarks with bvh_writer.py.
 To make a new BVH file, delete all items in the Scene Collection, change video_file_name and video_file_path and rerun the script.
+To keep several clips in the same file instead, give each one its own armature_name and landmark_object_prefix.
+
+The landmarks of every analyzed video are cached in the folder ".landmark_cache" next to "sign_videos".
+Rerunning the script on the same video with the same holistic_settings skips MediaPipe; set use_landmark_cache to False to disable this.
+While a video is analyzed, its landmarks are written to the cache folder in chunks of checkpoint_chunk_frames frames, so
+rerunning the script after a crash or a cancelled analysis of a long recording continues after the last complete chunk.
+To analyze fewer frames, e.g. 24 per second for the BVH files, set frame_step or target_fps; fill_gaps interpolates the skipped
+frames and the frames without detection instead of leaving them without keyframe.
+The keyframes of a landmark object are written into its F-curves in one go (use_bulk_keyframes). Objects that already have
+location keyframes, e.g. when the script is run twice without emptying the scene, get the new keyframes one by one.
+With use_worker MediaPipe runs in a separate Python process (landmark_worker_client.py) while Blender stays responsive:
+set worker_python to a Python interpreter that has cv2 and mediapipe installed. The progress is shown in the status bar
+and the console, Esc cancels the analysis. Blender's own Python then needs neither cv2 nor mediapipe.
+With use_profiling the time of every stage, the inference time of every frame, the created objects, keyframes and constraints
+and the peak memory are written to "<name of the .blend file>.profile.json" next to the .blend file (see profiling.py).
 """
 
-import bpy, cv2, pathlib
-import mediapipe as mp
+import bpy, pathlib, sys, time
+import numpy as np
+
+## Folder of this script (__file__ points into the .blend file when the script is run from Blender's text editor)
+scripts_dir = pathlib.Path(__file__).parent.absolute()
+if scripts_dir.suffix == '.blend':
+    scripts_dir = scripts_dir.parent
+sys.path.append(str(scripts_dir))
+
+import keyframe_reduction, landmark_cache, landmark_chunks, landmark_store, landmark_worker_client, profiling
+from landmark_definitions import pose_landmark_names, hand_landmark_names, get_all_bone_connections
 
 
 ########## Variables ##########
 
 ## Video file name and path to be processed
 video_file_name = 'Brauchen Sie eine Arbeitsunfähigkeitsbescheinigung II.mov'
-video_file_path = str(pathlib.Path(__file__).parent.parent.parent.absolute()) + '/sign_videos/' + video_file_name
-
-## Landmark arrays
-pose_landmarks = []
-left_hand_landmarks = []
-right_hand_landmarks = []
-face_landmarks = []
-
-## Landmark names
-pose_landmark_names = [
-  "NOSE",
-  "LEFT_EYE_INNER",
-  "LEFT_EYE",
-  "LEFT_EYE_OUTER",
-  "RIGHT_EYE_INNER",
-  "RIGHT_EYE",
-  "RIGHT_EYE_OUTER",
-  "LEFT_EAR",
-  "RIGHT_EAR",
-  "MOUTH_LEFT",
-  "MOUTH_RIGHT",
-  "LEFT_SHOULDER",
-  "RIGHT_SHOULDER",
-  "LEFT_ELBOW",
-  "RIGHT_ELBOW",
-  "LEFT_WRIST",
-  "RIGHT_WRIST",
-  "LEFT_PINKY",
-  "RIGHT_PINKY",
-  "LEFT_INDEX",
-  "RIGHT_INDEX",
-  "LEFT_THUMB",
-  "RIGHT_THUMB",
-  "LEFT_HIP",
-  "RIGHT_HIP",
-  "LEFT_KNEE",
-  "RIGHT_KNEE",
-  "LEFT_ANKLE",
-  "RIGHT_ANKLE",
-  "LEFT_HEEL",
-  "RIGHT_HEEL",
-  "LEFT_FOOT_INDEX",
-  "RIGHT_FOOT_INDEX"
-]
-
-hand_landmark_names = [
-  "WRIST",
-  "THUMB_CMC",
-  "THUMB_MCP",
-  "THUMB_IP",
-  "THUMB_TIP",
-  "INDEX_FINGER_MCP",
-  "INDEX_FINGER_PIP",
-  "INDEX_FINGER_DIP",
-  "INDEX_FINGER_TIP",
-  "MIDDLE_FINGER_MCP",
-  "MIDDLE_FINGER_PIP",
-  "MIDDLE_FINGER_DIP",
-  "MIDDLE_FINGER_TIP",
-  "RING_FINGER_MCP",
-  "RING_FINGER_PIP",
-  "RING_FINGER_DIP",
-  "RING_FINGER_TIP",
-  "PINKY_MCP",
-  "PINKY_PIP",
-  "PINKY_DIP",
-  "PINKY_TIP"
-]
-
-## Landmark connections (create bones out of two landmarks)
-pose_landmark_connections = [
-  ("LEFT_SHOULDER", "LEFT_ELBOW"),
-  ("LEFT_ELBOW", "LEFT_WRIST"),
-  ("RIGHT_SHOULDER", "RIGHT_ELBOW"),
-  ("RIGHT_ELBOW", "RIGHT_WRIST"),
-
-  ("RIGHT_WRIST", "RIGHT_INDEX"), # hand bone right
-  ("LEFT_WRIST", "LEFT_INDEX"), # hand bone left
-  
-  ("LEFT_SHOULDER", "RIGHT_SHOULDER"), # for left collar (invert all axes)
-  ("RIGHT_SHOULDER", "LEFT_SHOULDER"), # for right collar (invert all axes)
-  
-  ("152", "0", "NECK"), # below jaw to lip upper middle to simulate neck bone
-  ("0", "6", "HEAD"), # lip upper middle to mid nose bridge to simulate head bone
-  ("152", "10", "HEAD_NECK") # below jaw to highest face point
-]
-
-hand_landmark_connections = [
-  ("WRIST", "THUMB_MCP"),
-  ("THUMB_MCP", "THUMB_IP"),
-  ("THUMB_IP", "THUMB_TIP"),
-
-  ("WRIST", "INDEX_FINGER_MCP"),
-  ("INDEX_FINGER_MCP", "INDEX_FINGER_PIP"),
-  ("INDEX_FINGER_PIP", "INDEX_FINGER_DIP"),
-  ("INDEX_FINGER_DIP", "INDEX_FINGER_TIP"),
-  
-  ("WRIST", "MIDDLE_FINGER_MCP"),
-  ("MIDDLE_FINGER_MCP", "MIDDLE_FINGER_PIP"),
-  ("MIDDLE_FINGER_PIP", "MIDDLE_FINGER_DIP"),
-  ("MIDDLE_FINGER_DIP", "MIDDLE_FINGER_TIP"),
-  
-  ("WRIST", "RING_FINGER_MCP"),
-  ("RING_FINGER_MCP", "RING_FINGER_PIP"),
-  ("RING_FINGER_PIP", "RING_FINGER_DIP"),
-  ("RING_FINGER_DIP", "RING_FINGER_TIP"),
-  
-  ("WRIST", "PINKY_MCP"),
-  ("PINKY_MCP", "PINKY_PIP"),
-  ("PINKY_PIP", "PINKY_DIP"),
-  ("PINKY_DIP", "PINKY_TIP")
-]
-
-face_landmark_connections = [
-    ("RIGHT_EYE", "133"), # right eyelid inner
-    ("RIGHT_EYE", "33"),  # right eyelid outer
-    ("RIGHT_EYE", "159"), # right eyelid upper
-    ("RIGHT_EYE", "160"), # right eyelid upper outer
-    ("RIGHT_EYE", "158"), # right eyelid upper inner
-    ("RIGHT_EYE", "144"), # right eyelid lower outer
-    ("RIGHT_EYE", "153"), # right eyelid lower inner
-    ("RIGHT_EYE", "145"), # right eyelid lower
-
-    ("LEFT_EYE", "362"), # left eyelid inner
-    ("LEFT_EYE", "263"), # left eyelid outer
-    ("LEFT_EYE", "386"), # left eyelid upper
-    ("LEFT_EYE", "387"), # left eyelid upper outer
-    ("LEFT_EYE", "385"), # left eyelid upper inner
-    ("LEFT_EYE", "373"), # left eyelid lower outer
-    ("LEFT_EYE", "380"), # left eyelid lower inner
-    ("LEFT_EYE", "374"),  # left eyelid lower
-    
-    ("RIGHT_EYE", "RIGHT_EYE_INNER"),
-    ("RIGHT_EYE", "RIGHT_EYE_OUTER"),
-    ("LEFT_EYE", "LEFT_EYE_INNER"),
-    ("LEFT_EYE", "LEFT_EYE_OUTER")
-]
-
-# Single bones for face
-pose_landmark_single_bones = [
-    # right eye
-    "RIGHT_EYE",
-    # left eye
-    "LEFT_EYE"
-]
-
-face_landmark_single_bones = [
-    # right eyebrow
-    107, 105, 70,
-    # left eyebrow
-    336, 334, 300,        
-    # center brow
-    9,
-    # mid nose bridge
-    6,
-    # nose
-    4,
-    # right nostril
-    218,
-    # left nostril
-    438,
-    # right nasolabial middle
-    36,
-    # left nasolabial middle
-    266,
-    # right nasolabial upper
-    47,
-    # left nasolabial upper
-    277,
-    # right nasolabial lower
-    202,
-    # left nasolabial lower
-    422,
-    # right squint inner
-    22,
-    # left squint inner
-    252,
-    # right squint outer
-    110,
-    # left squint outer
-    339,
-    # right cheek upper
-    117,
-    # right cheek lower
-    187,
-    # left cheek upper
-    346,
-    # left cheek lower
-    411,
-    # right lip below nose
-    167,
-    # left lip below nose
-    393,
-    # right nasolabial crease
-    92,
-    # left nasolabial crease
-    322,
-    # right nasolabial mouth corner
-    216,
-    # left nasolabial mouth corner
-    436,
-    # right lip corner
-    57,
-    # left lip corner
-    287,
-    # lip upper middle
-    0,
-    # lip lower middle
-    17,
-    # right lip upper inner
-    39,
-    # left lip upper inner
-    269,
-    # right lip upper outer
-    40,
-    # left lip upper outer
-    270,
-    # right lip lower outer
-    321,
-    # left lip lower outer
-    91,
-    # right lip lower inner
-    84,
-    # left lip lower inner
-    314,
-    # lip below
-    18,
-    # chin
-    175,
-    # below jaw
-    152,
-    # right jaw clench
-    177,
-    # left jaw clench
-    401
-]
+video_file_path = str(scripts_dir.parent) + '/sign_videos/' + video_file_name
+
+## Settings passed to MediaPipe Holistic
+holistic_settings = {
+  # True runs the full detector on every frame, False tracks the landmarks from frame to frame (much faster)
+  "static_image_mode": True,
+  # 0, 1 or 2, higher is more accurate but slower (needs mediapipe 0.8.4 or newer)
+  "model_complexity": 1,
+  # filter landmarks over time to reduce jitter, only used if static_image_mode is False
+  "smooth_landmarks": True
+}
+
+## Image passed to Holistic: frames resized by scale and cropped to a box (x, y, width, height) in normalized frame coordinates,
+# "auto" for a box around the first detected pose or None for the whole frame; the landmarks always refer to the whole frame
+input_settings = {
+  "scale": 1.0,
+  "crop": None
+}
+
+## Analyze only every n-th frame, or about target_fps frames per second of video if it is not None
+frame_step = 1
+target_fps = None
+
+## Interpolate the landmarks of frames without detection (and of frames skipped by frame_step) instead of leaving them out
+fill_gaps = False
+
+## Landmark cache: results of Holistic are reused as long as the video and holistic_settings do not change
+use_landmark_cache = True
+landmark_cache_dir = str(scripts_dir.parent) + '/.landmark_cache'
+# size limit in bytes, the least recently used clips are deleted first
+landmark_cache_max_size = 2 * 1024 ** 3
+# the analysis writes the landmarks of every this many frames to the cache folder, so a rerun after a crash or cancel
+# continues after the last complete chunk (see landmark_chunks.py); None analyzes the whole video before writing anything
+checkpoint_chunk_frames = 250
+
+## Write all keyframes of a landmark with one array write per F-curve instead of one keyframe_insert per frame
+use_bulk_keyframes = True
+
+## Largest deviation in scene units when leaving out keyframes that linear interpolation reproduces (None keys every frame)
+# only used with use_bulk_keyframes, e.g. 0.01 removes most keys of landmarks that hardly move
+keyframe_tolerance = None
+# keys removed and largest deviation of all landmark objects
+keyframe_stats = keyframe_reduction.ReductionStats()
+
+## Landmark file written by mp-landmark-annotation/batch_extract.py to use instead of analyzing the video (None analyzes the video)
+landmark_file_path = None
+
+## Analyze the video in a separate process with the Python interpreter worker_python instead of in Blender
+use_worker = False
+worker_python = "python3"
+# slots of the shared memory frame ring between the decoder process and the worker, 0 decodes on a thread of the worker,
+# which the worker also does if worker_python is older than 3.8
+worker_frame_ring_slots = 8
+
+## Number of decoded frames buffered ahead of the inference by a background thread (0 decodes on demand)
+frame_prefetch = 8
+
+## Record the time of every stage, the created objects and the peak memory and write them to a JSON report next to the .blend file
+use_profiling = False
+profiler = profiling.Profiler(enabled = use_profiling)
+
+## Name of the armature and prefix for the names of the landmark objects
+# change both to build several clips in the same Blender file
+armature_name = "Armature"
+landmark_object_prefix = ""
+
+## Landmark objects in the scene by name, so they never have to be searched
+landmark_objects = {}
+# mesh shared by all landmark ico spheres
+landmark_mesh = None
+
+
+########## Class definitions ##########
+
+class ExtractLandmarksOperator(bpy.types.Operator):
+    # runs the analysis in the worker process and builds the scene when it is done, polled by a timer so Blender stays responsive
+    bl_idname = "wm.extract_mp_landmarks"
+    bl_label = "Extract MediaPipe Landmarks"
+
+    def execute(self, context):
+        self.worker = landmark_worker_client.LandmarkWorker(worker_python)
+        self.worker.start(video_file_path, holistic_settings, input_settings, frame_step = frame_step, target_fps = target_fps,
+                          cache_dir = landmark_cache_dir if use_landmark_cache else None, cache_max_size = landmark_cache_max_size, prefetch = frame_prefetch,
+                          frame_ring_slots = worker_frame_ring_slots, checkpoint_chunk_frames = checkpoint_chunk_frames)
+        self.start_time = time.perf_counter()
+
+        window_manager = context.window_manager
+        self.timer = window_manager.event_timer_add(0.1, window = context.window)
+        window_manager.modal_handler_add(self)
+        window_manager.progress_begin(0, 100)
+
+        return {'RUNNING_MODAL'}
+
+    def modal(self, context, event):
+        if event.type == 'ESC':
+            self.worker.cancel()
+            return {'RUNNING_MODAL'}
+        if event.type != 'TIMER':
+            return {'PASS_THROUGH'}
+
+        for message in self.worker.poll():
+            if message["type"] == "progress":
+                context.window_manager.progress_update(100 * message["frame"] / max(message["frames"], 1))
+                print("Analyzing '" + video_file_name + "': " + landmark_worker_client.progress_text(message))
+            elif message["type"] == "done":
+                profiler.add_time("landmarks", time.perf_counter() - self.start_time)
+                if message["cached"]:
+                    print("Loaded landmarks of '" + video_file_name + "' from the cache")
+                    profiler.count("cache_hits")
+                store = self.worker.result(message)
+                build_scene(store.filled() if fill_gaps else store)
+                self.finish(context)
+                return {'FINISHED'}
+            else:
+                self.report({'WARNING'}, "Landmark extraction " + ("cancelled" if message["type"] == "cancelled" else "failed: " + message["message"]))
+                self.finish(context)
+                return {'CANCELLED'}
+
+        return {'PASS_THROUGH'}
+
+    def finish(self, context):
+        context.window_manager.event_timer_remove(self.timer)
+        context.window_manager.progress_end()
+        self.worker.close()
+
 
 ########## Method definitions ##########
 
-def get_landmarks(vid_name, frame_list):
-    mp_holistic = mp.solutions.holistic
-
-    # For static images:
-    holistic = mp_holistic.Holistic(static_image_mode=True)
-    for image in frame_list:
-        # Convert the BGR image to RGB before processing.
-        results = holistic.process(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
-        
-        # append landmark arrays for each frame and type to a parent array
-        pose_landmarks.append(results.pose_landmarks)
-        left_hand_landmarks.append(results.left_hand_landmarks)
-        right_hand_landmarks.append(results.right_hand_landmarks)
-        face_landmarks.append(results.face_landmarks)
-        
-    holistic.close()
-
-
-def get_video_frames(file_url):
-    vidcap = cv2.VideoCapture(file_url)
-    success, image = vidcap.read()
-    # array of objects with class 'numpy.ndarray'
-    frames = []
-    while success:
-        frames.append(image)
-        success, image = vidcap.read()
-
-    return frames
-
-
-def isObjectInScene(name):
+def index_scene_objects():
+    # build the name -> object index once, afterwards it is kept up to date by create_landmark_objects
+    landmark_objects.clear()
     for o in bpy.context.scene.objects:
-        if o.name == name:
-            return True
-
-    return False
-
-
-def load_landmarks_into_scene(landmarks = [], names = [], l_count = 0, first_char = ""):
-    for frame in range (0, len(landmarks)):
-        lm_for_curr_frame = landmarks[frame]
-        if lm_for_curr_frame is not None:
-            for id in range(0, l_count):
-                # get landmark name
-                name = first_char + (str(id) if not names else names[id])
-                # get 3D coords of the landmark
-                l = lm_for_curr_frame.landmark[id]
-                location = (l.x * 30 * 2, l.y * (20) * 2, l.z * (20) * 2)
-                
-                # check if we need to create the ico sphere for the current landmark for the first time
-                if not isObjectInScene(name):
-                    # create new object
-                    bpy.ops.mesh.primitive_ico_sphere_add(enter_editmode=False, align='WORLD', location=location, scale=(0.1, 0.1, 0.1))
-                    # rename object
-                    bpy.context.object.name = name
-
-                # set location for next frame
-                obj = bpy.context.scene.objects[name]
+        landmark_objects[o.name] = o
+
+
+def create_landmark_objects(object_names = [], locations = None):
+    # create an ico sphere for every landmark that is not in the scene yet, locations holds one start location per landmark
+    global landmark_mesh
+    for id, name in enumerate(object_names):
+        if name in landmark_objects:
+            continue
+
+        location = (0, 0, 0) if locations is None else locations[id]
+        if landmark_mesh is None:
+            # create the first ico sphere with the operator, all others share its mesh
+            bpy.ops.mesh.primitive_ico_sphere_add(enter_editmode=False, align='WORLD', location=location, scale=(0.1, 0.1, 0.1))
+            obj = bpy.context.object
+            obj.name = name
+            landmark_mesh = obj.data
+        else:
+            obj = bpy.data.objects.new(name, landmark_mesh)
+            obj.location = location
+            obj.scale = (0.1, 0.1, 0.1)
+            bpy.context.collection.objects.link(obj)
+
+        landmark_objects[name] = obj
+        profiler.count("objects")
+
+
+def get_landmark_store(vid_name, file_url):
+    store = load_landmark_store(vid_name, file_url)
+    # a copy with interpolated frames, the cache keeps the frames as they were analyzed
+    return store.filled() if fill_gaps else store
+
+
+def load_landmark_store(vid_name, file_url):
+    # landmarks extracted beforehand, e.g. by mp-landmark-annotation/batch_extract.py
+    if landmark_file_path:
+        return landmark_store.load_landmark_file(landmark_file_path)
+
+    # cv2 and mediapipe are only needed if the video has to be analyzed
+    import landmark_extraction
+
+    step = landmark_extraction.frame_step_for_fps(landmark_extraction.get_video_fps(file_url), target_fps) if target_fps else frame_step
+
+    key = None
+    if use_landmark_cache:
+        key = landmark_cache.cache_key(file_url, landmark_extraction.cache_settings(holistic_settings, input_settings, step))
+        store = landmark_cache.load_landmarks(landmark_cache_dir, key)
+        if store is not None:
+            print("Loaded landmarks of '" + vid_name + "' from the cache")
+            profiler.count("cache_hits")
+            return store
+
+    info = {"video": vid_name, "settings": holistic_settings, "input": input_settings, "frame_step": step}
+    chunk_dir = landmark_chunks.chunk_folder(landmark_cache_dir, key) if use_landmark_cache and checkpoint_chunk_frames else None
+    holistic = landmark_extraction.create_holistic(holistic_settings)
+    # frames are consumed one by one as they are decoded
+    try:
+        # with use_profiling the frames are timed: waiting for a decoded frame and the inference of every frame
+        open_frames = lambda start_frame: profiler.timed_frames(
+            landmark_extraction.get_video_frames(file_url, prefetch = frame_prefetch, frame_step = step, start_frame = start_frame))
+        if chunk_dir is not None:
+            store = landmark_extraction.extract_landmarks_chunked(holistic, open_frames, chunk_dir, checkpoint_chunk_frames, info = info, **input_settings)
+        else:
+            store = landmark_extraction.extract_landmarks(holistic, open_frames(0), **input_settings)
+    finally:
+        holistic.close()
+
+    if use_landmark_cache:
+        landmark_cache.store_landmarks(landmark_cache_dir, key, store, info = info, max_size = landmark_cache_max_size)
+    if chunk_dir is not None:
+        # the cache entry replaces the chunks
+        landmark_chunks.remove_chunks(chunk_dir)
+
+    return store
+
+
+def set_location_keyframes(obj, frames, locations):
+    # fill the location F-curves of obj with all keyframes at once, returns False if obj is already animated
+    if obj.animation_data is None:
+        obj.animation_data_create()
+    if obj.animation_data.action is None:
+        obj.animation_data.action = bpy.data.actions.new(name = obj.name + "Action")
+
+    action = obj.animation_data.action
+    fcurves = []
+    for axis in range(0, 3):
+        fcurve = action.fcurves.find('location', index = axis)
+        if fcurve is None:
+            fcurve = action.fcurves.new('location', index = axis, action_group = "Object Transforms")
+        elif len(fcurve.keyframe_points) > 0:
+            return False
+        fcurves.append(fcurve)
+
+    profiler.count("keyframes", keyframe_reduction.set_linear_keys(fcurves, frames, locations, keyframe_tolerance, keyframe_stats))
+
+    return True
+
+
+def load_landmarks_into_scene(store = None, part = "", names = [], first_char = ""):
+    # all landmarks of the body part in scene coordinates, shape (frames, landmarks, 3), converted in one go
+    scene_locations = store.scene_locations(part)
+    mask = store.masks[part]
+    l_count = scene_locations.shape[1]
+    # get landmark names
+    object_names = [landmark_object_prefix + first_char + (str(id) if not names else names[id]) for id in range(0, l_count)]
+    detected_frames = np.flatnonzero(mask)
+
+    # create all ico spheres before keyframing, at their location in the first frame with a detection
+    create_landmark_objects(object_names, scene_locations[detected_frames[0]].tolist() if len(detected_frames) > 0 else None)
+    if len(detected_frames) == 0:
+        return
+
+    if use_bulk_keyframes:
+        detected_locations = scene_locations[detected_frames]
+        for id, name in enumerate(object_names):
+            obj = landmark_objects[name]
+            obj.location = detected_locations[0, id].tolist()
+            if set_location_keyframes(obj, detected_frames, detected_locations[:, id]):
+                continue
+
+            # the object already has location keyframes, so merge the new ones in one by one
+            for frame, location in zip(detected_frames.tolist(), detected_locations[:, id].tolist()):
                 obj.location = location
-                # insert keyframe
                 obj.keyframe_insert(data_path='location', frame = frame)
-                
-
-def create_bones(landmark_connections = [], first_char = "", armature_exists = False):
-    for idx, lc in enumerate(landmark_connections):
-        if idx == 0 and not armature_exists:
-            # Create armature with a single bone
-            bpy.ops.object.posemode_toggle()
-            bpy.ops.object.armature_add(enter_editmode=False, align='WORLD', location=(0, 0, 0), scale=(1, 1, 1))
-        else:
-            # add another single bone to the armature
-            bpy.ops.object.editmode_toggle()
-            bpy.ops.armature.bone_primitive_add()
-
-        # toggle into pose mode to set bone constraints
-        bpy.ops.object.posemode_toggle()
-        # assign start and target landmark names
-        start_lm = first_char + lc[0]
-        target_lm = first_char + lc[1]
-
-        # name bone after target landmark if no other name is given
-        bone_name = target_lm if len(lc) < 3 else lc[2]    
-        bpy.context.object.pose.bones["Bone"].name = bone_name
-                
+            profiler.count("keyframes", 3 * len(detected_frames))
+        return
+
+    locations = scene_locations.tolist()
+    objects = [landmark_objects[name] for name in object_names]
+    for frame in detected_frames.tolist():
+        for id, obj in enumerate(objects):
+            # set location for next frame
+            obj.location = locations[frame][id]
+            # insert keyframe
+            obj.keyframe_insert(data_path='location', frame = frame)
+    profiler.count("keyframes", 3 * len(detected_frames) * len(objects))
+
+
+def create_armature(armature_name = "Armature"):
+    # reuse the armature if it exists, so several clips can be built next to each other under different names
+    armature_obj = bpy.data.objects.get(armature_name)
+    if armature_obj is None:
+        armature_obj = bpy.data.objects.new(armature_name, bpy.data.armatures.new(armature_name))
+        bpy.context.collection.objects.link(armature_obj)
+
+    return armature_obj
+
+
+def create_bones(bone_connections = [], armature_name = "Armature", object_prefix = None):
+    # object_prefix of the landmark objects the bones follow, landmark_object_prefix by default
+    object_prefix = landmark_object_prefix if object_prefix is None else object_prefix
+    armature_obj = create_armature(armature_name)
+    if bpy.context.object is not None and bpy.context.object.mode != 'OBJECT':
+        bpy.ops.object.mode_set(mode='OBJECT')
+    bpy.context.view_layer.objects.active = armature_obj
+
+    # add all bones in one edit mode session, every bone points up the z axis with unit length
+    bpy.ops.object.mode_set(mode='EDIT')
+    bone_names = []
+    for bone_name, _, _ in bone_connections:
+        edit_bone = armature_obj.data.edit_bones.new(bone_name)
+        edit_bone.head = (0, 0, 0)
+        edit_bone.tail = (0, 0, 1)
+        # Blender renames the bone if the name is taken already
+        bone_names.append(edit_bone.name)
+    profiler.count("bones", len(bone_names))
+
+    # set all bone constraints in one pass in pose mode
+    bpy.ops.object.mode_set(mode='POSE')
+    for bone_name, (_, start_lm, target_lm) in zip(bone_names, bone_connections):
+        pose_bone = armature_obj.pose.bones[bone_name]
         # set constraint 'COPY_LOCATION'
-        bone_const_cl = bpy.data.objects['Armature'].pose.bones[bone_name].constraints.new('COPY_LOCATION')
-        bone_const_cl.target = bpy.data.objects[start_lm]
-        # set constraint 'STRETCH_TO'
-        bone_const_st = bpy.data.objects['Armature'].pose.bones[bone_name].constraints.new('STRETCH_TO')
-        bone_const_st.target = bpy.data.objects[target_lm]
-        
-        
-def create_90d_bones(landmark_single_bones = []):
-    for lm in landmark_single_bones:
-        # add single bone in 90d angle to the armature
-        bpy.ops.object.editmode_toggle()
-        bpy.ops.armature.bone_primitive_add()
-        
-        # toggle into pose mode to set bone constraints
-        bpy.ops.object.posemode_toggle()
-        # get the bone name as string
-        lm_name = lm
-        if isinstance(lm, int):
-            lm_name = str(lm)
-        # name bone after landmark 
-        bpy.context.object.pose.bones["Bone"].name = lm_name
-        # set constraint 'COPY_LOCATION'
-        bone_const_cl = bpy.data.objects['Armature'].pose.bones[lm_name].constraints.new('COPY_LOCATION')
-        bone_const_cl.target = bpy.data.objects[lm_name]
-        
+        bone_const_cl = pose_bone.constraints.new('COPY_LOCATION')
+        bone_const_cl.target = landmark_objects[object_prefix + start_lm]
+        if target_lm is not None:
+            # set constraint 'STRETCH_TO'
+            bone_const_st = pose_bone.constraints.new('STRETCH_TO')
+            bone_const_st.target = landmark_objects[object_prefix + target_lm]
+        profiler.count("constraints", 1 if target_lm is None else 2)
 
+    return armature_obj
 
-########## Execute methods ##########
 
-# Get landmarks into arrays
-get_landmarks(video_file_name, get_video_frames(video_file_path))
+def build_scene(store):
+    # Index the objects that are already in the scene
+    index_scene_objects()
+
+    with profiler.stage("load_landmarks"):
+        # Load Pose Landmarks
+        load_landmarks_into_scene(store = store, part = "pose", names = pose_landmark_names)
 
-# Load Pose Landmarks
-load_landmarks_into_scene(landmarks = pose_landmarks, names = pose_landmark_names, l_count = 33)
+        # Load Right Hand Landmarks
+        load_landmarks_into_scene(store = store, part = "right_hand", names = hand_landmark_names, first_char = "R")
 
-# Load Right Hand Landmarks
-load_landmarks_into_scene(landmarks = right_hand_landmarks, names = hand_landmark_names, l_count = 21, first_char = "R")
+        # Load Left Hand Landmarks
+        load_landmarks_into_scene(store = store, part = "left_hand", names = hand_landmark_names, first_char = "L")
 
-# Load Left Hand Landmarks
-load_landmarks_into_scene(landmarks = left_hand_landmarks, names = hand_landmark_names, l_count = 21, first_char = "L")
+        # Load Face Landsmarks
+        load_landmarks_into_scene(store = store, part = "face")
 
-# Load Face Landsmarks
-load_landmarks_into_scene(landmarks = face_landmarks, l_count = 468)
 
+    # Create all bones in one go: pose bones (only arms), left hand, right hand and face bones
+    # face bones will currently not be mapped onto a 3D character in assign_animation_to_avatar.py
+    with profiler.stage("create_bones"):
+        create_bones(bone_connections = get_all_bone_connections(), armature_name = armature_name)
 
-# Create pose bones (only arms)
-create_bones(landmark_connections = pose_landmark_connections)
+    if keyframe_tolerance is not None:
+        print("Landmark keyframes: " + str(keyframe_stats))
 
-# Create bones for left hand
-create_bones(landmark_connections = hand_landmark_connections, first_char = "L", armature_exists = True)
+    profiler.write_report(profiling.report_path(bpy.data.filepath), video = video_file_name, frames = len(store))
 
-# Create bones for right hand
-create_bones(landmark_connections = hand_landmark_connections, first_char = "R", armature_exists = True)
 
-# Create face bones
-# face bones will currently not be mapped onto a 3D character in assign_animation_to_avatar.py
-create_bones(landmark_connections = face_landmark_connections, armature_exists = True)
-create_90d_bones(face_landmark_single_bones)
-create_90d_bones(pose_landmark_single_bones)
+########## Execute methods ##########
+
+if __name__ == "__main__":
+    if use_worker and not landmark_file_path:
+        # the worker analyzes the video (or loads it from the cache) while Blender stays responsive, the operator builds the scene afterwards
+        bpy.utils.register_class(ExtractLandmarksOperator)
+        bpy.ops.wm.extract_mp_landmarks()
+    else:
+        # Get landmarks into arrays (from the cache if the video was analyzed before)
+        with profiler.stage("landmarks"):
+            store = get_landmark_store(video_file_name, video_file_path)
+
+        build_scene(store)
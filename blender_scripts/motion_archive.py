@@ -0,0 +1,279 @@
+"""
+# What does this module do?
+It packs many BVH clips into one binary archive file and reads them back. The motion of every clip is quantized
+per channel and split into blocks of frames along time. Every block starts with a keyframe row that holds the
+absolute values and continues with the differences to the previous frame, stored in the smallest integer type
+that fits and compressed with zlib. A JSON index at the end of the file holds the shared joint name table,
+the hierarchies (every distinct hierarchy is stored once) and the position of every block, so a single clip or
+frame range is read without decompressing the rest of the archive.
+
+There are two quantizations:
+* "exact" stores every value in millionths, which is exactly what the 6 decimals of a BVH file hold. Together
+  with the sign of values that are written as -0.000000, this gives back the original BVH file byte for byte.
+* "fixed16" maps every channel to 16 bit between its smallest and largest value in the clip. It is lossy
+  (the error is at most half a step of the channel range / 65535) and compresses better.
+
+# How to use this module?
+It only needs numpy, e.g.
+    python motion_archive.py pack ../animation_results/clips.mca ../animation_results/BVH
+    python motion_archive.py list ../animation_results/clips.mca
+    python motion_archive.py unpack ../animation_results/clips.mca ../animation_results/BVH_unpacked --clip GuteBesserung
+or from Python
+    with motion_archive.MotionArchive("clips.mca") as archive:
+        clip = archive.read_clip("GuteBesserung", 100, 200)  # BvhClip with frames 100 to 199
+"""
+
+import argparse, json, os, struct, zlib
+
+import numpy as np
+
+import bvh_reader
+
+
+########## Variables ##########
+
+## Increase when the layout of the archive changes
+archive_format_version = 1
+
+## First bytes of every archive file
+archive_magic = b"MOTNARC\0"
+
+## The footer holds the position and length of the JSON index
+footer_format = "<QQ8s"
+
+## Frames per block, a frame range is read block by block
+default_block_frames = 64
+
+## Steps per unit of the "exact" quantization, BVH files are written with 6 decimals
+exact_steps = 10 ** 6
+
+## Largest value of the "fixed16" quantization
+fixed16_steps = 2 ** 16 - 1
+
+## Integer types for the differences of a block, the first one that fits is used
+delta_dtypes = ["<i1", "<i2", "<i4", "<i8"]
+
+
+########## Class definitions ##########
+
+class MotionArchive:
+    def __init__(self, file_url):
+        self.file = open(file_url, 'rb')
+        self.file.seek(-struct.calcsize(footer_format), os.SEEK_END)
+        index_offset, index_length, magic = struct.unpack(footer_format, self.file.read(struct.calcsize(footer_format)))
+        if magic != archive_magic:
+            self.file.close()
+            raise ValueError("%s is not a motion archive" % file_url)
+
+        self.index = json.loads(self.read_bytes([index_offset, index_length]).decode('utf-8'))
+        if self.index["format"] != archive_format_version:
+            self.file.close()
+            raise ValueError("%s has the archive format %s instead of %d" % (file_url, self.index["format"], archive_format_version))
+        self.joint_names = self.index["joint_names"]
+        self.clips = self.index["clips"]
+        self.hierarchies = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.file.close()
+
+    @property
+    def clip_names(self):
+        return list(self.clips)
+
+    def read_bytes(self, location):
+        offset, length = location
+        self.file.seek(offset)
+        return self.file.read(length)
+
+    def hierarchy_text(self, name):
+        id = self.clips[name]["hierarchy"]
+        if id not in self.hierarchies:
+            entry = self.index["hierarchies"][id]
+            self.hierarchies[id] = zlib.decompress(self.read_bytes(entry["text"])).decode('utf-8')
+
+        return self.hierarchies[id]
+
+    def clip_joint_names(self, name):
+        # names of the joints of a clip from the shared table, without reading the hierarchy
+        return [self.joint_names[id] for id in self.index["hierarchies"][self.clips[name]["hierarchy"]]["joints"]]
+
+    def read_motion(self, name, start = 0, stop = None):
+        # (frames, channels) float64 motion of the frames start to stop - 1, only the blocks of the range are read
+        clip = self.clips[name]
+        block_frames = clip["block_frames"]
+        stop = clip["frame_count"] if stop is None else min(stop, clip["frame_count"])
+        start = max(0, min(start, stop))
+        if start == stop:
+            return np.zeros((0, clip["channel_count"]), dtype=np.float64)
+
+        blocks = [decode_block(self.read_bytes(block["data"]), block["dtype"], block["frames"], clip["channel_count"])
+                  for block in clip["blocks"][start // block_frames:(stop - 1) // block_frames + 1]]
+        steps = np.concatenate(blocks)[start - start // block_frames * block_frames:][:stop - start]
+        motion = dequantize(steps, clip)
+
+        # values that were written as -0.000000
+        negative_zeros = [(id, block) for id, block in enumerate(clip["blocks"]) if block["negative_zeros"] is not None
+                          and id * block_frames < stop and (id + 1) * block_frames > start]
+        for id, block in negative_zeros:
+            mask = np.unpackbits(np.frombuffer(zlib.decompress(self.read_bytes(block["negative_zeros"])), dtype=np.uint8))
+            mask = mask[:block["frames"] * clip["channel_count"]].reshape(clip["channel_count"], block["frames"]).T.astype(bool)
+            frames = np.arange(block["frames"]) + id * block_frames - start
+            inside = (frames >= 0) & (frames < stop - start)
+            rows = motion[frames[inside]]
+            rows[mask[inside]] = -0.0
+            motion[frames[inside]] = rows
+
+        return motion
+
+    def read_clip(self, name, start = 0, stop = None):
+        header = self.hierarchy_text(name)
+        joints = bvh_reader.parse_hierarchy(header)
+        return bvh_reader.BvhClip(joints, self.read_motion(name, start, stop), self.clips[name]["frame_time"], header)
+
+    def write_bvh(self, name, file_url):
+        clip = self.read_clip(name)
+        with open(file_url, 'w', newline='\n') as f:
+            f.write(clip.hierarchy_text)
+            f.write("MOTION\nFrames: %d\nFrame Time: %f\n" % (clip.frame_count, clip.frame_time))
+            np.savetxt(f, clip.motion, fmt='%f', delimiter=' ', newline=' \n')
+
+
+########## Method definitions ##########
+
+def quantize(motion, quantization):
+    # integer steps of every value and the values that are needed to get the motion back
+    if quantization == "exact":
+        return np.rint(motion * exact_steps).astype(np.int64), {}
+    if quantization == "fixed16":
+        low = motion.min(axis=0) if len(motion) else np.zeros(motion.shape[1])
+        high = motion.max(axis=0) if len(motion) else np.zeros(motion.shape[1])
+        step = np.where(high > low, (high - low) / fixed16_steps, 1.0)
+        return np.rint((motion - low) / step).astype(np.int64), {"low": low.tolist(), "step": step.tolist()}
+
+    raise ValueError("unknown quantization " + quantization)
+
+
+def dequantize(steps, clip):
+    if clip["quantization"] == "exact":
+        return steps / exact_steps
+
+    return np.array(clip["low"]) + steps * np.array(clip["step"])
+
+
+def encode_block(steps):
+    # first row absolute, then the differences to the previous frame, channel by channel
+    deltas = np.diff(steps, axis=0, prepend=np.zeros((1, steps.shape[1]), dtype=np.int64))
+    deltas[0] = steps[0]
+    largest = np.abs(deltas).max() if deltas.size else 0
+    dtype = next(t for t in delta_dtypes if largest <= np.iinfo(np.dtype(t)).max)
+
+    return zlib.compress(np.ascontiguousarray(deltas.T, dtype=dtype).tobytes(), 9), dtype
+
+
+def decode_block(data, dtype, frame_count, channel_count):
+    deltas = np.frombuffer(zlib.decompress(data), dtype=dtype).reshape(channel_count, frame_count).T
+    return np.cumsum(deltas, axis=0, dtype=np.int64)
+
+
+def write_archive(file_url, clips, quantization = "exact", block_frames = default_block_frames):
+    # clips maps the clip names to BvhClips, their motion should be float64 (bvh_reader.parse_bvh(text, np.float64))
+    index = {"format": archive_format_version, "joint_names": [], "hierarchies": [], "clips": {}}
+    joint_ids, hierarchy_ids = {}, {}
+    tmp_url = file_url + ".tmp"
+
+    with open(tmp_url, 'wb') as f:
+        f.write(archive_magic)
+
+        def append(data):
+            offset = f.tell()
+            f.write(data)
+            return [offset, len(data)]
+
+        for name, clip in clips.items():
+            if clip.hierarchy_text not in hierarchy_ids:
+                # every distinct hierarchy once, with the ids of its joints in the shared name table
+                for joint_name in clip.joint_names:
+                    if joint_name not in joint_ids:
+                        joint_ids[joint_name] = len(index["joint_names"])
+                        index["joint_names"].append(joint_name)
+                hierarchy_ids[clip.hierarchy_text] = len(index["hierarchies"])
+                index["hierarchies"].append({"text": append(zlib.compress(clip.hierarchy_text.encode('utf-8'), 9)),
+                                             "joints": [joint_ids[n] for n in clip.joint_names]})
+
+            motion = np.asarray(clip.motion, dtype=np.float64)
+            steps, scale = quantize(motion, quantization)
+            negative_zeros = (steps == 0) & np.signbit(motion) if quantization == "exact" else np.zeros(motion.shape, dtype=bool)
+            entry = {"hierarchy": hierarchy_ids[clip.hierarchy_text], "frame_count": len(motion), "channel_count": motion.shape[1],
+                     "frame_time": clip.frame_time, "quantization": quantization, "block_frames": block_frames, "blocks": []}
+            entry.update(scale)
+            for start in range(0, len(motion), block_frames):
+                data, dtype = encode_block(steps[start:start + block_frames])
+                block = {"frames": len(steps[start:start + block_frames]), "dtype": dtype, "data": append(data), "negative_zeros": None}
+                block_zeros = negative_zeros[start:start + block_frames]
+                if block_zeros.any():
+                    block["negative_zeros"] = append(zlib.compress(np.packbits(block_zeros.T).tobytes(), 9))
+                entry["blocks"].append(block)
+            index["clips"][name] = entry
+
+        index_location = append(json.dumps(index).encode('utf-8'))
+        f.write(struct.pack(footer_format, index_location[0], index_location[1], archive_magic))
+
+    os.replace(tmp_url, file_url)
+
+
+def find_bvh_files(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += sorted(os.path.join(path, f) for f in os.listdir(path) if f.lower().endswith('.bvh'))
+        else:
+            files.append(path)
+
+    return files
+
+
+def pack_bvh_files(file_url, bvh_files, quantization = "exact", block_frames = default_block_frames):
+    clips = {}
+    for bvh_file in bvh_files:
+        with open(bvh_file) as f:
+            clips[os.path.splitext(os.path.basename(bvh_file))[0]] = bvh_reader.parse_bvh(f.read(), dtype=np.float64)
+    write_archive(file_url, clips, quantization, block_frames)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Pack BVH clips into a motion archive and unpack them again.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    pack = commands.add_parser('pack', help='write an archive from BVH files')
+    pack.add_argument('archive')
+    pack.add_argument('bvh', nargs='+', help='BVH files or folders with BVH files')
+    pack.add_argument('--quantization', choices=['exact', 'fixed16'], default='exact')
+    pack.add_argument('--block-frames', type=int, default=default_block_frames)
+    unpack = commands.add_parser('unpack', help='write BVH files from an archive')
+    unpack.add_argument('archive')
+    unpack.add_argument('folder')
+    unpack.add_argument('--clip', action='append', help='only this clip, can be given more than once')
+    listing = commands.add_parser('list', help='show the clips of an archive')
+    listing.add_argument('archive')
+    args = parser.parse_args()
+
+    if args.command == 'pack':
+        bvh_files = find_bvh_files(args.bvh)
+        pack_bvh_files(args.archive, bvh_files, args.quantization, args.block_frames)
+        size = sum(os.path.getsize(f) for f in bvh_files)
+        print('%d clips, %.2f MB -> %.2f MB' % (len(bvh_files), size / 1e6, os.path.getsize(args.archive) / 1e6))
+    elif args.command == 'unpack':
+        os.makedirs(args.folder, exist_ok=True)
+        with MotionArchive(args.archive) as archive:
+            for name in args.clip or archive.clip_names:
+                archive.write_bvh(name, os.path.join(args.folder, name + '.bvh'))
+    else:
+        with MotionArchive(args.archive) as archive:
+            for name in archive.clip_names:
+                clip = archive.clips[name]
+                print('%-40s %6d frames %5d channels %s' % (name, clip["frame_count"], clip["channel_count"], clip["quantization"]))
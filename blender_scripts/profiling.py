@@ -0,0 +1,161 @@
+"""
+# What does this module do?
+It records where the time of a run goes: the wall time of named stages (e.g. decode, inference, load_landmarks,
+create_bones), the latency of every single frame as histogram, counts of what was created (objects, keyframes,
+constraints, ...) and the peak resident memory of the process. The report is a JSON file, so runs of different
+commits or machines can be compared. A disabled Profiler does nothing, so the calls can stay in the scripts.
+
+# How to use this module?
+It only uses the standard library and works inside and outside of Blender, e.g.
+    profiler = profiling.Profiler(enabled = True)
+    with profiler.stage("create_bones"):
+        ...
+    profiler.count("constraints", 2)
+    for image in profiler.timed_frames(frames):
+        ...
+    profiler.write_report("clip.profile.json", video = "clip.mov")
+The peak memory is read with the module resource, which does not exist on Windows; it is null in the report there.
+"""
+
+import contextlib, json, os, platform, sys, threading, time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+########## Variables ##########
+
+## Upper bounds of the latency histogram buckets in milliseconds, the last bucket holds everything above
+histogram_edges_ms = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+
+
+########## Class definitions ##########
+
+class Profiler:
+    def __init__(self, enabled = False):
+        self.enabled = enabled
+        self.reset()
+
+    def reset(self):
+        # stage name -> [seconds, calls]
+        self.stages = {}
+        # name -> list of seconds, one per frame
+        self.latencies = {}
+        self.counts = {}
+        self.start_time = time.perf_counter()
+        # the writer threads of main.py report from several threads
+        self.lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def add_time(self, name, seconds):
+        if not self.enabled:
+            return
+        with self.lock:
+            stage = self.stages.setdefault(name, [0.0, 0])
+            stage[0] += seconds
+            stage[1] += 1
+
+    def add_latency(self, name, seconds):
+        # one frame of a per-frame stage, counted in the stage time as well
+        if not self.enabled:
+            return
+        with self.lock:
+            self.latencies.setdefault(name, []).append(seconds)
+        self.add_time(name, seconds)
+
+    def count(self, name, number = 1):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counts[name] = self.counts.get(name, 0) + number
+
+    def timed_frames(self, frames, decode_stage = "decode", latency_name = "inference"):
+        # the time spent in fetching a frame counts as decode_stage, the time until the next frame is requested
+        # as the latency of the frame (None frames, i.e. skipped frames, have no latency)
+        if not self.enabled:
+            return frames
+
+        return self._timed_frames(iter(frames), decode_stage, latency_name)
+
+    def _timed_frames(self, frames, decode_stage, latency_name):
+        while True:
+            start = time.perf_counter()
+            try:
+                image = next(frames)
+            except StopIteration:
+                return
+            self.add_time(decode_stage, time.perf_counter() - start)
+            if image is None:
+                yield image
+                continue
+            start = time.perf_counter()
+            yield image
+            self.add_latency(latency_name, time.perf_counter() - start)
+
+    def report(self, **info):
+        # dict with the stages, latency histograms, counts and peak memory, info is added as it is (e.g. the video name)
+        with self.lock:
+            return {
+                "info": info,
+                "platform": {"python": platform.python_version(), "system": platform.platform(), "machine": platform.machine()},
+                "wall_seconds": time.perf_counter() - self.start_time,
+                "stages": {name: {"seconds": seconds, "calls": calls} for name, (seconds, calls) in self.stages.items()},
+                "latencies": {name: latency_summary(values) for name, values in self.latencies.items()},
+                "counts": dict(self.counts),
+                "peak_rss_bytes": peak_rss_bytes()
+            }
+
+    def write_report(self, file_url, **info):
+        if not self.enabled:
+            return
+        with open(file_url, 'w') as f:
+            json.dump(self.report(**info), f, indent=2)
+        print("Profile written to " + str(file_url))
+
+
+########## Method definitions ##########
+
+def report_path(output_url, suffix = ".profile.json"):
+    # report next to the output of a run, e.g. "clip.blend" -> "clip.profile.json"
+    return os.path.splitext(output_url or "untitled")[0] + suffix
+
+
+def percentile(sorted_values, share):
+    # nearest rank percentile of sorted values
+    return sorted_values[min(len(sorted_values) - 1, max(0, int(round(share * len(sorted_values))) - 1))]
+
+
+def latency_summary(values):
+    sorted_ms = sorted(v * 1000 for v in values)
+    histogram = [0] * (len(histogram_edges_ms) + 1)
+    for ms in sorted_ms:
+        histogram[next((id for id, edge in enumerate(histogram_edges_ms) if ms <= edge), len(histogram_edges_ms))] += 1
+
+    return {
+        "frames": len(sorted_ms),
+        "mean_ms": sum(sorted_ms) / len(sorted_ms) if sorted_ms else 0.0,
+        "p50_ms": percentile(sorted_ms, 0.5) if sorted_ms else 0.0,
+        "p95_ms": percentile(sorted_ms, 0.95) if sorted_ms else 0.0,
+        "max_ms": sorted_ms[-1] if sorted_ms else 0.0,
+        "histogram": {"edges_ms": histogram_edges_ms, "counts": histogram}
+    }
+
+
+def peak_rss_bytes():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
@@ -0,0 +1,304 @@
+"""
+# What does this module do?
+It computes the bone rotations of the avatar directly from the rotation channels of a BVH clip, for all frames at once.
+The result is the same as the setup of assign_animation_to_avatar.py with the imported and rotated BVH armatures,
+the COPY_ROTATION constraints and a baked action with visual keying, but nothing has to be imported, constrained
+or evaluated frame by frame in Blender:
+* the world rotation of an imported BVH bone is the rotation of its armature object (-210 or -180 degrees around x)
+  times the axis conversion of the importer (+90 degrees around x) times the BVH rotation times the rest rotation of
+  the bone, which points along its end site with roll 0 in BVH space
+* COPY_ROTATION in world space replaces the world rotation of the avatar bone; without use_y the y euler angle
+  (in the rotation order of the avatar bone) keeps the value it had before the constraint
+* an influence below 1 interpolates between the rotation before and after the constraint
+* the baked rotation of a bone is its final rotation relative to its parent and rest rotation
+All rotations are (frames, 3, 3) matrices.
+
+# How to use this module?
+It only needs numpy. Describe the avatar armature with a Rig (assign_animation_to_avatar.read_rig does this in Blender),
+list the mapped bones as BoneTarget and call retarget_rotations with a BvhClip from bvh_reader.py.
+"""
+
+import numpy as np
+
+
+########## Variables ##########
+
+## Axis index of every euler axis
+axis_ids = {"X": 0, "Y": 1, "Z": 2}
+
+## Rotation channels of a BVH joint
+rotation_channels = ["Xrotation", "Yrotation", "Zrotation"]
+
+## Axis conversion that Blender's BVH importer applies to the armature (forward -Z, up Y): the y up of BVH becomes z up,
+# which is +90 degrees around x. The importer applies it to the bones, so the armature object is not rotated by it.
+bvh_import_rotation = np.array([[1.0, 0.0, 0.0], [0.0, 0.0, -1.0], [0.0, 1.0, 0.0]])
+
+
+########## Class definitions ##########
+
+class Rig:
+    def __init__(self, bone_names, parents, rest, rotation_modes, basis = None, object_rotation = None):
+        # bones in hierarchy order, every parent comes before its children
+        self.bone_names = bone_names
+        # index of the parent bone, -1 for root bones
+        self.parents = parents
+        # (bones, 3, 3) rest rotations in armature space (Bone.matrix_local)
+        self.rest = np.asarray(rest, dtype=np.float64)
+        # rotation mode of every pose bone, e.g. 'QUATERNION' or 'XYZ'
+        self.rotation_modes = rotation_modes
+        # (bones, 3, 3) rotations of the current pose (PoseBone.matrix_basis), used for bones that are not mapped
+        self.basis = np.tile(np.eye(3), (len(bone_names), 1, 1)) if basis is None else np.asarray(basis, dtype=np.float64)
+        # rotation of the armature object in the world
+        self.object_rotation = np.eye(3) if object_rotation is None else np.asarray(object_rotation, dtype=np.float64)
+
+    def euler_order(self, id):
+        # the constraint uses XYZ for bones without euler rotation
+        mode = self.rotation_modes[id]
+        return mode if mode in ("XYZ", "XZY", "YXZ", "YZX", "ZXY", "ZYX") else "XYZ"
+
+
+class BoneTarget:
+    def __init__(self, bvh_joint, bone_name, armature_angle, use_y = True, influence = 1.0):
+        # like a COPY_ROTATION constraint of bone_name with the BVH joint as subtarget,
+        # armature_angle is the x rotation of the imported BVH armature in radians
+        self.bvh_joint = bvh_joint
+        self.bone_name = bone_name
+        self.armature_angle = armature_angle
+        self.use_y = use_y
+        self.influence = influence
+
+
+########## Method definitions ##########
+
+def axis_rotation(axis, angles):
+    # (frames, 3, 3) rotations around one axis ("X", "Y" or "Z") by angles in radians
+    angles = np.asarray(angles, dtype=np.float64)
+    c, s = np.cos(angles), np.sin(angles)
+    a = axis_ids[axis]
+    b, d = (a + 1) % 3, (a + 2) % 3
+    m = np.zeros(angles.shape + (3, 3))
+    m[..., a, a] = 1
+    m[..., b, b], m[..., b, d] = c, -s
+    m[..., d, b], m[..., d, d] = s, c
+
+    return m
+
+
+def euler_to_matrix(eulers, order = "XYZ"):
+    # (frames, 3) x, y, z angles to rotations, the first axis of order is applied first like in Blender
+    eulers = np.asarray(eulers, dtype=np.float64)
+    m = axis_rotation(order[0], eulers[..., axis_ids[order[0]]])
+    for axis in order[1:]:
+        m = axis_rotation(axis, eulers[..., axis_ids[axis]]) @ m
+
+    return m
+
+
+def matrix_to_eulers(m, order = "XYZ"):
+    # both (frames, 3) euler solutions of rotations, like Blender's mat3_normalized_to_eulo2
+    i, j, k = (axis_ids[a] for a in order)
+    parity = order in ("XZY", "YXZ", "ZYX")
+    cy = np.hypot(m[..., i, i], m[..., j, i])
+    regular = cy > 16 * np.finfo(np.float32).eps
+
+    euler_1, euler_2 = np.zeros(m.shape[:-1]), np.zeros(m.shape[:-1])
+    euler_1[..., i] = np.where(regular, np.arctan2(m[..., k, j], m[..., k, k]), np.arctan2(-m[..., j, k], m[..., j, j]))
+    euler_1[..., j] = np.arctan2(-m[..., k, i], cy)
+    euler_1[..., k] = np.where(regular, np.arctan2(m[..., j, i], m[..., i, i]), 0)
+    euler_2[..., i] = np.where(regular, np.arctan2(-m[..., k, j], -m[..., k, k]), euler_1[..., i])
+    euler_2[..., j] = np.where(regular, np.arctan2(-m[..., k, i], -cy), euler_1[..., j])
+    euler_2[..., k] = np.where(regular, np.arctan2(-m[..., j, i], -m[..., i, i]), 0)
+    if parity:
+        euler_1, euler_2 = -euler_1, -euler_2
+
+    return euler_1, euler_2
+
+
+def matrix_to_euler(m, order = "XYZ", reference = None):
+    # the euler solution with the smaller angles, or the one closer to the reference angles
+    euler_1, euler_2 = matrix_to_eulers(m, order)
+    if reference is None:
+        first = np.abs(euler_1).sum(axis=-1) <= np.abs(euler_2).sum(axis=-1)
+    else:
+        # full turns do not change the rotation but the distance to the reference
+        euler_1 = euler_1 + np.round((reference - euler_1) / (2 * np.pi)) * 2 * np.pi
+        euler_2 = euler_2 + np.round((reference - euler_2) / (2 * np.pi)) * 2 * np.pi
+        first = np.abs(euler_1 - reference).sum(axis=-1) <= np.abs(euler_2 - reference).sum(axis=-1)
+
+    return np.where(first[..., None], euler_1, euler_2)
+
+
+def matrix_to_quaternion(m):
+    # (frames, 4) w, x, y, z quaternions of rotations with w >= 0, with Shepperd's method: the component with the largest
+    # square is taken from the diagonal and the others from the off-diagonal elements divided by it, which stays exact at 180 degrees
+    m = np.asarray(m, dtype=np.float64)
+    trace = m[..., 0, 0] + m[..., 1, 1] + m[..., 2, 2]
+    # 4 * square of w, x, y and z
+    squares = np.stack([1 + trace, 1 + 2 * m[..., 0, 0] - trace, 1 + 2 * m[..., 1, 1] - trace, 1 + 2 * m[..., 2, 2] - trace], axis=-1)
+    largest = np.argmax(squares, axis=-1)
+    # 4 * w * (w, x, y, z), 4 * x * (w, x, y, z), ...
+    sums = np.stack([
+        np.stack([squares[..., 0], m[..., 2, 1] - m[..., 1, 2], m[..., 0, 2] - m[..., 2, 0], m[..., 1, 0] - m[..., 0, 1]], axis=-1),
+        np.stack([m[..., 2, 1] - m[..., 1, 2], squares[..., 1], m[..., 0, 1] + m[..., 1, 0], m[..., 0, 2] + m[..., 2, 0]], axis=-1),
+        np.stack([m[..., 0, 2] - m[..., 2, 0], m[..., 0, 1] + m[..., 1, 0], squares[..., 2], m[..., 1, 2] + m[..., 2, 1]], axis=-1),
+        np.stack([m[..., 1, 0] - m[..., 0, 1], m[..., 0, 2] + m[..., 2, 0], m[..., 1, 2] + m[..., 2, 1], squares[..., 3]], axis=-1)
+    ], axis=-2)
+    q = np.take_along_axis(sums, largest[..., None, None], axis=-2)[..., 0, :]
+    q = q / np.linalg.norm(q, axis=-1, keepdims=True)
+
+    return np.where(q[..., :1] < 0, -q, q)
+
+
+def quaternion_to_matrix(q):
+    w, x, y, z = np.moveaxis(np.asarray(q, dtype=np.float64), -1, 0)
+    m = np.empty(w.shape + (3, 3))
+    m[..., 0, 0], m[..., 0, 1], m[..., 0, 2] = 1 - 2 * (y * y + z * z), 2 * (x * y - w * z), 2 * (x * z + w * y)
+    m[..., 1, 0], m[..., 1, 1], m[..., 1, 2] = 2 * (x * y + w * z), 1 - 2 * (x * x + z * z), 2 * (y * z - w * x)
+    m[..., 2, 0], m[..., 2, 1], m[..., 2, 2] = 2 * (x * z - w * y), 2 * (y * z + w * x), 1 - 2 * (x * x + y * y)
+
+    return m
+
+
+def slerp(q0, q1, t):
+    # spherical interpolation of (frames, 4) quaternions along the shorter way
+    dot = (q0 * q1).sum(axis=-1, keepdims=True)
+    q1 = np.where(dot < 0, -q1, q1)
+    dot = np.clip(np.abs(dot), 0, 1)
+    angle = np.arccos(dot)
+    sin = np.sin(angle)
+    close = sin < 1e-6
+    w0 = np.where(close, 1 - t, np.sin((1 - t) * angle) / np.where(close, 1, sin))
+    w1 = np.where(close, t, np.sin(t * angle) / np.where(close, 1, sin))
+    q = w0 * q0 + w1 * q1
+
+    return q / np.linalg.norm(q, axis=-1, keepdims=True)
+
+
+def continuous_quaternions(q):
+    # flip quaternions so consecutive frames never take the long way around
+    q = np.array(q)
+    flips = np.cumsum((q[1:] * q[:-1]).sum(axis=-1) < 0) % 2 == 1
+    q[1:][flips] *= -1
+
+    return q
+
+
+def continuous_eulers(m, order = "XYZ"):
+    # euler angles of every frame, each one close to the angles of the frame before, like matrix_to_euler with the angles
+    # of the frame before as reference. Both solutions of all frames and their distances are computed at once, only the
+    # choice of the solution depends on the choice in the frame before.
+    solutions = np.stack(matrix_to_eulers(m, order), axis=-2)
+    frame_count = len(solutions)
+    if frame_count == 0:
+        return np.empty(m.shape[:-1])
+
+    # distance[frame, a, b]: from solution a of the frame before to solution b, full turns do not count
+    difference = solutions[1:, None, :, :] - solutions[:-1, :, None, :]
+    distance = np.abs(difference - np.round(difference / (2 * np.pi)) * 2 * np.pi).sum(axis=-1)
+    second = distance[:, :, 1] < distance[:, :, 0]
+    choice = np.empty(frame_count, dtype=int)
+    choice[0] = np.abs(solutions[0, 1]).sum() < np.abs(solutions[0, 0]).sum()
+    for frame in range(1, frame_count):
+        choice[frame] = second[frame - 1, choice[frame - 1]]
+    eulers = solutions[np.arange(frame_count), choice]
+
+    # add the full turns that keep every angle close to the one of the frame before
+    turns = np.round((eulers[:-1] - eulers[1:]) / (2 * np.pi))
+    eulers[1:] += np.cumsum(turns, axis=0) * 2 * np.pi
+
+    return eulers
+
+
+def rotation_angle(a, b):
+    # angle in radians of the rotation between two (frames, 3, 3) rotations, exact also for small angles
+    d = np.swapaxes(a, -1, -2) @ b
+    sin = np.linalg.norm(np.stack([d[..., 2, 1] - d[..., 1, 2], d[..., 0, 2] - d[..., 2, 0], d[..., 1, 0] - d[..., 0, 1]], axis=-1), axis=-1) / 2
+    cos = (d[..., 0, 0] + d[..., 1, 1] + d[..., 2, 2] - 1) / 2
+
+    return np.arctan2(sin, cos)
+
+
+def bone_rest_matrix(direction):
+    # rest rotation of a bone pointing along direction with roll 0, like Blender's vec_roll_to_mat3
+    x, y, z = np.asarray(direction, dtype=np.float64) / np.linalg.norm(direction)
+    theta = 1 + y
+    if theta <= 1e-5 and x * x + z * z <= 1e-10:
+        # pointing down the y axis
+        return np.diag([-1.0, -1.0, 1.0])
+
+    return np.array([
+        [1 - x * x / theta, x, -x * z / theta],
+        [-x, y, -z],
+        [-x * z / theta, z, 1 - z * z / theta]
+    ])
+
+
+def bvh_world_rotations(clip, joint_name, armature_angle):
+    # (frames, 3, 3) world rotations of a bone of the imported BVH armature after rotating the armature around x
+    frame_count = clip.frame_count
+    joint_rotation = np.tile(np.eye(3), (frame_count, 1, 1))
+    j = clip.joint_index(joint_name)
+    rest_direction = clip.joints[j]["end_site"]
+    if rest_direction is None:
+        # Blender points bones without end site to their children or along y
+        children = [joint["offset"] for joint in clip.joints if joint["parent"] == j]
+        rest_direction = np.mean(children, axis=0) if children and np.any(np.mean(children, axis=0)) else [0.0, 1.0, 0.0]
+
+    # the BVH rotations of the joint and its parents, the first channel is the outermost rotation
+    while j >= 0:
+        joint = clip.joints[j]
+        motion = np.asarray(clip.joint_motion(joint["name"]), dtype=np.float64)
+        local = np.tile(np.eye(3), (frame_count, 1, 1))
+        for column, channel in enumerate(joint["channels"]):
+            if channel in rotation_channels:
+                local = local @ axis_rotation(channel[0], np.radians(motion[:, column]))
+        joint_rotation = local @ joint_rotation
+        j = joint["parent"]
+
+    return axis_rotation("X", armature_angle) @ bvh_import_rotation @ joint_rotation @ bone_rest_matrix(rest_direction)
+
+
+def retarget_rotations(clip, rig, bone_targets):
+    # bone name -> (frames, 3, 3) rotations relative to the rest pose (matrix_basis) of all mapped bones
+    targets = {target.bone_name: target for target in bone_targets}
+    object_rotation = rig.object_rotation
+    finals = [None] * len(rig.bone_names)
+    result = {}
+
+    for id, name in enumerate(rig.bone_names):
+        parent = rig.parents[id]
+        # rest rotation relative to the parent
+        relative = rig.rest[parent].T @ rig.rest[id] if parent >= 0 else rig.rest[id]
+        parent_final = finals[parent] if parent >= 0 else np.eye(3)
+        before = parent_final @ relative @ rig.basis[id]
+        if name not in targets:
+            finals[id] = before
+            continue
+
+        target = targets[name]
+        world_before = object_rotation @ before
+        world = bvh_world_rotations(clip, target.bvh_joint, target.armature_angle)
+        if not target.use_y:
+            # only x and z are copied, the y angle of the bone stays
+            order = rig.euler_order(id)
+            euler_before = matrix_to_euler(np.broadcast_to(world_before, world.shape), order)
+            euler = matrix_to_euler(world, order, euler_before)
+            euler[:, 1] = euler_before[:, 1]
+            world = euler_to_matrix(euler, order)
+        if target.influence < 1:
+            world = quaternion_to_matrix(slerp(matrix_to_quaternion(np.broadcast_to(world_before, world.shape)),
+                                               matrix_to_quaternion(world), target.influence))
+
+        finals[id] = object_rotation.T @ world
+        # what visual keying bakes: the final rotation without the parent and rest rotation
+        result[name] = np.swapaxes(parent_final @ relative, -1, -2) @ finals[id]
+
+    return result
+
+
+def rotation_keyframes(rotations, rotation_mode):
+    # (frames, 4) quaternions or (frames, 3) euler angles of the rotations for the given rotation mode
+    if rotation_mode in ("XYZ", "XZY", "YXZ", "YZX", "ZXY", "ZYX"):
+        return continuous_eulers(rotations, rotation_mode)
+
+    return continuous_quaternions(matrix_to_quaternion(rotations))
@@ -0,0 +1,125 @@
+"""
+# What does this script do?
+The script runs the MediaPipe motion tracking AI on many video files in parallel and writes one landmark file
+(.npz, see blender_scripts/landmark_store.py) per video. The clips are distributed over a pool of processes,
+each with its own MediaPipe Holistic instance, so the extraction scales with the number of CPU cores.
+With --tracking every clip gets a new Holistic instance, so the tracking state of one clip does not leak into the next.
+The landmark files can be loaded in Blender by setting landmark_file_path in load_mp_landmarks.py.
+
+# How to use this script?
+Make sure that the packages cv2, mediapipe and numpy are installed in your Python environment and run e.g.
+    python batch_extract.py ../sign_videos --output landmarks
+The input can be a folder (all .mov and .mp4 files in it are used), a single video or a glob pattern like "../sign_videos/Auf*.mov".
+Run "python batch_extract.py --help" for all options.
+"""
+
+import argparse
+import atexit
+import glob
+import os
+import pathlib
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+sys.path.append(str(pathlib.Path(__file__).parent.parent.absolute() / 'blender_scripts'))
+
+import cv2
+
+import landmark_extraction
+import landmark_store
+
+video_extensions = ('.mov', '.mp4', '.avi', '.mkv')
+
+# Holistic instance owned by the current worker process, None in tracking mode
+worker_holistic = None
+worker_holistic_settings = {}
+
+
+def init_worker(holistic_settings):
+    global worker_holistic, worker_holistic_settings
+    # the pool already runs one clip per core, so OpenCV should not start its own threads on top of that
+    cv2.setNumThreads(1)
+    worker_holistic_settings = holistic_settings
+    # in tracking mode Holistic keeps state between frames, which must not carry over into the next clip
+    if holistic_settings.get('static_image_mode', True):
+        worker_holistic = landmark_extraction.create_holistic(holistic_settings)
+        atexit.register(worker_holistic.close)
+
+
+def extract_clip(video_path, output_path, prefetch, input_settings={}, frame_step=1, target_fps=None):
+    start = time.perf_counter()
+    if target_fps:
+        frame_step = landmark_extraction.frame_step_for_fps(landmark_extraction.get_video_fps(video_path), target_fps)
+    frames = landmark_extraction.get_video_frames(video_path, prefetch=prefetch, frame_step=frame_step)
+    holistic = worker_holistic or landmark_extraction.create_holistic(worker_holistic_settings)
+    try:
+        store = landmark_extraction.extract_landmarks(holistic, frames, **input_settings)
+    finally:
+        if holistic is not worker_holistic:
+            holistic.close()
+    landmark_store.save_landmark_file(output_path, store)
+
+    return len(store), time.perf_counter() - start
+
+
+def find_videos(inputs):
+    videos = []
+    for i in inputs:
+        if os.path.isdir(i):
+            videos += sorted(os.path.join(i, f) for f in os.listdir(i) if f.lower().endswith(video_extensions))
+        elif os.path.isfile(i):
+            videos.append(i)
+        else:
+            videos += sorted(glob.glob(i))
+
+    return videos
+
+
+def output_file_name(output_dir, video_path):
+    return os.path.join(output_dir, os.path.splitext(os.path.basename(video_path))[0] + '.npz')
+
+
+def run_batch(videos, output_dir, holistic_settings, workers=None, prefetch=4, overwrite=False, input_settings={}, frame_step=1, target_fps=None):
+    os.makedirs(output_dir, exist_ok=True)
+    jobs = [(v, output_file_name(output_dir, v)) for v in videos]
+    if not overwrite:
+        jobs = [(v, o) for v, o in jobs if not os.path.exists(o)]
+
+    failed = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(holistic_settings,)) as pool:
+        futures = {pool.submit(extract_clip, v, o, prefetch, input_settings, frame_step, target_fps): v for v, o in jobs}
+        for future in as_completed(futures):
+            video = futures[future]
+            try:
+                frames, seconds = future.result()
+                print('%s: %d frames in %.1f s (%.1f fps)' % (os.path.basename(video), frames, seconds, frames / max(seconds, 1e-9)))
+            except Exception as e:
+                failed.append(video)
+                print('%s: failed (%s)' % (os.path.basename(video), e), file=sys.stderr)
+
+    return failed
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Extract MediaPipe Holistic landmarks of many videos in parallel.')
+    parser.add_argument('inputs', nargs='+', help='video files, folders or glob patterns')
+    parser.add_argument('--output', default='landmarks', help='folder for the landmark files (default: %(default)s)')
+    parser.add_argument('--workers', type=int, default=None, help='number of worker processes (default: number of CPU cores)')
+    parser.add_argument('--prefetch', type=int, default=4, help='frames decoded ahead per worker (default: %(default)s)')
+    parser.add_argument('--overwrite', action='store_true', help='analyze videos again even if their landmark file exists')
+    landmark_extraction.add_holistic_arguments(parser)
+    landmark_extraction.add_input_arguments(parser)
+
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    videos = find_videos(args.inputs)
+    if not videos:
+        sys.exit('No videos found')
+
+    failed = run_batch(videos, args.output, landmark_extraction.holistic_settings_from_args(args), workers=args.workers, prefetch=args.prefetch, overwrite=args.overwrite,
+                       input_settings=landmark_extraction.input_settings_from_args(args), frame_step=args.frame_step, target_fps=args.target_fps)
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,86 @@
+"""
+# What does this module do?
+It draws landmark arrays (see blender_scripts/landmark_store.py) onto video frames like mediapipe's drawing_utils does,
+but for a whole body part at once: all connections of a part are drawn with one cv2.polylines call and all landmark
+dots are set with one array assignment of precomputed disk offsets, instead of one OpenCV call per line and dot.
+Landmarks outside the frame are skipped like in drawing_utils. The stored arrays have no visibility values,
+so pose landmarks that drawing_utils hides because of a low visibility are drawn here.
+
+# How to use this module?
+It needs cv2 and numpy, and mediapipe only for the connection lists of holistic_connections. It is used by main.py
+with the option --landmarks.
+"""
+
+import cv2
+import numpy as np
+
+## Colors (BGR) and sizes of mediapipe's drawing_utils
+landmark_color = (0, 0, 255)
+connection_color = (0, 255, 0)
+line_thickness = 2
+circle_radius = 2
+
+## Body parts in the order drawing_utils is called by main.py
+part_names = ('face', 'left_hand', 'right_hand', 'pose')
+
+
+def holistic_connections():
+    # part name -> (connections, 2) array of landmark indices
+    import mediapipe as mp
+    mp_holistic = mp.solutions.holistic
+    connections = {
+        'face': mp_holistic.FACE_CONNECTIONS,
+        'left_hand': mp_holistic.HAND_CONNECTIONS,
+        'right_hand': mp_holistic.HAND_CONNECTIONS,
+        'pose': mp_holistic.POSE_CONNECTIONS
+    }
+
+    return {part: np.array([(int(a), int(b)) for a, b in sorted(c)], dtype=np.int64).reshape(-1, 2) for part, c in connections.items()}
+
+
+def disk_offsets(radius, thickness=line_thickness):
+    # (pixels, 2) x, y offsets of the pixels that cv2.circle covers with this radius and line thickness
+    outer = radius + thickness // 2
+    ys, xs = np.mgrid[-outer:outer + 1, -outer:outer + 1]
+    inside = xs * xs + ys * ys <= outer * outer
+
+    return np.stack([xs[inside], ys[inside]], axis=1)
+
+
+def pixel_coordinates(coords, width, height):
+    # (landmarks, 2) pixel positions of normalized coordinates and whether they lie inside the frame
+    xy = np.asarray(coords)[:, :2]
+    inside = np.all((xy >= 0) & (xy <= 1), axis=1)
+    pixels = np.floor(np.minimum(xy * (width, height), (width - 1, height - 1))).astype(np.int32)
+
+    return pixels, inside
+
+
+def draw_landmark_array(image, coords, connections, landmark_color=landmark_color, connection_color=connection_color,
+                        thickness=line_thickness, offsets=None):
+    # draws the connections and then the landmarks of one body part onto image in place
+    height, width = image.shape[:2]
+    pixels, inside = pixel_coordinates(coords, width, height)
+
+    segments = connections[inside[connections[:, 0]] & inside[connections[:, 1]]]
+    if len(segments):
+        cv2.polylines(image, list(pixels[segments].reshape(-1, 2, 1, 2)), False, connection_color, thickness)
+
+    offsets = disk_offsets(circle_radius, thickness) if offsets is None else offsets
+    dots = (pixels[inside][:, None, :] + offsets[None]).reshape(-1, 2)
+    dots = dots[(dots[:, 0] >= 0) & (dots[:, 0] < width) & (dots[:, 1] >= 0) & (dots[:, 1] < height)]
+    image[dots[:, 1], dots[:, 0]] = landmark_color
+
+
+def draw_landmark_arrays(image, landmarks, connections, parts=part_names, landmark_color=landmark_color,
+                         connection_color=connection_color):
+    # landmarks maps the part names to (landmarks, 3) arrays or None if the part was not detected in the frame
+    offsets = disk_offsets(circle_radius)
+    for part in parts:
+        if landmarks.get(part) is not None:
+            draw_landmark_array(image, landmarks[part], connections[part], landmark_color, connection_color, offsets=offsets)
+
+
+def frame_landmarks(store, frame):
+    # landmarks of one frame of a LandmarkStore in the form draw_landmark_arrays takes
+    return {part: (store.coords[part][frame] if store.masks[part][frame] else None) for part in store.coords}
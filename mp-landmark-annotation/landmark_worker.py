@@ -0,0 +1,230 @@
+"""
+# What does this script do?
+The script is the inference process behind blender_scripts/landmark_worker_client.py: it runs MediaPipe Holistic in its own
+Python process, so Blender's Python never imports cv2 or mediapipe and Blender stays responsive while a clip is analyzed.
+It connects to the socket that Blender listens on (multiprocessing.connection, authenticated with the key in the
+environment variable LANDMARK_WORKER_AUTHKEY) and then runs one job after the other:
+    {"command": "extract", "video": ..., "holistic_settings": ..., "input_settings": ..., "frame_step": ..., "target_fps": ...,
+     "prefetch": ..., "frame_ring_slots": ..., "checkpoint_chunk_frames": ..., "result_dir": ..., "cache_dir": ...,
+     "cache_max_size": ...}
+With frame_ring_slots the video is decoded by another process into the shared memory slots of frame_ring.py, otherwise
+(and before Python 3.8, which has no multiprocessing.shared_memory) by a thread of the worker that buffers prefetch frames.
+The landmarks are not sent over the socket: every body part is written frame by frame into a memory-mapped .npy file in
+result_dir (in shared memory, /dev/shm, if the client found it), only small messages go back:
+    {"type": "progress", "frame": ..., "frames": ...}, {"type": "done", "result_dir": ..., "frames": ..., "cached": ...},
+    {"type": "cancelled"} or {"type": "error", "message": ...}
+A {"command": "cancel"} stops the running job, {"command": "quit"} ends the process. With a cache_dir the landmark cache of
+load_mp_landmarks.py is used, a cached clip is answered with the folder of its cache entry right away. With a cache_dir and
+checkpoint_chunk_frames the landmarks are also written in chunks next to the cache entry (see landmark_chunks.py), so the
+next job for a cancelled or crashed video only analyzes the frames after the last complete chunk.
+
+# How to use this script?
+It is started by landmark_worker_client.py with the Python interpreter that has cv2, mediapipe and numpy installed
+(worker_python in load_mp_landmarks.py), e.g.
+    python landmark_worker.py --connect localhost:50123
+"""
+
+import argparse
+import os
+import pathlib
+import sys
+import time
+from multiprocessing.connection import Client
+
+sys.path.append(str(pathlib.Path(__file__).parent.parent.absolute() / 'blender_scripts'))
+
+import cv2
+import numpy as np
+
+import landmark_cache
+import landmark_chunks
+import landmark_extraction
+import landmark_store
+
+authkey_variable = 'LANDMARK_WORKER_AUTHKEY'
+
+# seconds between two progress messages
+progress_interval = 0.25
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class ResultArrays:
+    # one memory-mapped .npy file per body part and mask, grown when the video has more frames than announced
+    def __init__(self, result_dir, capacity):
+        self.result_dir = result_dir
+        self.coords, self.masks = {}, {}
+        self.allocate(max(capacity, 1))
+
+    def allocate(self, capacity, frames=0):
+        # new files are written next to the old ones and replace them once the first frames are copied over
+        for part, l_count in landmark_store.landmark_parts:
+            coords_url, masks_url = os.path.join(self.result_dir, part + '.npy'), os.path.join(self.result_dir, part + '_mask.npy')
+            coords = np.lib.format.open_memmap(coords_url + '.tmp', mode='w+', dtype=np.float32, shape=(capacity, l_count, 3))
+            masks = np.lib.format.open_memmap(masks_url + '.tmp', mode='w+', dtype=bool, shape=(capacity,))
+            if frames:
+                coords[:frames] = self.coords[part][:frames]
+                masks[:frames] = self.masks[part][:frames]
+            self.coords[part], self.masks[part] = coords, masks
+            os.replace(coords_url + '.tmp', coords_url)
+            os.replace(masks_url + '.tmp', masks_url)
+
+    def set_frame(self, frame, landmarks):
+        capacity = len(self.masks['pose'])
+        if frame >= capacity:
+            # a resumed job writes a whole chunk at once, which can be more than twice the capacity
+            self.allocate(max(2 * capacity, frame + 1), frames=capacity)
+        for part, _ in landmark_store.landmark_parts:
+            if landmarks is not None and landmarks[part] is not None:
+                self.coords[part][frame] = landmarks[part]
+                self.masks[part][frame] = True
+
+    def set_frames(self, first_frame, store):
+        # frames of an earlier run, e.g. the complete chunks of an interrupted job
+        self.set_frame(first_frame + len(store) - 1, None)
+        for part, _ in landmark_store.landmark_parts:
+            self.coords[part][first_frame:first_frame + len(store)] = store.coords[part]
+            self.masks[part][first_frame:first_frame + len(store)] = store.masks[part]
+
+    def flush(self):
+        for part, _ in landmark_store.landmark_parts:
+            self.coords[part].flush()
+            self.masks[part].flush()
+
+    def store(self, frames):
+        return landmark_store.LandmarkStore({part: self.coords[part][:frames] for part in self.coords}, {part: self.masks[part][:frames] for part in self.masks})
+
+
+def check_cancel(connection):
+    # commands that arrive during a job, anything but cancel is ignored while the job runs
+    while connection.poll():
+        if connection.recv().get('command') in ('cancel', 'quit'):
+            raise JobCancelled()
+
+
+def video_frame_count(file_url):
+    vidcap = cv2.VideoCapture(file_url)
+    count = int(vidcap.get(cv2.CAP_PROP_FRAME_COUNT))
+    vidcap.release()
+
+    return max(count, 0)
+
+
+def open_video_frames(job, step, start_frame=0):
+    if job.get('frame_ring_slots'):
+        try:
+            # multiprocessing.shared_memory needs Python 3.8 or newer
+            import frame_ring
+        except ImportError:
+            frame_ring = None
+        if frame_ring is not None:
+            # decoded by a separate process into shared memory slots, the frames are read without copying
+            return frame_ring.shared_video_frames(job['video'], slots=job['frame_ring_slots'], frame_step=step, start_frame=start_frame)
+
+    return landmark_extraction.get_video_frames(job['video'], prefetch=job.get('prefetch', 8), frame_step=step, start_frame=start_frame)
+
+
+def run_job(connection, job):
+    video = job['video']
+    step = job.get('frame_step', 1)
+    if job.get('target_fps'):
+        step = landmark_extraction.frame_step_for_fps(landmark_extraction.get_video_fps(video), job['target_fps'])
+    input_settings = job.get('input_settings') or landmark_extraction.input_settings()
+    holistic_settings = job.get('holistic_settings', {})
+
+    key = None
+    if job.get('cache_dir'):
+        key = landmark_cache.cache_key(video, landmark_extraction.cache_settings(holistic_settings, input_settings, step))
+        store = landmark_cache.load_landmarks(job['cache_dir'], key)
+        if store is not None:
+            # the arrays of the cache entry can be memory-mapped by the client as they are
+            connection.send({'type': 'done', 'result_dir': os.path.join(job['cache_dir'], key), 'frames': len(store), 'cached': True})
+            return
+
+    info = {'video': os.path.basename(video), 'settings': holistic_settings, 'input': input_settings, 'frame_step': step}
+    frame_count = video_frame_count(video)
+    results = ResultArrays(job['result_dir'], frame_count)
+    chunks = None
+    start_frame = 0
+    if key is not None and job.get('checkpoint_chunk_frames'):
+        # the complete chunks of a cancelled or crashed run are not analyzed again
+        chunks = landmark_chunks.ChunkWriter(landmark_chunks.chunk_folder(job['cache_dir'], key), job['checkpoint_chunk_frames'], info)
+        for first_frame, store in landmark_chunks.iter_chunks(chunks.chunk_dir):
+            results.set_frames(first_frame, store)
+        start_frame = chunks.frames
+
+    # a Holistic instance in tracking mode keeps state between frames, so every job gets its own
+    holistic = landmark_extraction.create_holistic(holistic_settings)
+    region = None if input_settings['crop'] == 'auto' else input_settings['crop']
+    if chunks is not None and chunks.finished:
+        video_frames = []
+    else:
+        video_frames = open_video_frames(job, step, start_frame)
+    frames = start_frame
+    last_progress = 0.0
+    try:
+        for frame, image in enumerate(video_frames, start_frame):
+            # frames skipped by frame_step (None) stay without detection
+            landmarks = None
+            if image is not None:
+                landmarks = landmark_extraction.process_frame(holistic, image, input_settings['scale'], region)
+                region = landmark_extraction.next_crop_region(holistic, input_settings['crop'], region, landmarks)
+            results.set_frame(frame, landmarks)
+            if chunks is not None:
+                chunks.add(landmarks)
+            frames = frame + 1
+
+            if time.perf_counter() - last_progress > progress_interval:
+                check_cancel(connection)
+                connection.send({'type': 'progress', 'frame': frames, 'frames': max(frame_count, frames)})
+                last_progress = time.perf_counter()
+        if chunks is not None and not chunks.finished:
+            chunks.finish()
+    finally:
+        holistic.close()
+
+    results.flush()
+    if key is not None:
+        landmark_cache.store_landmarks(job['cache_dir'], key, results.store(frames), max_size=job.get('cache_max_size', landmark_cache.default_max_size), info=info)
+    if chunks is not None:
+        # the cache entry replaces the chunks
+        landmark_chunks.remove_chunks(chunks.chunk_dir)
+    connection.send({'type': 'done', 'result_dir': job['result_dir'], 'frames': frames, 'cached': False})
+
+
+def serve(connection):
+    while True:
+        try:
+            message = connection.recv()
+        except EOFError:
+            break
+        command = message.get('command')
+        if command == 'quit':
+            break
+        if command != 'extract':
+            continue
+        try:
+            run_job(connection, message)
+        except JobCancelled:
+            connection.send({'type': 'cancelled'})
+        except Exception as e:
+            connection.send({'type': 'error', 'message': '%s: %s' % (type(e).__name__, e)})
+
+
+def parse_address(text):
+    host, port = text.rsplit(':', 1)
+    return host, int(port)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run MediaPipe Holistic for a client like Blender in a separate process.')
+    parser.add_argument('--connect', type=parse_address, required=True, help='HOST:PORT the client listens on')
+    args = parser.parse_args()
+
+    connection = Client(args.connect, authkey=bytes.fromhex(os.environ[authkey_variable]))
+    try:
+        serve(connection)
+    finally:
+        connection.close()
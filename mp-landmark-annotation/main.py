@@ -2,57 +2,210 @@
 # PyCharm Professional 2020.3
 
 # What does this script do?
-The script runs the MediaPipe motion tracking AI on the video file which URL is passed to the 
-method get_video_frames in line 58. It annotates all video frames and saves the result in the folder "annotated_images".
+The script runs the MediaPipe motion tracking AI on the video file which URL is passed as command line argument. It annotates all video frames and saves the result in the folder "annotated_images".
+Frames are decoded one at a time (optionally prefetched on a background thread), so memory does not grow with the clip length.
+Drawing and encoding the annotated frames runs on a pool of writer threads behind a bounded queue, so the inference never waits for the disk.
+The frames are saved as PNG or JPEG files, or as one annotated .mp4 video with --output video.
+With --landmarks the landmarks of an earlier run (a .npz file from batch_extract.py) are drawn instead of running MediaPipe again,
+so changing the overlay (--parts, --size, colors) only costs decoding and drawing, e.g.
+    python main.py "../sign_videos/Auf Wiedersehen II.mov" --landmarks "../landmarks/Auf Wiedersehen II.npz" --parts left_hand right_hand --output video
 Tracked landmarks are depicted as red dots and joint connections between landmarks as green lines.
+With --profile the time of every stage, the inference and annotation time of every frame and the peak memory are written to
+"<video name>.profile.json" in the output folder (see blender_scripts/profiling.py).
 
 # How to use this script?
 Make sure that the packages cv2 and mediapipe are installed in your Python environment and run the script with an
-IDE like PyCharm or Visual Studio Code or run it in the terminal.
+IDE like PyCharm or Visual Studio Code or run it in the terminal, e.g.
+    python main.py "../sign_videos/Auf Wiedersehen II.mov" --tracking
+Without --tracking the full detector runs on every frame (static_image_mode=True), with it landmarks are tracked between frames.
+Run "python main.py --help" for all options.
 """
 
+import argparse
+import os
+import pathlib
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+sys.path.append(str(pathlib.Path(__file__).parent.parent.absolute() / 'blender_scripts'))
+
 import cv2
 import mediapipe as mp
 
+import landmark_drawing
+import landmark_store
+import profiling
+from landmark_extraction import add_holistic_arguments, add_input_arguments, create_holistic, get_video_fps, \
+    frame_step_from_args, get_video_frames, holistic_settings_from_args, input_settings_from_args, next_crop_region, process_frame
+
+output_formats = ('png', 'jpg', 'video')
 
-def get_landmarks(vid_name, frame_list):
+
+def draw_results(annotated_image, results, parts=landmark_drawing.part_names, landmark_color=landmark_drawing.landmark_color,
+                 connection_color=landmark_drawing.connection_color):
     mp_drawing = mp.solutions.drawing_utils
     mp_holistic = mp.solutions.holistic
+    connections = {
+        'face': mp_holistic.FACE_CONNECTIONS,
+        'left_hand': mp_holistic.HAND_CONNECTIONS,
+        'right_hand': mp_holistic.HAND_CONNECTIONS,
+        'pose': mp_holistic.POSE_CONNECTIONS
+    }
 
-    # For static images:
-    holistic = mp_holistic.Holistic(static_image_mode=True)
-    for idx, image in enumerate(frame_list):
-        image_height, image_width, _ = image.shape
-        # Convert the BGR image to RGB before processing.
-        results = holistic.process(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
-
-        # Draw pose, left and right hands, and face landmarks on the image.
-        annotated_image = image.copy()  # cv2.resize(image.copy(), (1920, 1080))
-        mp_drawing.draw_landmarks(
-            annotated_image, results.face_landmarks, mp_holistic.FACE_CONNECTIONS)
+    # Draw pose, left and right hands, and face landmarks on the image.
+    for part in parts:
         mp_drawing.draw_landmarks(
-            annotated_image, results.left_hand_landmarks, mp_holistic.HAND_CONNECTIONS)
-        mp_drawing.draw_landmarks(
-            annotated_image, results.right_hand_landmarks, mp_holistic.HAND_CONNECTIONS)
-        mp_drawing.draw_landmarks(
-            annotated_image, results.pose_landmarks, mp_holistic.POSE_CONNECTIONS)
+            annotated_image, getattr(results, part + '_landmarks'), connections[part],
+            mp_drawing.DrawingSpec(color=landmark_color), mp_drawing.DrawingSpec(color=connection_color))
+
+
+def annotate_frame(image, draw, file_url=None, size=None, profiler=None):
+    # runs on the writer pool: draws the frame and saves it as image file, or returns it for the video writer
+    start = time.perf_counter()
+    annotated_image = cv2.resize(image, size) if size else image.copy()
+    draw(annotated_image)
+    if file_url is not None:
+        cv2.imwrite(file_url, annotated_image)
+        annotated_image = None
+    if profiler is not None:
+        profiler.add_latency('annotate', time.perf_counter() - start)
+
+    return annotated_image
+
+
+def write_annotations(annotations, video_url, fps, errors):
+    # takes the annotation tasks in frame order, so the frames of the video stay in order
+    video_writer = None
+    while True:
+        task = annotations.get()
+        if task is None:
+            break
+        if errors:
+            # keep taking tasks, so the inference never blocks on a full queue
+            continue
+        try:
+            annotated_image = task.result()
+            if video_url is not None:
+                if video_writer is None:
+                    image_height, image_width, _ = annotated_image.shape
+                    video_writer = cv2.VideoWriter(video_url, cv2.VideoWriter_fourcc(*'mp4v'), fps, (image_width, image_height))
+                video_writer.write(annotated_image)
+        except Exception as e:
+            errors.append(e)
+
+    if video_writer is not None:
+        video_writer.release()
+
+
+def get_landmarks(vid_name, frames, holistic_settings={'static_image_mode': True}, output='png', output_dir='./annotated_images/',
+                  fps=25.0, writers=4, queue_size=16, store=None, parts=landmark_drawing.part_names, size=None,
+                  landmark_color=landmark_drawing.landmark_color, connection_color=landmark_drawing.connection_color, input_settings=None,
+                  profiler=None):
+    # decode (background thread) -> inference (this thread) -> drawing and encoding (writer pool),
+    # the bounded queue of annotation tasks keeps the memory flat if the writers fall behind;
+    # with a LandmarkStore from an earlier run the inference is skipped and its landmarks are drawn instead
+    profiler = profiler or profiling.Profiler(enabled=False)
+    os.makedirs(output_dir, exist_ok=True)
+    video_url = os.path.join(output_dir, os.path.splitext(vid_name)[0] + '.mp4') if output == 'video' else None
+    annotations = queue.Queue(maxsize=queue_size)
+    errors = []
+    writer = threading.Thread(target=write_annotations, args=(annotations, video_url, fps, errors), daemon=True)
+    writer.start()
+
+    holistic = create_holistic(holistic_settings) if store is None else None
+    # a downscaled or cropped inference gives landmark arrays of the whole frame instead of results to draw
+    scale, crop = (input_settings['scale'], input_settings['crop']) if input_settings else (1.0, None)
+    region = None if crop == 'auto' else crop
+    connections = landmark_drawing.holistic_connections()
+    try:
+        with ThreadPoolExecutor(max_workers=writers) as pool:
+            # frames are consumed one by one as they are decoded
+            for idx, image in enumerate(profiler.timed_frames(frames, latency_name='frame')):
+                if image is None:
+                    # skipped by --frame-step or --target-fps
+                    continue
+                start = time.perf_counter()
+                if store is None and scale == 1.0 and crop is None:
+                    # Convert the BGR image to RGB before processing.
+                    results = holistic.process(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+                    draw = partial(draw_results, results=results, parts=parts, landmark_color=landmark_color, connection_color=connection_color)
+                elif store is None:
+                    landmarks = process_frame(holistic, image, scale, region)
+                    region = next_crop_region(holistic, crop, region, landmarks)
+                    draw = partial(landmark_drawing.draw_landmark_arrays, landmarks=landmarks,
+                                   connections=connections, parts=parts, landmark_color=landmark_color, connection_color=connection_color)
+                elif idx < len(store):
+                    draw = partial(landmark_drawing.draw_landmark_arrays, landmarks=landmark_drawing.frame_landmarks(store, idx),
+                                   connections=connections, parts=parts, landmark_color=landmark_color, connection_color=connection_color)
+                else:
+                    break
+                if store is None:
+                    profiler.add_latency('inference', time.perf_counter() - start)
+
+                # save annotated frames
+                file_url = None if video_url else os.path.join(output_dir, vid_name + "_" + str(idx) + '.' + output)
+                start = time.perf_counter()
+                annotations.put(pool.submit(annotate_frame, image, draw, file_url, size, profiler if profiler.enabled else None))
+                # waiting for a free place in the queue means the writers are the bottleneck
+                profiler.add_time('queue_wait', time.perf_counter() - start)
+                profiler.count('frames')
+                if errors:
+                    break
+    finally:
+        annotations.put(None)
+        writer.join()
+        if holistic is not None:
+            holistic.close()
+
+    if errors:
+        raise errors[0]
+
+
+def parse_size(text):
+    width, height = text.lower().split('x')
+    return int(width), int(height)
+
 
-        # save annotated frames
-        cv2.imwrite('./annotated_images/' + vid_name + "_" + str(idx) + '.png', annotated_image)
-    holistic.close()
+def parse_color(text):
+    return tuple(int(c) for c in text.split(','))
 
 
-def get_video_frames(file_url):
-    vidcap = cv2.VideoCapture(file_url)
-    success, image = vidcap.read()
-    # array of objects with class 'numpy.ndarray'
-    frames = []
-    while success:
-        frames.append(image)
-        success, image = vidcap.read()
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Annotate all frames of a video with MediaPipe Holistic landmarks.')
+    parser.add_argument('video', nargs='?', default='../sign_videos/Brauchen Sie eine Arbeitsunfähigkeitsbescheinigung II.mov',
+                        help='video file to annotate (default: %(default)s)')
+    parser.add_argument('--prefetch', type=int, default=8, help='frames decoded ahead on a background thread (default: %(default)s)')
+    parser.add_argument('--output', choices=output_formats, default='png',
+                        help='one image file per frame (png, jpg) or one annotated .mp4 video (default: %(default)s)')
+    parser.add_argument('--output-dir', default='./annotated_images/', help='folder for the annotated frames or video (default: %(default)s)')
+    parser.add_argument('--writers', type=int, default=4, help='threads that draw and encode the annotated frames (default: %(default)s)')
+    parser.add_argument('--queue', type=int, default=16, help='annotated frames waiting for the writers at most (default: %(default)s)')
+    parser.add_argument('--landmarks', help='draw the landmarks of this .npz file (e.g. from batch_extract.py) instead of running MediaPipe')
+    parser.add_argument('--parts', nargs='+', choices=landmark_drawing.part_names, default=landmark_drawing.part_names,
+                        help='body parts to draw (default: all)')
+    parser.add_argument('--size', type=parse_size, help='resolution of the annotated frames as WIDTHxHEIGHT (default: video resolution)')
+    parser.add_argument('--landmark-color', type=parse_color, default=landmark_drawing.landmark_color, help='color of the landmarks as B,G,R (default: 0,0,255)')
+    parser.add_argument('--connection-color', type=parse_color, default=landmark_drawing.connection_color, help='color of the connections as B,G,R (default: 0,255,0)')
+    parser.add_argument('--profile', action='store_true', help='write the time of every stage and frame and the peak memory to a JSON report in the output folder')
+    add_holistic_arguments(parser)
+    add_input_arguments(parser)
 
-    return frames
+    return parser.parse_args(argv)
 
 
 if __name__ == '__main__':
-    get_landmarks('Brauchen Sie eine Arbeitsunfähigkeitsbescheinigung II.mov', get_video_frames('../sign_videos/Brauchen Sie eine Arbeitsunfähigkeitsbescheinigung II.mov'))
+    args = parse_args()
+    store = landmark_store.load_landmark_file(args.landmarks) if args.landmarks else None
+    frame_step = frame_step_from_args(args, args.video)
+    profiler = profiling.Profiler(enabled=args.profile)
+    get_landmarks(os.path.basename(args.video), get_video_frames(args.video, prefetch=args.prefetch, frame_step=frame_step), holistic_settings_from_args(args),
+                  output=args.output, output_dir=args.output_dir, fps=get_video_fps(args.video) / frame_step, writers=args.writers, queue_size=args.queue,
+                  store=store, parts=args.parts, size=args.size, landmark_color=args.landmark_color, connection_color=args.connection_color,
+                  input_settings=input_settings_from_args(args), profiler=profiler)
+    profiler.write_report(profiling.report_path(os.path.join(args.output_dir, os.path.basename(args.video))), video=os.path.basename(args.video),
+                          output=args.output, holistic_settings=holistic_settings_from_args(args), input_settings=input_settings_from_args(args),
+                          frame_step=frame_step)
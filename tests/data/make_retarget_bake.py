@@ -0,0 +1,126 @@
+"""
+# What does this script do?
+It writes tests/data/retarget_bake.npz, the reference of tests/test_retarget.py: Blender imports a BVH clip of
+animation_results/BVH, the bones of an avatar follow it with the COPY_ROTATION constraints of assign_animation_to_avatar.py
+and the result is baked with visual keying. The avatar is a generated stand-in for Genesis8Female with the same mapped bone
+names, random rest rotations, rolls and rotation modes, a small pose and a rotated object, so no .blend file is needed.
+Stored are the avatar (as retarget.Rig), the bone mapping, the world rotations of a few imported BVH bones and the baked rotations of all
+mapped bones on every sample_step-th frame.
+
+# How to use this script?
+Run it with Blender (or Python with the bpy module) only when the reference has to be made again, e.g.
+    blender -b --factory-startup --python tests/data/make_retarget_bake.py
+"""
+
+import math
+import pathlib
+import random
+import sys
+
+repo_dir = pathlib.Path(__file__).parent.parent.parent.absolute()
+sys.path.append(str(repo_dir / 'blender_scripts'))
+
+import bpy
+import addon_utils
+import mathutils
+import numpy as np
+
+clip_file = repo_dir / 'animation_results' / 'BVH' / 'AufWiedersehen.bvh'
+output_file = pathlib.Path(__file__).parent / 'retarget_bake.npz'
+sample_step = 10
+# imported BVH bones whose world rotations are stored, with the x rotation of their armature
+world_joints = ['LEFT_ELBOW', 'RIGHT_WRIST', 'LINDEX_FINGER_PIP', 'RTHUMB_IP']
+head_world_joints = ['NECK', 'HEAD']
+
+
+def avatar_parents():
+    parents = {'hip': None, 'abdomenLower': 'hip', 'abdomenUpper': 'abdomenLower', 'chestLower': 'abdomenUpper',
+               'chestUpper': 'chestLower', 'neckLower': 'chestUpper', 'neckUpper': 'neckLower', 'head': 'neckUpper'}
+    for side in 'lr':
+        parents.update({side + 'Collar': 'chestUpper', side + 'ShldrBend': side + 'Collar', side + 'ShldrTwist': side + 'ShldrBend',
+                        side + 'ForearmBend': side + 'ShldrTwist', side + 'ForearmTwist': side + 'ForearmBend', side + 'Hand': side + 'ForearmTwist',
+                        side + 'Thumb1': side + 'Hand', side + 'Thumb2': side + 'Thumb1', side + 'Thumb3': side + 'Thumb2'})
+        for id, finger in enumerate(['Index', 'Mid', 'Ring', 'Pinky']):
+            carpal = side + 'Carpal%d' % (id + 1)
+            parents.update({carpal: side + 'Hand', side + finger + '1': carpal, side + finger + '2': side + finger + '1', side + finger + '3': side + finger + '2'})
+
+    return parents
+
+
+def make_avatar(name, seed=0, object_rotation=(0.3, -0.7, 1.1), pose_angle=0.2):
+    rng = random.Random(seed)
+    armature = bpy.data.armatures.new(name)
+    obj = bpy.data.objects.new(name, armature)
+    bpy.context.scene.collection.objects.link(obj)
+    bpy.context.view_layer.objects.active = obj
+    bpy.ops.object.mode_set(mode='EDIT')
+    tails = {}
+    for bone_name, parent in avatar_parents().items():
+        edit_bone = armature.edit_bones.new(bone_name)
+        head = mathutils.Vector((0, 0, 0)) if parent is None else tails[parent]
+        direction = mathutils.Vector([rng.uniform(-1, 1) for _ in range(3)]).normalized()
+        edit_bone.head, edit_bone.tail = head, head + direction * rng.uniform(0.5, 2)
+        edit_bone.roll = rng.uniform(-math.pi, math.pi)
+        if parent is not None:
+            edit_bone.parent = armature.edit_bones[parent]
+        tails[bone_name] = edit_bone.tail.copy()
+    bpy.ops.object.mode_set(mode='OBJECT')
+
+    obj.rotation_euler = object_rotation
+    for pose_bone in obj.pose.bones:
+        pose_bone.rotation_mode = rng.choice(['XYZ', 'XZY', 'YXZ', 'YZX', 'ZXY', 'ZYX', 'QUATERNION'])
+        rotation = mathutils.Euler([rng.uniform(-pose_angle, pose_angle) for _ in range(3)]).to_matrix()
+        if pose_bone.rotation_mode == 'QUATERNION':
+            pose_bone.rotation_quaternion = rotation.to_quaternion()
+        else:
+            pose_bone.rotation_euler = rotation.to_euler(pose_bone.rotation_mode)
+    bpy.context.view_layer.update()
+
+    return obj
+
+
+def imported_world_rotations(frames):
+    # joint name -> (frames, 3, 3) world rotations of the bones of the imported and rotated BVH armatures
+    rotations = {}
+    for joints, angle in ((world_joints, avatar.armature_angle), (head_world_joints, avatar.head_armature_angle)):
+        bpy.ops.import_anim.bvh(filepath=str(clip_file), frame_start=avatar.frame_start)
+        obj = bpy.context.view_layer.objects.active
+        obj.rotation_euler[0] = angle
+        for joint in joints:
+            rotations[joint] = []
+        for frame in frames:
+            bpy.context.scene.frame_set(int(frame))
+            for joint in joints:
+                rotations[joint].append(np.array((obj.matrix_world @ obj.pose.bones[joint].matrix).to_3x3().normalized()))
+        action = obj.animation_data.action
+        bpy.data.objects.remove(obj)
+        bpy.data.actions.remove(action)
+
+    return rotations
+
+
+if __name__ == '__main__':
+    bpy.ops.wm.read_factory_settings(use_empty=True)
+    addon_utils.enable('io_anim_bvh')
+    import assign_animation_to_avatar as avatar
+
+    make_avatar(avatar.avatar_name)
+    rig = avatar.read_rig(avatar.avatar_name)
+    targets = avatar.get_bone_targets()
+    baked = avatar.bake_constraint_rotations(str(clip_file), avatar.avatar_name)
+    samples = np.arange(0, len(next(iter(baked.values()))), sample_step)
+    world = imported_world_rotations(samples + avatar.frame_start)
+
+    content = {
+        'bone_names': np.array(rig.bone_names), 'parents': np.array(rig.parents), 'rest': rig.rest,
+        'rotation_modes': np.array(rig.rotation_modes), 'basis': rig.basis, 'object_rotation': rig.object_rotation,
+        'samples': samples,
+        # the mapping of assign_animation_to_avatar.get_bone_targets, which needs Blender
+        'target_joints': np.array([t.bvh_joint for t in targets]), 'target_bones': np.array([t.bone_name for t in targets]),
+        'target_angles': np.array([t.armature_angle for t in targets]), 'target_use_y': np.array([t.use_y for t in targets]),
+        'target_influences': np.array([t.influence for t in targets])
+    }
+    content.update({'world/' + joint: np.array(rotations) for joint, rotations in world.items()})
+    content.update({'baked/' + bone_name: rotations[samples] for bone_name, rotations in baked.items()})
+    np.savez_compressed(output_file, **content)
+    print('wrote %s with %d baked bones on %d frames' % (output_file, len(baked), len(samples)))
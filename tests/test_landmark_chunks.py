@@ -0,0 +1,90 @@
+import pathlib
+import sys
+
+import numpy as np
+import pytest
+
+repo_dir = pathlib.Path(__file__).parent.parent.absolute()
+sys.path.append(str(repo_dir / 'blender_scripts'))
+
+import landmark_chunks
+import landmark_store
+
+
+def synthetic_frames(frame_count=230, seed=0):
+    # landmarks of every frame like landmark_extraction.frame_landmarks gives them: parts that were not detected are None,
+    # frames skipped by frame_step are None
+    rng = np.random.default_rng(seed)
+    frames = []
+    for frame in range(frame_count):
+        if frame % 7 == 3:
+            frames.append(None)
+            continue
+        frames.append({part: rng.random((l_count, 3), dtype=np.float32) if rng.random() > 0.2 else None
+                       for part, l_count in landmark_store.landmark_parts})
+    return frames
+
+
+def write_chunks(chunk_dir, frames, chunk_frames, start=0, stop=None, finish=True):
+    writer = landmark_chunks.ChunkWriter(str(chunk_dir), chunk_frames)
+    for landmarks in frames[writer.frames if start is None else start:stop]:
+        writer.add(landmarks)
+    if finish:
+        writer.finish()
+    return writer
+
+
+def assert_same_stores(a, b):
+    assert len(a) == len(b)
+    for part, _ in landmark_store.landmark_parts:
+        assert np.array_equal(a.masks[part], b.masks[part])
+        assert np.array_equal(a.coords[part], b.coords[part])
+
+
+@pytest.mark.parametrize('interrupt_frame', [0, 49, 50, 51, 175, 229])
+def test_resumed_run_equals_uninterrupted_run(tmp_path, interrupt_frame):
+    frames = synthetic_frames()
+    write_chunks(tmp_path / 'complete', frames, 50)
+    complete = landmark_chunks.join_chunks(str(tmp_path / 'complete'))
+
+    # the analysis stops after interrupt_frame frames, the frames after the last complete chunk are lost
+    interrupted = write_chunks(tmp_path / 'resumed', frames, 50, stop=interrupt_frame, finish=False)
+    assert interrupted.frames == interrupt_frame // 50 * 50
+    # before the first complete chunk there is no progress file yet
+    progress = landmark_chunks.read_progress(str(tmp_path / 'resumed'))
+    assert (progress is None) == (interrupt_frame < 50)
+    assert progress is None or not progress['finished']
+
+    resumed = write_chunks(tmp_path / 'resumed', frames, 50, start=None)
+    assert resumed.frames == len(frames)
+    assert len(complete) == len(frames)
+    assert_same_stores(landmark_chunks.join_chunks(str(tmp_path / 'resumed')), complete)
+    assert_same_stores(complete, landmark_store.LandmarkStore.from_frames(
+        {part: [None if f is None else f[part] for f in frames] for part, _ in landmark_store.landmark_parts}))
+
+
+def test_other_chunk_size_starts_over(tmp_path):
+    frames = synthetic_frames()
+    write_chunks(tmp_path, frames, 50, stop=120, finish=False)
+
+    writer = landmark_chunks.ChunkWriter(str(tmp_path), 40)
+    assert writer.frames == 0 and writer.chunks == 0
+    assert not list(tmp_path.glob('chunk_*.npz'))
+
+
+def test_finished_video_is_not_continued(tmp_path):
+    frames = synthetic_frames(frame_count=60)
+    write_chunks(tmp_path, frames, 25)
+
+    writer = landmark_chunks.ChunkWriter(str(tmp_path), 25)
+    assert writer.finished and writer.frames == 60 and writer.chunks == 3
+    assert [first for first, _ in landmark_chunks.iter_chunks(str(tmp_path), wait=True)] == [0, 25, 50]
+
+
+def test_iter_chunks_stops_waiting_on_a_stopped_analysis(tmp_path):
+    write_chunks(tmp_path, synthetic_frames(), 50, stop=60, finish=False)
+
+    chunks = landmark_chunks.iter_chunks(str(tmp_path), wait=True, poll_interval=0.01, stale_timeout=0.05)
+    assert next(chunks)[0] == 0
+    with pytest.raises(TimeoutError):
+        next(chunks)
@@ -0,0 +1,100 @@
+import io
+import pathlib
+import sys
+
+import numpy as np
+import pytest
+
+repo_dir = pathlib.Path(__file__).parent.parent.absolute()
+sys.path.append(str(repo_dir / 'blender_scripts'))
+
+import bvh_reader
+import motion_archive
+
+hierarchy_text = """HIERARCHY
+ROOT Hips
+{
+  OFFSET 0.000000 0.000000 0.000000
+  CHANNELS 6 Xposition Yposition Zposition Zrotation Xrotation Yrotation
+  JOINT Spine
+  {
+    OFFSET 0.000000 10.500000 0.000000
+    CHANNELS 3 Zrotation Xrotation Yrotation
+    End Site
+    {
+      OFFSET 0.000000 5.000000 0.000000
+    }
+  }
+}
+"""
+
+
+def synthetic_bvh_text(frame_count=150, seed=0):
+    # smooth motion with jumps (large differences), values written as -0.000000 and a constant channel, like a BVH writer with 6 decimals
+    rng = np.random.default_rng(seed)
+    t = np.arange(frame_count)[:, None]
+    motion = np.sin(t * rng.uniform(0.01, 0.3, 9) + rng.uniform(0, 6, 9)) * rng.uniform(1, 180, 9)
+    motion[::37, 4] += 5000
+    motion[rng.random(motion.shape) < 0.05] = -1e-9
+    motion[:, 8] = 0
+    text = io.StringIO(newline='\n')
+    text.write(hierarchy_text)
+    text.write("MOTION\nFrames: %d\nFrame Time: %f\n" % (frame_count, 1 / 30))
+    np.savetxt(text, motion, fmt='%f', delimiter=' ', newline=' \n')
+    return text.getvalue()
+
+
+@pytest.fixture
+def bvh_texts():
+    return {'first': synthetic_bvh_text(), 'second': synthetic_bvh_text(frame_count=70, seed=1)}
+
+
+def pack(tmp_path, bvh_texts, quantization='exact', block_frames=32):
+    bvh_files = []
+    for name, text in bvh_texts.items():
+        bvh_files.append(tmp_path / (name + '.bvh'))
+        bvh_files[-1].write_bytes(text.encode('utf-8'))
+    archive_file = tmp_path / 'clips.mca'
+    motion_archive.pack_bvh_files(str(archive_file), [str(f) for f in bvh_files], quantization, block_frames)
+    return archive_file
+
+
+def test_exact_round_trip_is_byte_exact(tmp_path, bvh_texts):
+    assert '-0.000000' in bvh_texts['first']
+    archive_file = pack(tmp_path, bvh_texts)
+
+    with motion_archive.MotionArchive(str(archive_file)) as archive:
+        assert archive.clip_names == list(bvh_texts)
+        # both clips share one hierarchy
+        assert len(archive.index['hierarchies']) == 1
+        for name, text in bvh_texts.items():
+            archive.write_bvh(name, str(tmp_path / (name + '.unpacked.bvh')))
+            assert (tmp_path / (name + '.unpacked.bvh')).read_bytes() == text.encode('utf-8')
+
+
+@pytest.mark.parametrize('start, stop', [(0, 150), (31, 97), (64, 65), (140, 400), (50, 50)])
+def test_frame_range(tmp_path, bvh_texts, start, stop):
+    archive_file = pack(tmp_path, bvh_texts)
+    motion = bvh_reader.parse_bvh(bvh_texts['first'], dtype=np.float64).motion
+
+    with motion_archive.MotionArchive(str(archive_file)) as archive:
+        clip = archive.read_clip('first', start, stop)
+    assert clip.joint_names == ['Hips', 'Spine']
+    assert np.array_equal(clip.motion, motion[start:stop])
+    assert np.array_equal(np.signbit(clip.motion), np.signbit(motion[start:stop]))
+
+
+def test_fixed16_error(tmp_path, bvh_texts):
+    archive_file = pack(tmp_path, bvh_texts, quantization='fixed16')
+    motion = bvh_reader.parse_bvh(bvh_texts['first'], dtype=np.float64).motion
+
+    with motion_archive.MotionArchive(str(archive_file)) as archive:
+        result = archive.read_motion('first')
+    step = (motion.max(axis=0) - motion.min(axis=0)) / motion_archive.fixed16_steps
+    assert np.all(np.abs(result - motion) <= step / 2 + 1e-9)
+
+
+def test_not_an_archive(tmp_path):
+    (tmp_path / 'other.mca').write_bytes(b'\0' * 64)
+    with pytest.raises(ValueError):
+        motion_archive.MotionArchive(str(tmp_path / 'other.mca'))
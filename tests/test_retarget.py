@@ -0,0 +1,109 @@
+import pathlib
+import sys
+
+import numpy as np
+import pytest
+
+repo_dir = pathlib.Path(__file__).parent.parent.absolute()
+sys.path.append(str(repo_dir / 'blender_scripts'))
+
+import bvh_reader
+import retarget
+
+# written by tests/data/make_retarget_bake.py with Blender's BVH importer, the constraints and Bake Action
+bake_file = repo_dir / 'tests' / 'data' / 'retarget_bake.npz'
+clip_file = repo_dir / 'animation_results' / 'BVH' / 'AufWiedersehen.bvh'
+
+euler_orders = ['XYZ', 'XZY', 'YXZ', 'YZX', 'ZXY', 'ZYX']
+
+
+def random_rotations(count, seed=0):
+    rng = np.random.default_rng(seed)
+    q = rng.normal(size=(count, 4))
+    return retarget.quaternion_to_matrix(q / np.linalg.norm(q, axis=1, keepdims=True))
+
+
+def half_turns(axes):
+    # 180 degree rotations around the given axes
+    axes = np.asarray(axes, dtype=np.float64)
+    axes = axes / np.linalg.norm(axes, axis=-1, keepdims=True)
+    return 2 * axes[..., :, None] * axes[..., None, :] - np.eye(3)
+
+
+@pytest.fixture(scope='module')
+def bake():
+    with np.load(bake_file) as content:
+        return dict(content)
+
+
+@pytest.fixture(scope='module')
+def clip():
+    return bvh_reader.load_bvh(str(clip_file), use_sidecar=False)
+
+
+def test_quaternion_round_trip():
+    m = np.concatenate([random_rotations(1000), half_turns([[1, -1, 0], [1, 0, 0], [0, 1, 0], [0, 0, 1], [1, 2, 3]]), np.eye(3)[None]])
+    q = retarget.matrix_to_quaternion(m)
+
+    assert np.all(q[:, 0] >= 0)
+    assert np.allclose(np.linalg.norm(q, axis=1), 1)
+    assert np.abs(retarget.quaternion_to_matrix(q) - m).max() < 1e-12
+
+
+def test_quaternion_half_turn():
+    q = retarget.matrix_to_quaternion(half_turns([1, -1, 0]))
+    assert np.allclose(np.abs(q), [0, np.sqrt(0.5), np.sqrt(0.5), 0])
+
+
+@pytest.mark.parametrize('order', euler_orders)
+def test_euler_round_trip(order):
+    m = np.concatenate([random_rotations(1000, seed=1), half_turns([[1, -1, 0], [0, 0, 1]])])
+    # both solutions describe the same rotation
+    for eulers in retarget.matrix_to_eulers(m, order):
+        assert np.abs(retarget.euler_to_matrix(eulers, order) - m).max() < 1e-9
+    # gimbal lock: the middle axis at 90 degrees
+    eulers = np.zeros((2, 3))
+    eulers[:, retarget.axis_ids[order[1]]] = [np.pi / 2, -np.pi / 2]
+    m = retarget.euler_to_matrix(eulers + [0.3, 0.2, -0.4], order)
+    assert np.abs(retarget.euler_to_matrix(retarget.matrix_to_euler(m, order), order) - m).max() < 1e-6
+
+
+@pytest.mark.parametrize('order', euler_orders)
+def test_continuous_eulers(order):
+    # several full turns around every axis
+    t = np.linspace(0, 20, 2000)[:, None]
+    eulers = np.concatenate([np.sin(0.7 * t) * 4, np.cos(1.3 * t) * 1.4, 0.9 * t], axis=1)
+    m = retarget.euler_to_matrix(eulers, order)
+    result = retarget.continuous_eulers(m, order)
+
+    assert np.abs(retarget.euler_to_matrix(result, order) - m).max() < 1e-9
+    assert np.abs(np.diff(result, axis=0)).max() < 0.1
+
+
+def test_continuous_quaternions():
+    q = retarget.matrix_to_quaternion(retarget.euler_to_matrix(np.linspace(0, 4 * np.pi, 200)[:, None] * [1, 0.5, 0]))
+    q = retarget.continuous_quaternions(q)
+    assert np.all((q[1:] * q[:-1]).sum(axis=1) > 0)
+
+
+def test_bvh_world_rotations_match_blender_import(bake, clip):
+    samples = bake['samples']
+    for key in bake:
+        if not key.startswith('world/'):
+            continue
+        joint = key.split('/', 1)[1]
+        angle = bake['target_angles'][list(bake['target_joints']).index(joint)]
+        computed = retarget.bvh_world_rotations(clip, joint, angle)[samples]
+        assert retarget.rotation_angle(bake[key], computed).max() < 1e-5, joint
+
+
+def test_retarget_rotations_match_bake(bake, clip):
+    rig = retarget.Rig(list(bake['bone_names']), list(bake['parents']), bake['rest'], list(bake['rotation_modes']), bake['basis'], bake['object_rotation'])
+    targets = [retarget.BoneTarget(str(joint), str(bone), float(angle), bool(use_y), float(influence)) for joint, bone, angle, use_y, influence in
+               zip(bake['target_joints'], bake['target_bones'], bake['target_angles'], bake['target_use_y'], bake['target_influences'])]
+    rotations = retarget.retarget_rotations(clip, rig, targets)
+
+    assert sorted(rotations) == sorted(bake['target_bones'])
+    for bone_name, computed in rotations.items():
+        # Blender evaluates the constraints in single precision
+        assert retarget.rotation_angle(bake['baked/' + bone_name], computed[bake['samples']]).max() < 1e-4, bone_name